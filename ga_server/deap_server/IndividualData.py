@@ -1,11 +1,50 @@
 
+from contextlib import contextmanager
 from copy import deepcopy
+from threading import local
+
+import numpy
+
+
+def get_mutation_diff(before_mutation: list, individual) -> list[list]:
+    """
+    Positions of the genes changed by a mutation, and their values before it.
+    """
+    before = numpy.asarray(before_mutation)
+    positions = numpy.nonzero(before != numpy.asarray(individual))[0]
+    return [positions.tolist(), before[positions].tolist()]
+
+
+class IdCounter:
+    """
+    Ids of the individuals of a session, so that they don't depend on the other sessions and are the same when replayed.
+    """
+
+    def __init__(self, next_id: int = 1):
+        self.next_id = next_id
+
+session_ids = local()
+
+@contextmanager
+def use_id_counter(counter: IdCounter):
+    """
+    Individuals created by the current thread take their ids from `counter`.
+    """
+    previous = getattr(session_ids, "counter", None)
+    session_ids.counter = counter
+    try:
+        yield
+    finally:
+        session_ids.counter = previous
 
 
 class IndividualData:
+    # ids of the individuals created outside of a session
     id = 1
 
     def mate_decorator(func):
+        if getattr(func, 'batched', False):
+            return IndividualData.batch_mate_decorator(func)
         def wrapper(*args, **kwargs):
             child1, child2 = func(deepcopy(args[0]), deepcopy(args[1]), **kwargs)
             child1.visualization_data.set_parents(args[0].visualization_data.id, args[1].visualization_data.id)
@@ -14,16 +53,72 @@ class IndividualData:
         return wrapper
 
     def mutate_decorator(func):
+        if getattr(func, 'batched', False):
+            return IndividualData.batch_mutate_decorator(func)
         def wrapper(*args, **kwargs):
             individual, = func(deepcopy(args[0]), **kwargs)
             individual.visualization_data.set_as_mutated(args[0].visualization_data.id, args[0].tolist())
             return individual,
         return wrapper
 
+    def mutate_diff_decorator(func):
+        """
+        Same as `mutate_decorator`, but the genes changed by the mutation are recorded instead of the whole chromosome.
+        """
+        if getattr(func, 'batched', False):
+            return IndividualData.batch_mutate_diff_decorator(func)
+        def wrapper(*args, **kwargs):
+            before_mutation = args[0].tolist()
+            individual, = func(deepcopy(args[0]), **kwargs)
+            individual.visualization_data.set_as_mutated(args[0].visualization_data.id, None, get_mutation_diff(before_mutation, individual))
+            return individual,
+        return wrapper
+
+    # batched operators modify the individuals in place, the lineage is recorded for the whole batch at once
+
+    def batch_mate_decorator(func):
+        def wrapper(parents1, parents2, **kwargs):
+            parent_ids = [
+                (ind1.visualization_data.id, ind2.visualization_data.id)
+                for ind1, ind2 in zip(parents1, parents2)
+            ]
+            children1, children2 = func(parents1, parents2, **kwargs)
+            for child1, child2, (id1, id2) in zip(children1, children2, parent_ids):
+                child1.visualization_data.set_parents(id1, id2)
+                child2.visualization_data.set_parents(id1, id2)
+            return children1, children2
+        wrapper.batched = True
+        return wrapper
+
+    def batch_mutate_decorator(func):
+        def wrapper(population, **kwargs):
+            before = [(ind.visualization_data.id, ind.tolist()) for ind in population]
+            mutated = func(population, **kwargs)
+            for individual, (mutated_from, before_mutation) in zip(mutated, before):
+                individual.visualization_data.set_as_mutated(mutated_from, before_mutation)
+            return mutated
+        wrapper.batched = True
+        return wrapper
+
+    def batch_mutate_diff_decorator(func):
+        def wrapper(population, **kwargs):
+            before = [(ind.visualization_data.id, ind.tolist()) for ind in population]
+            mutated = func(population, **kwargs)
+            for individual, (mutated_from, before_mutation) in zip(mutated, before):
+                individual.visualization_data.set_as_mutated(mutated_from, None, get_mutation_diff(before_mutation, individual))
+            return mutated
+        wrapper.batched = True
+        return wrapper
+
 
     def _set_new_id(self):
-        self.id = IndividualData.id
-        IndividualData.id += 1
+        counter = getattr(session_ids, "counter", None)
+        if counter is not None:
+            self.id = counter.next_id
+            counter.next_id += 1
+        else:
+            self.id = IndividualData.id
+            IndividualData.id += 1
 
     def __init__(self):
         self._set_new_id()
@@ -32,16 +127,22 @@ class IndividualData:
         self.parent2_id: int = -1
         self.mutated_from = -1
         self.before_mutation: None | list[int] = None
+        # [positions, values before the mutation], recorded instead of `before_mutation` with the diff encoding
+        self.mutation_diff: None | list[list] = None
+        # fitness predicted by the surrogate instead of evaluated
+        self.predicted = False
 
-    def set_as_mutated(self, mutated_from: int, before_mutation: list[int] | None):
+    def set_as_mutated(self, mutated_from: int, before_mutation: list[int] | None, mutation_diff: list[list] | None = None):
         if self.age > 0:
             self._set_new_id()
             self.age = 0
             self.parent1_id = -1
             self.parent2_id = -1
             self.before_mutation = None
+            self.mutation_diff = None
         else:
             self.before_mutation = before_mutation
+            self.mutation_diff = mutation_diff
         self.mutated_from = mutated_from
 
     def set_parents(self, parent1_id, parent2_id):
@@ -50,6 +151,7 @@ class IndividualData:
             self.mutated_from = -1
             self.age = 0
             self.before_mutation = None
+            self.mutation_diff = None
         self.parent1_id = parent1_id
         self.parent2_id = parent2_id
 
@@ -57,7 +159,7 @@ class IndividualData:
         return str(self.to_dict())
 
     def to_dict(self) -> dict:
-        return {
+        data = {
             'id': self.id,
             'age': self.age,
             'mutated_from': self.mutated_from,
@@ -65,3 +167,8 @@ class IndividualData:
             'parent2_id': self.parent2_id,
             'before_mutation': self.before_mutation,
         }
+        if self.mutation_diff is not None:
+            data['mutation_diff'] = self.mutation_diff
+        if self.predicted:
+            data['predicted'] = True
+        return data
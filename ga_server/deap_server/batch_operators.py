@@ -0,0 +1,200 @@
+"""
+Population-level variation operators.
+Instead of being called once per pair (or individual), they are called once per generation
+with all the selected parents, which are converted to a 2D array and varied in one vectorized pass.
+
+They can be registered like any other operator with `DEAPServer.register_mate` and `DEAPServer.register_mutate`,
+but need an algorithm that knows how to call them, like the ones in `variation.py`.
+
+Like DEAP's operators, they modify the given individuals in place:
+- mate operators take two lists of individuals (the first and second parent of each pair) and return them
+- mutate operators take a list of individuals and return it
+"""
+import array
+import functools
+import random
+
+import numpy
+
+
+def is_batched(function) -> bool:
+    # toolbox functions are partials
+    return getattr(getattr(function, 'func', function), 'batched', False)
+
+def get_rng() -> numpy.random.Generator:
+    # seeded from the random module, so that random.seed also controls the batched operators
+    return numpy.random.default_rng(random.getrandbits(64))
+
+def population_to_array(population) -> numpy.ndarray:
+    first = population[0]
+    if isinstance(first, array.array):
+        data = b"".join(ind.tobytes() for ind in population)
+        return numpy.frombuffer(data, dtype=first.typecode).reshape(len(population), -1).copy()
+    return numpy.array([list(ind) for ind in population])
+
+def assign_rows(population, rows: numpy.ndarray):
+    first = population[0]
+    if isinstance(first, array.array):
+        rows = numpy.ascontiguousarray(rows, dtype=first.typecode)
+        for ind, row in zip(population, rows):
+            ind[:] = array.array(ind.typecode, row.tobytes())
+    else:
+        for ind, row in zip(population, rows.tolist()):
+            ind[:] = row
+
+def batched_mate(kernel):
+    """
+    Turns a kernel `(parents1: ndarray, parents2: ndarray, rng, **kwargs) -> (ndarray, ndarray)` into a batched mate operator.
+    """
+    @functools.wraps(kernel)
+    def mate(parents1: list, parents2: list, **kwargs):
+        if len(parents1) == 0:
+            return parents1, parents2
+        children1, children2 = kernel(population_to_array(parents1), population_to_array(parents2), get_rng(), **kwargs)
+        assign_rows(parents1, children1)
+        assign_rows(parents2, children2)
+        return parents1, parents2
+    mate.batched = True
+    return mate
+
+def batched_mutate(kernel):
+    """
+    Turns a kernel `(population: ndarray, rng, **kwargs) -> ndarray` into a batched mutate operator.
+    """
+    @functools.wraps(kernel)
+    def mutate(population: list, **kwargs):
+        if len(population) == 0:
+            return population
+        assign_rows(population, kernel(population_to_array(population), get_rng(), **kwargs))
+        return population
+    mutate.batched = True
+    return mutate
+
+def clip(values: numpy.ndarray, low, up) -> numpy.ndarray:
+    if low is None and up is None:
+        return values
+    return numpy.clip(values, low, up)
+
+def cut_points(rng: numpy.random.Generator, n: int, low: int, high: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Two distinct cut points per row in `[low, high]`, sorted.
+    """
+    first = rng.integers(low, high + 1, n)
+    second = rng.integers(low, high, n)
+    second += second >= first
+    return numpy.minimum(first, second), numpy.maximum(first, second)
+
+
+### Index permutations
+
+def partially_matched_kernel(parents1: numpy.ndarray, parents2: numpy.ndarray, rng: numpy.random.Generator):
+    # same as tools.cxPartialyMatched, one column at a time for all the pairs
+    ind1, ind2 = parents1.copy(), parents2.copy()
+    n, size = ind1.shape
+    rows = numpy.arange(n)
+    positions = numpy.broadcast_to(numpy.arange(size, dtype=ind1.dtype), ind1.shape)
+    p1, p2 = numpy.empty_like(ind1), numpy.empty_like(ind2)
+    p1[rows[:, None], ind1] = positions
+    p2[rows[:, None], ind2] = positions
+
+    start, stop = cut_points(rng, n, 0, size)
+    for i in range(start.min(), stop.max()):
+        active = rows[(start <= i) & (i < stop)]
+        if len(active) == 0:
+            continue
+        temp1 = ind1[active, i]
+        temp2 = ind2[active, i]
+        ind1[active, p1[active, temp2]] = temp1
+        ind1[active, i] = temp2
+        ind2[active, p2[active, temp1]] = temp2
+        ind2[active, i] = temp1
+        p1[active, temp1], p1[active, temp2] = p1[active, temp2], p1[active, temp1]
+        p2[active, temp1], p2[active, temp2] = p2[active, temp2], p2[active, temp1]
+    return ind1, ind2
+
+def ordered_child(segment_parent: numpy.ndarray, order_parent: numpy.ndarray, start: numpy.ndarray, end: numpy.ndarray) -> numpy.ndarray:
+    """
+    Child with the genes of `segment_parent` in `[start, end]`,
+    and the other genes in the order they appear in `order_parent`, starting after `end`.
+    """
+    n, size = segment_parent.shape
+    rows = numpy.arange(n)[:, None]
+    columns = numpy.arange(size)[None, :]
+    in_segment = (columns >= start[:, None]) & (columns <= end[:, None])
+    segment_values = numpy.zeros((n, size), dtype=bool)
+    segment_values[rows, segment_parent] = in_segment
+
+    rotated = numpy.take_along_axis(order_parent, (end[:, None] + 1 + columns) % size, axis=1)
+    kept = ~numpy.take_along_axis(segment_values, rotated, axis=1)
+    compacted = numpy.take_along_axis(rotated, numpy.argsort(~kept, axis=1, kind='stable'), axis=1)
+
+    child = numpy.where(in_segment, segment_parent, 0).astype(segment_parent.dtype)
+    filled_rows, filled = numpy.nonzero(columns < (size - (end - start + 1))[:, None])
+    child[filled_rows, (end[filled_rows] + 1 + filled) % size] = compacted[filled_rows, filled]
+    return child
+
+def ordered_kernel(parents1: numpy.ndarray, parents2: numpy.ndarray, rng: numpy.random.Generator):
+    # same as tools.cxOrdered
+    start, end = cut_points(rng, len(parents1), 0, parents1.shape[1] - 1)
+    return ordered_child(parents2, parents1, start, end), ordered_child(parents1, parents2, start, end)
+
+def shuffle_indexes_kernel(population: numpy.ndarray, rng: numpy.random.Generator, indpb: float):
+    # same as tools.mutShuffleIndexes, one column at a time for all the individuals
+    population = population.copy()
+    n, size = population.shape
+    swapped = rng.random((n, size)) < indpb
+    for i in numpy.nonzero(swapped.any(axis=0))[0]:
+        rows = numpy.nonzero(swapped[:, i])[0]
+        other = rng.integers(0, size - 1, len(rows))
+        other += other >= i
+        population[rows, i], population[rows, other] = population[rows, other], population[rows, i]
+    return population
+
+
+### Ranges
+
+def blend_kernel(parents1: numpy.ndarray, parents2: numpy.ndarray, rng: numpy.random.Generator, alpha: float, low=None, up=None):
+    # same as tools.cxBlend, children are clipped to [low, up]
+    gamma = (1.0 + 2.0 * alpha) * rng.random(parents1.shape) - alpha
+    children1 = (1.0 - gamma) * parents1 + gamma * parents2
+    children2 = gamma * parents1 + (1.0 - gamma) * parents2
+    return clip(children1, low, up), clip(children2, low, up)
+
+def gaussian_kernel(population: numpy.ndarray, rng: numpy.random.Generator, mu, sigma, indpb: float, low=None, up=None):
+    # same as tools.mutGaussian, individuals are clipped to [low, up]
+    mutated = rng.random(population.shape) < indpb
+    noise = rng.normal(mu, sigma, population.shape)
+    return clip(numpy.where(mutated, population + noise, population), low, up)
+
+
+### Booleans
+
+def uniform_kernel(parents1: numpy.ndarray, parents2: numpy.ndarray, rng: numpy.random.Generator, indpb: float):
+    # same as tools.cxUniform
+    swapped = rng.random(parents1.shape) < indpb
+    return numpy.where(swapped, parents2, parents1), numpy.where(swapped, parents1, parents2)
+
+def two_point_kernel(parents1: numpy.ndarray, parents2: numpy.ndarray, rng: numpy.random.Generator):
+    # same as tools.cxTwoPoint
+    n, size = parents1.shape
+    start, stop = cut_points(rng, n, 1, size)
+    columns = numpy.arange(size)[None, :]
+    swapped = (columns >= start[:, None]) & (columns < stop[:, None])
+    return numpy.where(swapped, parents2, parents1), numpy.where(swapped, parents1, parents2)
+
+def flip_bit_kernel(population: numpy.ndarray, rng: numpy.random.Generator, indpb: float):
+    # same as tools.mutFlipBit
+    flipped = rng.random(population.shape) < indpb
+    return numpy.where(flipped, population == 0, population).astype(population.dtype)
+
+
+cx_partially_matched_batch = batched_mate(partially_matched_kernel)
+cx_ordered_batch = batched_mate(ordered_kernel)
+mut_shuffle_indexes_batch = batched_mutate(shuffle_indexes_kernel)
+
+cx_blend_batch = batched_mate(blend_kernel)
+mut_gaussian_batch = batched_mutate(gaussian_kernel)
+
+cx_uniform_batch = batched_mate(uniform_kernel)
+cx_two_point_batch = batched_mate(two_point_kernel)
+mut_flip_bit_batch = batched_mutate(flip_bit_kernel)
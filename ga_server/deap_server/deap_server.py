@@ -1,12 +1,21 @@
 
 from copy import deepcopy
 import json
-from typing import Dict, List, Tuple, Callable
+from threading import Lock
+from typing import Dict, List, Literal, Tuple, Callable
 from deap import base, tools, algorithms, creator
-from ga_server.deap_server.IndividualData import IndividualData
+from ga_server.deap_server.IndividualData import IdCounter, IndividualData, use_id_counter
 from ga_server.deap_server.deap_settings import DeapSetting
 from ga_server.deap_server.individual_encoding import get_ind_enc_indexes
+from ga_server.deap_server.pareto import ParetoArchive
+from ga_server.deap_server.replay import replay
+from ga_server.deap_server.scheduler import GenerationScheduler
+from ga_server.deap_server.session_log import SessionLog, get_log_path, install_random_routing, new_seed, session_random
+from ga_server.deap_server.stop_conditions import StopConditions
+from ga_server.deap_server.surrogate import Surrogate
 from ga_server.gas import GAServer
+from ga_server.sharding import GAShardRouter, start_shards
+from ga_server.problem import GAProblem
 from ga_server.deap_server.ga_data_deap import GADataDeap
 
 
@@ -18,21 +27,34 @@ class DEAPServer:
         additional_settings: dict={},
         title="Generic Genetic Algorithm",
         initial_pop_size=100,
-        stats = tools.Statistics(),
-        toolbox = base.Toolbox(),
-        halloffame = tools.HallOfFame(1),
+        stats = None,
+        toolbox = None,
+        halloffame = None,
         host: str = "localhost",
         port: int = 8080,
         general_stats_provider: Callable[[GADataDeap], Dict] | None = None,
         algorithm = algorithms.eaSimple,
-        settings: List[DeapSetting] = [],
+        settings: List[DeapSetting] | None = None,
         individual_encoding: dict[str,str] = get_ind_enc_indexes(),
+        setup: Callable[['DEAPServer'], None] | None = None,
+        pareto_archive: ParetoArchive | None = None,
+        surrogate: Surrogate | None = None,
+        session_log_dir: str | None = None,
+        max_session_memory: int | None = None,
+        scheduler: GenerationScheduler | None = None,
+        mutation_encoding: Literal['full', 'diff'] = 'full',
     ) -> None:
         self.algorithm_kwargs = algorithm_kwargs
-        self.toolbox = toolbox
-        self.stats = stats
+        self.toolbox = toolbox if toolbox is not None else base.Toolbox()
+        self.stats = stats if stats is not None else tools.Statistics()
         self.pop = []
-        self.hof = halloffame
+        self.hof = halloffame if halloffame is not None else tools.HallOfFame(1)
+        self.pareto_archive = pareto_archive
+        self.surrogate = surrogate
+        self.session_log_dir = session_log_dir
+        self.max_session_memory = max_session_memory
+        self.scheduler = scheduler
+        self.mutation_encoding = mutation_encoding
         self.general_stats_provider = general_stats_provider
         self.title = title
         self.initial_pop_size = initial_pop_size
@@ -47,12 +69,16 @@ class DEAPServer:
         self.mutate_default = ""
         self.select_default = ""
         self.algorithm = algorithm
-        self.settings = settings
+        self.settings = settings if settings is not None else []
 
         self.individual_encoding = individual_encoding
         self.additional_settings = additional_settings
         self.decorators: dict[str, list] = {}
 
+        self.setup = setup
+        self.initialized = False
+        self.initialize_mutex = Lock()
+
     def create(
         name,
         base,
@@ -95,9 +121,47 @@ class DEAPServer:
             self.toolbox.register("select", getattr(self.toolbox, f"select_{name}"))
 
 
-    def get_ga_data_provider(self):
-        return lambda: GADataDeap(
-            pop=self.toolbox.population(n=self.initial_pop_size),
+    def initialize(self):
+        """
+        Runs the setup function (loading the problem data, creating the `creator` classes,
+        registering the toolbox functions...) once, when the first session is created.
+        """
+        self.initialize_mutex.acquire(1)
+        try:
+            if self.initialized:
+                return
+            if self.session_log_dir is not None:
+                # before the setup registers the functions of `random`, so that logged sessions can be replayed
+                install_random_routing()
+            if self.setup is not None:
+                self.setup(self)
+            self.decorate("mutate", IndividualData.mutate_diff_decorator if self.mutation_encoding == 'diff' else IndividualData.mutate_decorator)
+            self.decorate("mate", IndividualData.mate_decorator)
+            self.initialized = True
+        finally:
+            self.initialize_mutex.release()
+
+    def create_population(self, seed: int | None, ids: IdCounter):
+        with use_id_counter(ids):
+            if seed is None:
+                return self.toolbox.population(n=self.initial_pop_size)
+            with session_random(seed):
+                return self.toolbox.population(n=self.initial_pop_size)
+
+    def create_ga_data(self, pop=None, seed: int | None = None) -> GADataDeap:
+        """
+        When sessions are logged, the initial population is created with a new seed.
+        """
+        self.initialize()
+        if pop is None and seed is None and self.session_log_dir is not None:
+            seed = new_seed()
+        ids = IdCounter()
+        return GADataDeap(
+            pop=self.create_population(seed, ids) if pop is None else pop,
+            ids=ids,
+            seed=seed,
+            memory_limit=self.max_session_memory,
+            priority=1.0 if self.scheduler is not None else None,
             toolbox=deepcopy(self.toolbox),
             algorithm_kwargs=deepcopy(self.algorithm_kwargs),
             additional_settings=deepcopy(self.additional_settings),
@@ -112,12 +176,37 @@ class DEAPServer:
             algorithm=deepcopy(self.algorithm),
             settings=deepcopy(self.settings),
             individual_encoding=deepcopy(self.individual_encoding),
-            decorators=self.decorators
+            decorators=self.decorators,
+            pareto_archive=deepcopy(self.pareto_archive),
+            surrogate=deepcopy(self.surrogate),
         )
 
-    def run(self):
+    def get_ga_data_provider(self):
+        return self.create_ga_data
+
+    def open_session_log(self, session: str, ga_data: GADataDeap):
+        ga_data.log = SessionLog(get_log_path(self.session_log_dir, session))
+        ga_data.log.append({"event": "create", "problem": self.title, "session": session, "seed": ga_data.seed})
+
+    def load_ga_data(self, state: dict) -> GADataDeap:
+        ga_data = self.create_ga_data(pop=state["pop"])
+        ga_data.set_state(state)
+        return ga_data
+
+    def get_commands(self) -> dict:
         json_enc = json.encoder.JSONEncoder(separators=(',', ':'))
 
+        def log_command(ga_data: GADataDeap, command: dict):
+            if ga_data.log is not None and "command" in command:
+                ga_data.log.append({"event": "command", "generation": ga_data.generation, **command})
+
+        def get_error_string(error: str, message: str) -> str:
+            return json_enc.encode({
+                "info": "error",
+                "error": error,
+                "message": message,
+            })
+
         def get_general_stats(ga_data: GADataDeap) -> Dict:
             general_stats = self.general_stats_provider(
                 ga_data
@@ -125,8 +214,13 @@ class DEAPServer:
             return {
                 **{
                     "Generation": str(ga_data.generation),
-                    "Population": str(len(ga_data.pop))
+                    "Population": str(len(ga_data.pop)),
+                    "Evaluations": str(ga_data.evaluations),
                 },
+                **({
+                    "Pareto front size": str(len(ga_data.pareto_archive))
+                } if ga_data.pareto_archive is not None else {}),
+                **(ga_data.surrogate.get_stats() if ga_data.surrogate is not None else {}),
                 **general_stats
             }
 
@@ -139,7 +233,30 @@ class DEAPServer:
                 }
             }))
 
-        def run_one_gen(ga_data: GADataDeap, _command, broadcast, _send_to_client):
+        def execute(ga_data: GADataDeap, step: Callable[[], bool], generations: int | None, broadcast):
+            """
+            Runs `step` (one generation, returns True to stop) at most `generations` times, on the scheduler if there is one.
+            The session is locked during each generation only, the other commands of the session run in between.
+            On the scheduler, the status and the place in the queue are broadcast after every generation.
+            """
+            def locked_step() -> bool:
+                with ga_data.lock:
+                    return step()
+
+            def send_status():
+                with ga_data.lock:
+                    broadcast(get_status_string(ga_data))
+
+            if self.scheduler is not None:
+                self.scheduler.run(ga_data, locked_step, generations, lambda: ga_data.priority, send_status)
+                return
+            generation = 0
+            while generations is None or generation < generations:
+                generation += 1
+                if locked_step():
+                    return
+
+        def one_gen(ga_data: GADataDeap, broadcast) -> bool:
             gen_stats = ga_data.run_one_gen()
             popdata = GADataDeap.get_pop_data(ga_data.pop)
             broadcast(json_enc.encode({
@@ -150,6 +267,12 @@ class DEAPServer:
                     "population": popdata
                 }
             }))
+            return False
+
+        def run_one_gen(ga_data: GADataDeap, command, broadcast, _send_to_client):
+            with ga_data.lock:
+                log_command(ga_data, command)
+            execute(ga_data, lambda: one_gen(ga_data, broadcast), 1, broadcast)
 
         def get_settings(ga_data: GADataDeap):
             return json_enc.encode({
@@ -170,6 +293,7 @@ class DEAPServer:
             send_to_client(get_settings_changelog(ga_data))
 
         def set_setting(ga_data: GADataDeap, command: dict, broadcast, _send_to_client) :
+            log_command(ga_data, command)
             update = ga_data.set_settings(command)
             if update:
                 broadcast(get_settings(ga_data))
@@ -178,41 +302,185 @@ class DEAPServer:
         def get_status_string(ga_data: GADataDeap) -> str:
             return json_enc.encode({
                 "info": "status",
-                "status": ga_data.get_status()
+                "status": ga_data.get_status(),
+                **({ "stop_reason": ga_data.stop_reason } if ga_data.stop_reason is not None else {}),
+                **({ "queue": queue } if (queue := get_queue_status(ga_data)) is not None else {}),
             })
 
+        def get_queue_status(ga_data: GADataDeap) -> dict | None:
+            if self.scheduler is None:
+                return None
+            return self.scheduler.get_queue_status(ga_data)
+
         def get_status(ga_data: GADataDeap, _command: dict, _broadcast, send_to_client):
             send_to_client(get_status_string(ga_data))
 
+        def get_pareto_front(ga_data: GADataDeap, _command: dict, _broadcast, send_to_client):
+            send_to_client(json_enc.encode({
+                "info": "pareto-front",
+                "pareto_front": ga_data.get_pareto_front()
+            }))
+
         def run_n_gen(ga_data: GADataDeap, command: dict, broadcast, send_to_client):
             n_gen = command["generations"]
             if type(n_gen) is not int or n_gen <= 0:
                 return
-            ga_data.working = True
-            broadcast(get_status_string(ga_data))
-            for _ in range(n_gen):
-                run_one_gen(ga_data, {}, broadcast, send_to_client)
-            ga_data.working = False
-            broadcast(get_status_string(ga_data))
+            with ga_data.lock:
+                log_command(ga_data, command)
+                ga_data.working = True
+                ga_data.stop_reason = None
+                broadcast(get_status_string(ga_data))
+            execute(ga_data, lambda: one_gen(ga_data, broadcast), n_gen, broadcast)
+            with ga_data.lock:
+                ga_data.working = False
+                broadcast(get_status_string(ga_data))
 
-        self.decorate("mutate", IndividualData.mutate_decorator)
-        self.decorate("mate", IndividualData.mate_decorator)
+        def run_until(ga_data: GADataDeap, command: dict, broadcast, send_to_client):
+            with ga_data.lock:
+                try:
+                    conditions = StopConditions.from_command(command, ga_data)
+                except ValueError as error:
+                    send_to_client(get_error_string("invalid_condition", str(error)))
+                    return
+                if conditions is None:
+                    return
+                log_command(ga_data, command)
+                ga_data.working = True
+                ga_data.stop_reason = None
+                broadcast(get_status_string(ga_data))
 
-        server: GAServer[GADataDeap] = GAServer(
-            self.host,
-            self.port,
+            def step() -> bool:
+                one_gen(ga_data, broadcast)
+                ga_data.stop_reason = conditions.check(ga_data)
+                return ga_data.stop_reason is not None
+
+            execute(ga_data, step, conditions.max_generations, broadcast)
+            with ga_data.lock:
+                ga_data.working = False
+                broadcast(get_status_string(ga_data))
+
+        def get_elites(ga_data: GADataDeap, command: dict, _broadcast, send_to_client):
+            k = command.get("k", 10)
+            fields = command.get("fields")
+            if type(k) is not int or k <= 0:
+                return
+            if fields is not None and (type(fields) is not list or any(type(field) is not str for field in fields)):
+                return
+            send_to_client(json_enc.encode({
+                "info": "elites",
+                "size": len(ga_data.hof),
+                "elites": ga_data.get_elites(k, fields),
+            }))
+
+        def get_generation(ga_data: GADataDeap, command: dict, _broadcast, send_to_client):
+            generation = command.get("generation")
+            if type(generation) is not int or generation < 0 or generation > ga_data.generation:
+                return
+            population = ga_data.populations[generation]
+            if population is None:
+                # not kept in memory, rebuilt from the log
+                if ga_data.log is None:
+                    send_to_client(get_error_string(
+                        "generation_trimmed",
+                        f"Generation {generation} was dropped to keep the session under its memory limit, and the session has no log to rebuild it"
+                    ))
+                    return
+                ga_data.log.flush()
+                replayed = replay(self, ga_data.log.path, generation)
+                try:
+                    population = replayed.pop
+                finally:
+                    replayed.close()
+            send_to_client(json_enc.encode({
+                "info": "generation",
+                "generation": generation,
+                "gen_stats": ga_data.records[generation - 1] if generation > 0 else None,
+                "population": GADataDeap.get_pop_data(population),
+            }))
+
+        return {
+            "info": info,
+            "run-one-gen": run_one_gen,
+            "settings": settings,
+            "set-setting": set_setting,
+            "get-status": get_status,
+            "run-n-gen": run_n_gen,
+            "run-until": run_until,
+            "settings-changelog": send_settings_changelog,
+            "get-pareto-front": get_pareto_front,
+            "get-generation": get_generation,
+            "get-elites": get_elites,
+        }
+
+    def get_problem(self) -> GAProblem[GADataDeap]:
+        return GAProblem(
+            self.title,
             self.get_ga_data_provider(),
-            commands = {
-                "info": info,
-                "run-one-gen": run_one_gen,
-                "settings": settings,
-                "set-setting": set_setting,
-                "get-status": get_status,
-                "run-n-gen": run_n_gen,
-                "settings-changelog": send_settings_changelog,
-            },
-            command_protocol = "generic",
-            title=self.title
+            commands=self.get_commands(),
+            command_protocol="generic",
+            dump_session=GADataDeap.get_state,
+            load_session=self.load_ga_data,
+            session_created=self.open_session_log if self.session_log_dir is not None else None,
+            memory_usage=GADataDeap.get_memory_usage,
+            close_session=GADataDeap.close,
+            session_lock=lambda ga_data: ga_data.lock,
+            # the runs lock the session during each generation
+            unlocked_commands={"run-one-gen", "run-n-gen", "run-until"},
+        )
+
+    def run(
+        self,
+        hibernate_after: float | None = None,
+        relay_socket: str | None = None,
+        max_memory: int | None = None,
+        scheduler_workers: int | None = None,
+        shards: int | None = None,
+    ):
+        DEAPServer.serve([self], self.host, self.port, hibernate_after, relay_socket, max_memory, scheduler_workers, shards)
+
+    def serve(
+        problems: List['DEAPServer'],
+        host: str = "localhost",
+        port: int = 8080,
+        hibernate_after: float | None = None,
+        relay_socket: str | None = None,
+        max_memory: int | None = None,
+        scheduler_workers: int | None = None,
+        shards: int | None = None,
+    ):
+        """
+        Hosts several problems on one server.
+        Problems are only initialized when the first session using them is created.
+        Sessions left without any client for `hibernate_after` seconds are saved to disk until they are used again.
+        Relay processes can serve the clients through the Unix socket `relay_socket` (see `ga_server/relay.py`).
+        New sessions are rejected while the sessions in memory use more than `max_memory` bytes.
+        With `scheduler_workers`, the generations of all the sessions are run by a shared `GenerationScheduler`
+        with this number of threads, unless the problem already has a scheduler.
+        With `shards`, the sessions are spread over this number of worker processes behind one front-end (see `ga_server/sharding.py`),
+        `max_memory` and `scheduler_workers` then apply to each worker.
+        """
+        if shards is not None:
+            if relay_socket is not None:
+                raise ValueError("relay_socket can't be used with shards")
+
+            def serve_shard(_index: int, socket_path: str):
+                DEAPServer.serve(problems, host, None, hibernate_after, socket_path, max_memory, scheduler_workers)
+
+            GAShardRouter(start_shards(shards, serve_shard), host, port).run()
+            return
+
+        if scheduler_workers is not None:
+            scheduler = GenerationScheduler(scheduler_workers)
+            for problem in problems:
+                if problem.scheduler is None:
+                    problem.scheduler = scheduler
+        server: GAServer[GADataDeap] = GAServer(
+            host,
+            port,
+            problems=[problem.get_problem() for problem in problems],
+            hibernate_after=hibernate_after,
+            relay_socket=relay_socket,
+            max_memory=max_memory,
         )
 
         server.run()
\ No newline at end of file
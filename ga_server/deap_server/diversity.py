@@ -0,0 +1,114 @@
+"""
+Population diversity metrics with a bounded cost per generation, for each individual encoding
+(see `individual_encoding.py`). All the metrics are between 0 (every individual is the same) and 1.
+- `entropy`: mean entropy of the genes at each locus, normalized by its maximum
+- `distance`: mean distance between randomly sampled pairs of individuals (Hamming distance for `indexes` and `boolean`,
+euclidean distance relative to the range for `range`)
+- `unique`: ratio of unique chromosomes
+"""
+import numpy
+
+from ga_server.deap_server.batch_operators import population_to_array
+
+METRICS = ['entropy', 'distance', 'unique']
+
+
+def locus_entropy(chromosomes: numpy.ndarray, values: numpy.ndarray, n_values: int) -> float:
+    """
+    `values` contains the gene values of `chromosomes` mapped to `0..n_values-1`.
+    The values of each locus are counted by sorting them, so the memory used is the size of the population,
+    whatever `n_values` (the chromosome length for `indexes`).
+    """
+    n, length = chromosomes.shape
+    if n < 2 or n_values < 2 or length == 0:
+        return 0.0
+    loci = numpy.sort(values.T, axis=1)
+    # first occurrence of every value of each locus, each locus starts a new run
+    starts = numpy.ones(loci.shape, dtype=bool)
+    starts[:, 1:] = loci[:, 1:] != loci[:, :-1]
+    first = numpy.flatnonzero(starts)
+    probabilities = numpy.diff(first, append=loci.size) / n
+    entropy = -numpy.bincount(first // n, weights=probabilities * numpy.log(probabilities), minlength=length)
+    return float(entropy.mean() / numpy.log(min(n, n_values)))
+
+def sampled_distance(chromosomes: numpy.ndarray, pairs: int, rng: numpy.random.Generator, scale: float | None = None) -> float:
+    """
+    Hamming distance when `scale` is None, otherwise euclidean distance divided by `scale`.
+    """
+    n, length = chromosomes.shape
+    if n < 2 or length == 0:
+        return 0.0
+    first = rng.integers(0, n, pairs)
+    second = (first + rng.integers(1, n, pairs)) % n
+    if scale is None:
+        return float((chromosomes[first] != chromosomes[second]).mean())
+    return float(numpy.sqrt(((chromosomes[first] - chromosomes[second]) ** 2).sum(axis=1)).mean() / scale)
+
+def unique_ratio(chromosomes: numpy.ndarray) -> float:
+    if len(chromosomes) == 0:
+        return 0.0
+    rows = numpy.ascontiguousarray(chromosomes)
+    return len(set(row.tobytes() for row in rows)) / len(rows)
+
+
+class DiversityGraph:
+    """
+    Graph of diversity metrics, computed on the chromosomes of the population.
+
+    Params:
+    - individual_encoding: encoding of the individuals, as given to `DEAPServer`
+    - lines: name of each line and metric it shows (`entropy`, `distance`, `unique`)
+    - sample_pairs: number of pairs of individuals used by the `distance` metric
+    - bins: number of intervals of the range used by the `entropy` metric of `range` encodings
+    """
+
+    def __init__(
+        self,
+        individual_encoding: dict,
+        lines: dict[str, str] = {'Entropy': 'entropy', 'Distance': 'distance', 'Unique': 'unique'},
+        sample_pairs: int = 256,
+        bins: int = 10,
+        seed: int = 0,
+    ):
+        for metric in lines.values():
+            if metric not in METRICS:
+                raise ValueError(f'Unknown diversity metric "{metric}"')
+        self.encoding_type = individual_encoding['encoding_type']
+        self.range = individual_encoding.get('range')
+        self.lines = lines
+        self.sample_pairs = sample_pairs
+        self.bins = bins
+        self.rng = numpy.random.default_rng(seed)
+
+    def get_entropy(self, chromosomes: numpy.ndarray) -> float:
+        match self.encoding_type:
+            case 'boolean':
+                return locus_entropy(chromosomes, chromosomes.astype(numpy.int64), 2)
+            case 'range':
+                low, up = self.range
+                values = numpy.clip(((chromosomes - low) / (up - low) * self.bins).astype(numpy.int64), 0, self.bins - 1)
+                return locus_entropy(chromosomes, values, self.bins)
+            case _:
+                return locus_entropy(chromosomes, chromosomes.astype(numpy.int64), chromosomes.shape[1])
+
+    def get_distance(self, chromosomes: numpy.ndarray) -> float:
+        if self.encoding_type == 'range':
+            low, up = self.range
+            return sampled_distance(chromosomes.astype(numpy.float64), self.sample_pairs, self.rng, (up - low) * numpy.sqrt(chromosomes.shape[1]))
+        return sampled_distance(chromosomes, self.sample_pairs, self.rng)
+
+    def compute(self, population) -> dict[str, float]:
+        if len(population) == 0:
+            return {line: 0.0 for line in self.lines}
+        chromosomes = population_to_array(population)
+        metrics = {}
+        for line, metric in self.lines.items():
+            if metric not in metrics:
+                match metric:
+                    case 'entropy':
+                        metrics[metric] = self.get_entropy(chromosomes)
+                    case 'distance':
+                        metrics[metric] = self.get_distance(chromosomes)
+                    case 'unique':
+                        metrics[metric] = unique_ratio(chromosomes)
+        return {line: metrics[metric] for line, metric in self.lines.items()}
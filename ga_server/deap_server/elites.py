@@ -0,0 +1,78 @@
+"""
+Bounded archive of the best distinct individuals, that can replace `tools.HallOfFame` (`halloffame` argument of `DEAPServer`).
+Individuals are kept in a heap with the worst one on top, and a set of chromosomes is used to skip duplicates,
+so each offspring is inserted in O(log n) instead of the linear search and list insertion of `tools.HallOfFame`.
+"""
+import heapq
+from copy import deepcopy
+
+from ga_server.deap_server.pareto import chromosome_key
+
+
+class EliteArchive:
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # (weighted fitness, insertion order, chromosome key, individual)
+        self.heap: list[tuple[tuple, int, bytes | tuple, object]] = []
+        self.keys: set[bytes | tuple] = set()
+        # insertion order of the next individual, a plain int so that the archive can be copied and pickled
+        self.counter = 0
+        self.sorted_items: list | None = None
+        # entry of the best individual, the heap only drops its worst individuals so it is kept up to date in O(1)
+        self.best_entry: tuple | None = None
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def __getitem__(self, index):
+        if index == 0 and self.best_entry is not None:
+            # `hof[0]` is read after every generation, it doesn't need the sorted individuals
+            return self.best_entry[3]
+        return self.items[index]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def update(self, population):
+        for ind in population:
+            if not ind.fitness.valid:
+                continue
+            wvalues = ind.fitness.wvalues
+            if len(self.heap) >= self.maxsize and wvalues <= self.heap[0][0]:
+                continue
+            key = chromosome_key(ind)
+            if key in self.keys:
+                continue
+            entry = (wvalues, self.counter, key, deepcopy(ind))
+            self.counter += 1
+            self.keys.add(key)
+            if self.best_entry is None or (wvalues, -entry[1]) > (self.best_entry[0], -self.best_entry[1]):
+                self.best_entry = entry
+            if len(self.heap) < self.maxsize:
+                heapq.heappush(self.heap, entry)
+            else:
+                self.keys.discard(heapq.heapreplace(self.heap, entry)[2])
+            self.sorted_items = None
+
+    @property
+    def items(self) -> list:
+        """
+        Individuals sorted from the best to the worst, like `tools.HallOfFame.items`.
+        """
+        if self.sorted_items is None:
+            self.sorted_items = [entry[3] for entry in sorted(self.heap, key=lambda entry: (entry[0], -entry[1]), reverse=True)]
+        return self.sorted_items
+
+    def top(self, k: int) -> list:
+        if k == 1 and self.best_entry is not None:
+            return [self.best_entry[3]]
+        if self.sorted_items is not None or k >= len(self.heap):
+            return self.items[:k]
+        return [entry[3] for entry in heapq.nlargest(k, self.heap, key=lambda entry: (entry[0], -entry[1]))]
+
+    def clear(self):
+        self.heap = []
+        self.keys = set()
+        self.sorted_items = None
+        self.best_entry = None
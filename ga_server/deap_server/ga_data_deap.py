@@ -1,9 +1,14 @@
 from copy import deepcopy
+from threading import RLock
 from typing_extensions import Self
 from deap import algorithms, base, tools
 from typing import Any, List, Literal
-from .IndividualData import IndividualData
+from .IndividualData import IdCounter, IndividualData, use_id_counter
 from ga_server.deap_server.deap_settings import DeapSetting
+from ga_server.deap_server.memory import MemoryUsage, object_size, population_size
+from ga_server.deap_server.pareto import ParetoArchive
+from ga_server.deap_server.session_log import SessionLog, new_seed, session_random
+from ga_server.deap_server.surrogate import RealFitnessArchive, Surrogate, real_individuals
 
 def isnum(var):
     return type(var) is float or type(var) is int
@@ -28,6 +33,12 @@ class GADataDeap:
         individual_encoding: dict[str, str],
         decorators: dict[str, list],
         algorithm = algorithms.eaSimple,
+        pareto_archive: ParetoArchive | None = None,
+        surrogate: Surrogate | None = None,
+        seed: int | None = None,
+        memory_limit: int | None = None,
+        priority: float | None = None,
+        ids: IdCounter | None = None,
     ):
         self.pop = pop
         self.toolbox = toolbox
@@ -47,9 +58,29 @@ class GADataDeap:
         self.algorithm = algorithm
         self.individual_encoding = individual_encoding
         self.working = False
+        # held by the commands of the session, and by the runs during each generation
+        self.lock = RLock()
+        self.stop_reason: dict | None = None
+        self.evaluations = 0
         self.settings_changelog = []
         self.populations = [deepcopy(self.pop)]
+        # populations of the history are replaced by None, oldest first, when the session uses more than `memory_limit` bytes
+        self.memory_limit = memory_limit
+        self.memory = MemoryUsage()
+        self.trimmed_generations = 0
+        self.memory.population = self.memory.history = population_size(self.pop)
         self.decorators = decorators
+        self.pareto_archive = pareto_archive
+        self.surrogate = surrogate
+        # share of the scheduler given to the session, when generations are scheduled
+        self.priority = priority
+        # seed used to create the initial population, and log of the session
+        self.seed = seed
+        self.log: SessionLog | None = None
+        # ids of the individuals of the session
+        self.ids = ids if ids is not None else IdCounter()
+        if self.surrogate is not None:
+            self.surrogate.install(self.toolbox)
         self.add_default_settings()
         self.add_settings_to_changelog()
 
@@ -86,6 +117,24 @@ class GADataDeap:
                 handler=GADataDeap.upd_select,
                 values=self.select_settings
             ))
+        if self.priority is not None:
+            self.settings.append(DeapSetting(
+                setting_type='number',
+                name='Priority',
+                get_value=lambda ga_data: ga_data.priority,
+                handler=GADataDeap.upd_priority,
+                setting_range=[0.1, 10.0],
+                min_increment=0.1,
+            ))
+        if self.surrogate is not None:
+            self.settings.append(DeapSetting(
+                setting_type='number',
+                name='Real evaluation ratio',
+                get_value=lambda ga_data: ga_data.surrogate.ratio,
+                handler=GADataDeap.upd_surrogate_ratio,
+                setting_range=[0.0, 1.0],
+                min_increment=0.05,
+            ))
 
     ### Settings
 
@@ -113,6 +162,12 @@ class GADataDeap:
             for decorator in ga_data.decorators["select"]:
                 ga_data.toolbox.decorate("select", decorator)
 
+    def upd_priority(ga_data: Self, setting_value):
+        ga_data.priority = setting_value
+
+    def upd_surrogate_ratio(ga_data: Self, setting_value):
+        ga_data.surrogate.ratio = setting_value
+
     ### Utils
 
     def get_pop_data(population) -> List[dict]:
@@ -125,33 +180,100 @@ class GADataDeap:
 
     ### Actions
 
-    def run_one_gen(self) -> dict:
+    def run_one_gen(self, seed: int | None = None) -> dict:
+        """
+        When the session is logged, the random generators are seeded with a new seed, written to the log.
+        """
+        if seed is None and self.log is not None:
+            seed = new_seed()
+        if self.log is not None:
+            self.log.append({"event": "generation", "generation": self.generation, "seed": seed, "next_id": self.ids.next_id})
+        with use_id_counter(self.ids):
+            if seed is None:
+                return self.run_generation()
+            with session_random(seed):
+                return self.run_generation()
+
+    def run_generation(self) -> dict:
         aged_ids = []
         for ind in self.pop:
             if ind.visualization_data.id not in aged_ids:
                 ind.visualization_data.age += 1
                 aged_ids.append(ind.visualization_data.id)
-        self.algorithm(self.pop, self.toolbox, **self.algorithm_kwargs, halloffame=self.hof)
+        real_evaluations = self.surrogate.real_evaluations if self.surrogate is not None else 0
+        # individuals with a fitness predicted by the surrogate are not archived
+        halloffame = RealFitnessArchive(self.hof) if self.surrogate is not None else self.hof
+        result = self.algorithm(self.pop, self.toolbox, **self.algorithm_kwargs, halloffame=halloffame)
+        if self.surrogate is not None:
+            # only the calls to toolbox.evaluate are counted
+            self.evaluations += self.surrogate.real_evaluations - real_evaluations
+        elif type(result) is tuple and len(result) == 2 and isinstance(result[1], tools.Logbook):
+            self.evaluations += sum(result[1].select('nevals'))
         self.populations.append(deepcopy(self.pop))
+        self.memory.population = population_size(self.pop)
+        self.memory.history += self.memory.population
+        evaluated = self.pop if self.surrogate is None else real_individuals(self.pop)
+        if self.pareto_archive is not None:
+            self.pareto_archive.update(evaluated)
 
-        record = self.stats.compile(self.pop)
+        # predicted fitnesses are left out of the stats too, so that stop conditions never trigger on them
+        record = self.stats.compile(evaluated if len(evaluated) > 0 else self.pop)
         self.records.append(record)
+        self.memory.records += object_size(record)
+        self.trim_history()
 
         self.generation += 1
         return record
 
+    def trim_history(self):
+        if self.memory_limit is None:
+            return
+        # the last population is always kept
+        while self.memory.get_total() > self.memory_limit and self.trimmed_generations < len(self.populations) - 1:
+            self.memory.history -= population_size(self.populations[self.trimmed_generations])
+            self.populations[self.trimmed_generations] = None
+            self.trimmed_generations += 1
+
     ### Information
 
     def info(self) -> dict:
         return {
             "all_stats": self.records,
             "status": self.get_status(),
-            "populations": [GADataDeap.get_pop_data(pop) for pop in self.populations],
+            "populations": [GADataDeap.get_pop_data(pop) if pop is not None else None for pop in self.populations],
             "settings": self.get_settings(),
             "individual_encoding": self.individual_encoding,
             "settings_changelog": self.settings_changelog
         }
 
+    def get_pareto_front(self) -> List[dict]:
+        if self.pareto_archive is None:
+            return []
+        return [{
+            **data,
+            "objectives": list(ind.fitness.values),
+        } for ind, data in zip(self.pareto_archive.items, GADataDeap.get_pop_data(self.pareto_archive.items))]
+
+    def get_elites(self, k: int, fields: List[str] | None = None) -> List[dict]:
+        """
+        Best `k` individuals of the hall of fame, with only the given fields of `Individual` (and `objectives`) if any.
+        """
+        elites = self.hof.top(k) if hasattr(self.hof, "top") else self.hof.items[:k]
+        if fields is None:
+            return [{
+                **data,
+                "objectives": list(ind.fitness.values),
+            } for ind, data in zip(elites, GADataDeap.get_pop_data(elites))]
+        getters = {
+            "id": lambda ind: ind.visualization_data.id,
+            "chromosome": lambda ind: ind.tolist(),
+            "fitness": lambda ind: sum(ind.fitness.wvalues) if len(ind.fitness.wvalues) > 0 else None,
+            "objectives": lambda ind: list(ind.fitness.values),
+            **{field: (lambda field: lambda ind: ind.visualization_data.to_dict().get(field))(field) for field in ['age', 'mutated_from', 'parent1_id', 'parent2_id', 'before_mutation', 'mutation_diff']},
+        }
+        getters = {field: getters[field] for field in fields if field in getters}
+        return [{field: getter(ind) for field, getter in getters.items()} for ind in elites]
+
     def get_settings(self) -> dict:
         settings = {}
         for setting in self.settings:
@@ -175,8 +297,84 @@ class GADataDeap:
                         'setting': setting.name,
                         'value': setting.get_value(self),
                     })
+                    if self.log is not None:
+                        self.log.append({
+                            "event": "setting",
+                            "generation": self.generation,
+                            "setting": setting.name,
+                            "value": setting.get_value(self),
+                        })
                     break
         return True
 
+    ### Hibernation
+
+    def get_state(self) -> dict:
+        """
+        Picklable state of the session. The toolbox, the algorithm and the settings are recreated by the `DEAPServer`.
+        """
+        if self.log is not None:
+            self.log.flush()
+        return {
+            "seed": self.seed,
+            "next_id": self.ids.next_id,
+            "log_path": self.log.path if self.log is not None else None,
+            "pop": self.pop,
+            "populations": self.populations,
+            "records": self.records,
+            "generation": self.generation,
+            "evaluations": self.evaluations,
+            "stop_reason": self.stop_reason,
+            "settings_changelog": self.settings_changelog,
+            "hof": self.hof,
+            "pareto_archive": self.pareto_archive,
+            "algorithm_kwargs": self.algorithm_kwargs,
+            "additional_settings": self.additional_settings,
+            "stats": self.stats.get_state() if hasattr(self.stats, "get_state") else None,
+            "surrogate": self.surrogate.get_state() if self.surrogate is not None else None,
+            "settings": {setting.name: setting.get_value(self) for setting in self.settings},
+        }
+
+    def set_state(self, state: dict):
+        self.seed = state["seed"]
+        self.ids.next_id = state["next_id"]
+        if state["log_path"] is not None:
+            self.log = SessionLog(state["log_path"])
+        self.pop = state["pop"]
+        self.populations = state["populations"]
+        self.records = state["records"]
+        self.trimmed_generations = next((i for i, pop in enumerate(self.populations) if pop is not None), len(self.populations))
+        self.memory.population = population_size(self.pop)
+        self.memory.history = sum(population_size(pop) for pop in self.populations)
+        self.memory.records = sum(object_size(record) for record in self.records)
+        self.generation = state["generation"]
+        self.evaluations = state["evaluations"]
+        self.stop_reason = state["stop_reason"]
+        self.hof = state["hof"]
+        self.pareto_archive = state["pareto_archive"]
+        self.algorithm_kwargs = state["algorithm_kwargs"]
+        self.additional_settings = state["additional_settings"]
+        if state["stats"] is not None:
+            self.stats.set_state(state["stats"])
+        if state["surrogate"] is not None:
+            self.surrogate.set_state(state["surrogate"])
+        for setting in self.settings:
+            if setting.name in state["settings"]:
+                setting.set_setting(self, state["settings"][setting.name])
+        self.settings_changelog = state["settings_changelog"]
+
+    def close(self):
+        """
+        Called when the session is deleted or hibernated.
+        """
+        if hasattr(self.algorithm, "close"):
+            self.algorithm.close()
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def get_memory_usage(self) -> int:
+        return self.memory.get_total()
+
     def get_status(self) -> Literal['working', 'idle']:
         return 'working' if self.working else 'idle'
@@ -0,0 +1,54 @@
+"""
+Estimates of the memory used by the sessions. Populations are estimated from a sample of individuals,
+so that the cost does not depend on the population size.
+"""
+import array
+import sys
+
+# Number of individuals measured to estimate the size of a population
+SAMPLE_SIZE = 8
+
+
+def object_size(obj) -> int:
+    """
+    Size of an object and of the containers, strings and numbers it contains.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(object_size(key) + object_size(value) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(object_size(item) for item in obj)
+    return size
+
+def individual_size(individual) -> int:
+    size = sys.getsizeof(individual)
+    if not isinstance(individual, array.array):
+        size += sum(sys.getsizeof(gene) for gene in individual)
+    fitness = getattr(individual, "fitness", None)
+    if fitness is not None:
+        size += sys.getsizeof(fitness) + object_size(fitness.wvalues)
+    visualization_data = getattr(individual, "visualization_data", None)
+    if visualization_data is not None:
+        size += sys.getsizeof(visualization_data) + object_size(visualization_data.__dict__)
+    return size
+
+def population_size(population) -> int:
+    if population is None or len(population) == 0:
+        return 0
+    step = max(1, len(population) // SAMPLE_SIZE)
+    sample = population[::step][:SAMPLE_SIZE]
+    return sys.getsizeof(population) + sum(individual_size(ind) for ind in sample) * len(population) // len(sample)
+
+
+class MemoryUsage:
+    """
+    Memory used by a session, updated incrementally with every generation.
+    """
+
+    def __init__(self):
+        self.population = 0
+        self.history = 0
+        self.records = 0
+
+    def get_total(self) -> int:
+        return self.population + self.history + self.records
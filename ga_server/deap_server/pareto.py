@@ -0,0 +1,174 @@
+"""
+Vectorized multi-objective tools: non-dominated sorting, crowding distance, NSGA-II selection
+and a Pareto archive. Fitnesses are compared using their `wvalues` (maximization).
+"""
+import array
+from copy import deepcopy
+
+import numpy
+
+# Number of dominance comparisons computed at once
+CHUNK_CELLS = 1 << 22
+
+
+def chromosome_key(individual) -> bytes | tuple:
+    if isinstance(individual, array.array):
+        return individual.tobytes()
+    return tuple(individual)
+
+def get_wvalues(individuals) -> numpy.ndarray:
+    return numpy.array([ind.fitness.wvalues for ind in individuals], dtype=numpy.float64).reshape(len(individuals), -1)
+
+def dominance_matrix(wvalues: numpy.ndarray, other: numpy.ndarray | None = None) -> numpy.ndarray:
+    """
+    `matrix[i, j]` is True if `wvalues[i]` dominates `other[j]` (`wvalues[j]` by default).
+    """
+    other = wvalues if other is None else other
+    matrix = numpy.empty((len(wvalues), len(other)), dtype=bool)
+    rows = max(1, CHUNK_CELLS // max(len(other), 1))
+    for start in range(0, len(wvalues), rows):
+        chunk = wvalues[start:start + rows]
+        # one objective at a time, to keep the temporaries 2D
+        not_worse = numpy.ones((len(chunk), len(other)), dtype=bool)
+        better = numpy.zeros((len(chunk), len(other)), dtype=bool)
+        for objective in range(wvalues.shape[1]):
+            column, other_column = chunk[:, objective, None], other[None, :, objective]
+            not_worse &= column >= other_column
+            better |= column > other_column
+        matrix[start:start + rows] = not_worse & better
+    return matrix
+
+def is_dominated(wvalues: numpy.ndarray, by: numpy.ndarray) -> numpy.ndarray:
+    """
+    For each row of `wvalues`, whether any row of `by` dominates it.
+    """
+    if len(by) == 0 or len(wvalues) == 0:
+        return numpy.zeros(len(wvalues), dtype=bool)
+    return dominance_matrix(by, wvalues).any(axis=0)
+
+def non_dominated_sort(wvalues: numpy.ndarray, k: int | None = None, first_front_only: bool = False) -> list[numpy.ndarray]:
+    """
+    Same as `tools.sortNondominated`, but works on the weighted fitness values and returns the indexes of each front.
+    Stops once at least `k` individuals have been sorted.
+    """
+    n = len(wvalues)
+    k = n if k is None else min(k, n)
+    if n == 0 or k == 0:
+        return []
+    dominates = dominance_matrix(wvalues)
+    domination_count = dominates.sum(axis=0, dtype=numpy.int64)
+    remaining = numpy.ones(n, dtype=bool)
+    fronts = []
+    sorted_count = 0
+    while sorted_count < k:
+        front = numpy.nonzero(remaining & (domination_count == 0))[0]
+        fronts.append(front)
+        sorted_count += len(front)
+        if first_front_only:
+            break
+        remaining[front] = False
+        domination_count -= dominates[front].sum(axis=0, dtype=numpy.int64)
+    return fronts
+
+def crowding_distance(wvalues: numpy.ndarray) -> numpy.ndarray:
+    """
+    Same as the crowding distance of `tools.selNSGA2`.
+    """
+    n, n_obj = wvalues.shape
+    distances = numpy.zeros(n)
+    if n == 0:
+        return distances
+    for objective in range(n_obj):
+        order = numpy.argsort(wvalues[:, objective], kind='stable')
+        values = wvalues[order, objective]
+        distances[order[0]] = distances[order[-1]] = numpy.inf
+        norm = n_obj * (values[-1] - values[0])
+        if norm == 0 or n < 3:
+            continue
+        distances[order[1:-1]] += (values[2:] - values[:-2]) / norm
+    return distances
+
+def sel_nsga2(individuals, k: int):
+    """
+    Vectorized version of `tools.selNSGA2`. Can be registered with `DEAPServer.register_select`.
+    """
+    wvalues = get_wvalues(individuals)
+    fronts = non_dominated_sort(wvalues, k)
+    chosen = []
+    for front in fronts:
+        distances = crowding_distance(wvalues[front])
+        for index, distance in zip(front, distances):
+            individuals[index].fitness.crowding_dist = distance
+        if len(chosen) + len(front) <= k:
+            chosen.extend(front)
+        else:
+            order = numpy.argsort(-distances, kind='stable')
+            chosen.extend(front[order[:k - len(chosen)]])
+    return [individuals[i] for i in chosen]
+
+
+class ParetoArchive:
+    """
+    Non-dominated individuals found during a run, updated incrementally with every new population.
+    When `maxsize` is reached, the most crowded individuals are dropped.
+    """
+
+    def __init__(self, maxsize: int | None = None):
+        self.maxsize = maxsize
+        self.items = []
+        self.wvalues = numpy.empty((0, 0))
+        self.keys = set()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def update(self, population):
+        candidates = []
+        candidate_keys = set()
+        for ind in population:
+            if not ind.fitness.valid:
+                continue
+            key = chromosome_key(ind)
+            if key in self.keys or key in candidate_keys:
+                continue
+            candidate_keys.add(key)
+            candidates.append((key, ind))
+        if len(candidates) == 0:
+            return
+
+        wvalues = get_wvalues([ind for _, ind in candidates])
+        kept = ~is_dominated(wvalues, self.wvalues) if len(self.items) > 0 else numpy.ones(len(candidates), dtype=bool)
+        kept_indexes = numpy.nonzero(kept)[0]
+        kept_indexes = kept_indexes[non_dominated_sort(wvalues[kept_indexes], first_front_only=True)[0]] if len(kept_indexes) > 0 else kept_indexes
+        if len(kept_indexes) == 0:
+            return
+
+        new_wvalues = wvalues[kept_indexes]
+        if len(self.items) > 0:
+            survivors = ~is_dominated(self.wvalues, new_wvalues)
+            for index in numpy.nonzero(~survivors)[0]:
+                self.keys.discard(chromosome_key(self.items[index]))
+            self.items = [ind for ind, survives in zip(self.items, survivors) if survives]
+            self.wvalues = numpy.vstack([self.wvalues[survivors], new_wvalues])
+        else:
+            self.wvalues = new_wvalues
+        for index in kept_indexes:
+            key, ind = candidates[index]
+            self.keys.add(key)
+            self.items.append(deepcopy(ind))
+
+        if self.maxsize is not None and len(self.items) > self.maxsize:
+            self.truncate()
+
+    def truncate(self):
+        order = numpy.argsort(-crowding_distance(self.wvalues), kind='stable')
+        kept = numpy.sort(order[:self.maxsize])
+        for index in order[self.maxsize:]:
+            self.keys.discard(chromosome_key(self.items[index]))
+        self.items = [self.items[i] for i in kept]
+        self.wvalues = self.wvalues[kept]
+
+    def clear(self):
+        self.items = []
+        self.wvalues = numpy.empty((0, 0))
+        self.keys = set()
@@ -0,0 +1,61 @@
+"""
+Rebuilds a session from its log (see `session_log.py`), running the generations without any websocket server.
+Generations run with the seeds and the individual ids of the log, so the populations, the lineage and the stats are
+the same as during the session, as long as the algorithm draws its random numbers from `random` in the thread running it
+(numpy generators can be seeded from it, like in `batch_operators.py`).
+
+Usage: python -m ga_server.deap_server.replay <module>:<function returning the DEAPServer> <log file> [generation]
+Prints the stats record of each generation, as JSON lines.
+"""
+import importlib
+import json
+import sys
+from typing import Callable
+
+from ga_server.deap_server.ga_data_deap import GADataDeap
+from ga_server.deap_server.session_log import install_random_routing, read_events
+
+
+def replay(server, path: str, generation: int | None = None, on_generation: Callable[[GADataDeap], None] | None = None) -> GADataDeap:
+    """
+    Returns the session data after `generation` generations (all the generations of the log by default).
+    The server must not be initialized yet, unless it logs its sessions.
+    """
+    install_random_routing()
+    events = read_events(path)
+    if len(events) == 0 or events[0]["event"] != "create":
+        raise ValueError(f"{path} does not contain the creation of a session")
+    ga_data: GADataDeap = server.create_ga_data(seed=events[0]["seed"])
+    for event in events[1:]:
+        if generation is not None and ga_data.generation >= generation:
+            break
+        match event["event"]:
+            case "setting":
+                ga_data.set_settings({"settings": {event["setting"]: event["value"]}})
+            case "generation":
+                if "next_id" in event:
+                    ga_data.ids.next_id = event["next_id"]
+                ga_data.run_one_gen(seed=event["seed"])
+                if on_generation is not None:
+                    on_generation(ga_data)
+    if generation is not None and ga_data.generation < generation:
+        raise ValueError(f"{path} only contains {ga_data.generation} generations")
+    return ga_data
+
+def main():
+    if len(sys.argv) not in [3, 4]:
+        print(__doc__)
+        sys.exit(1)
+    module_name, function_name = sys.argv[1].split(":")
+    server = getattr(importlib.import_module(module_name), function_name)()
+    generation = int(sys.argv[3]) if len(sys.argv) == 4 else None
+    json_enc = json.JSONEncoder(separators=(',', ':'))
+    replay(
+        server,
+        sys.argv[2],
+        generation,
+        lambda ga_data: print(json_enc.encode({"generation": ga_data.generation, "stats": ga_data.records[-1]}))
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Fair-share scheduler of the generations of all the sessions.
+Commands running generations submit a job, that is split into quanta of one generation. The command runs each quantum
+in its own thread once the scheduler picks its job, and at most `workers` quanta run at the same time.
+Jobs are picked with stride scheduling: every quantum advances the pass of its job by its duration divided by the
+priority of the session, and the job with the lowest pass runs next. Sessions with expensive generations therefore get
+fewer quanta, and each session gets a share of the CPU proportional to its priority.
+The priority is read after every quantum, so that a change of the priority of a session applies to its running job.
+"""
+import time
+from threading import Condition
+from typing import Any, Callable
+
+# Weight of the last quantum in the estimated duration of a quantum
+DURATION_SMOOTHING = 0.3
+
+
+class Job:
+
+    def __init__(self, session: Any, step: Callable[[], bool], generations: int | None, get_priority: Callable[[], float], pass_value: float):
+        self.session = session
+        self.step = step
+        self.remaining = generations
+        self.get_priority = get_priority
+        self.pass_value = pass_value
+        self.duration: float | None = None
+        self.running = False
+
+    @property
+    def priority(self) -> float:
+        """
+        Current priority of the session.
+        """
+        return self.get_priority()
+
+
+class GenerationScheduler:
+    """
+    Params:
+    - workers: number of generations running at the same time
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = workers
+        self.condition = Condition()
+        self.jobs: list[Job] = []
+        # pass of the last quantum started, new jobs start from it so that they don't starve the others
+        self.virtual_time = 0.0
+
+    def run(
+        self,
+        session: Any,
+        step: Callable[[], bool],
+        generations: int | None = None,
+        get_priority: Callable[[], float] = lambda: 1.0,
+        on_quantum: Callable[[], None] | None = None,
+    ):
+        """
+        Runs `step` (one generation, returns True when the job is finished) at most `generations` times in the calling
+        thread, and returns once the job is finished. `get_priority` returns the current priority of the session.
+        `on_quantum` is called after every quantum but the last one, once the job is back in the queue.
+        """
+        if generations is not None and generations <= 0:
+            return
+        with self.condition:
+            job = Job(session, step, generations, get_priority, self.virtual_time)
+            self.jobs.append(job)
+            try:
+                while True:
+                    while self.next_job() is not job:
+                        self.condition.wait()
+                    job.running = True
+                    self.virtual_time = max(self.virtual_time, job.pass_value)
+
+                    # the quantum runs without the condition, the other jobs can be picked meanwhile
+                    self.condition.release()
+                    start = time.monotonic()
+                    try:
+                        finished = job.step()
+                    finally:
+                        duration = time.monotonic() - start
+                        self.condition.acquire()
+                        job.running = False
+                        job.pass_value += duration / job.priority
+                        job.duration = duration if job.duration is None else (1 - DURATION_SMOOTHING) * job.duration + DURATION_SMOOTHING * duration
+                        if job.remaining is not None:
+                            job.remaining -= 1
+                        self.condition.notify_all()
+                    if finished or job.remaining == 0:
+                        return
+                    if on_quantum is not None:
+                        self.condition.release()
+                        try:
+                            on_quantum()
+                        finally:
+                            self.condition.acquire()
+            finally:
+                self.jobs.remove(job)
+                self.condition.notify_all()
+
+    def next_job(self) -> Job | None:
+        """
+        Job whose next quantum can run, if a worker is free. Must be called with `condition` acquired.
+        """
+        running = [job for job in self.jobs if job.running]
+        if len(running) >= self.workers:
+            return None
+        running_sessions = set(id(job.session) for job in running)
+        ready = [job for job in self.jobs if not job.running and id(job.session) not in running_sessions]
+        return min(ready, key=lambda job: job.pass_value, default=None)
+
+    def get_queue_status(self, session: Any) -> dict | None:
+        """
+        Position of the job of the session in the queue (0 when it is running), and estimated time to complete it
+        in seconds (null when the number of generations is unknown).
+        """
+        with self.condition:
+            job = next((job for job in self.jobs if job.session is session), None)
+            if job is None:
+                return None
+            waiting = sorted((j for j in self.jobs if not j.running), key=lambda j: j.pass_value)
+            position = 0 if job.running else waiting.index(job) + 1
+            eta = None
+            if job.remaining is not None and job.duration is not None:
+                # share of the workers given to the job
+                total_priority = sum(j.priority for j in self.jobs)
+                share = min(1.0, self.workers * job.priority / total_priority)
+                eta = job.remaining * job.duration / share
+            return {
+                "position": position,
+                "eta": eta,
+                "jobs": len(self.jobs),
+            }
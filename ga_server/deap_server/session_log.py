@@ -0,0 +1,148 @@
+"""
+Append-only log of a session: creation, setting changes and generations, with the seed of the random generators
+used by each of them, so that any generation can be rebuilt with `replay.py`.
+Events are written as JSON lines, and the file is synced to the disk in batches.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import secrets
+import time
+from contextlib import contextmanager
+from threading import Lock, local
+
+# Functions of the `random` module can be routed to the generator of the session running in the current thread (see
+# `session_random`), so that sessions running at the same time each draw from their own seeded generator.
+# Routing slows every call down, so it is only installed when sessions are logged, before the problems register the
+# functions in their toolboxes.
+ROUTED_FUNCTIONS = [name for name in random.__all__ if callable(getattr(random.Random, name, None))]
+
+
+class SessionGenerator(local):
+    generator: random.Random | None = None
+
+session_generator = SessionGenerator()
+routing_mutex = Lock()
+routing_installed = False
+
+
+def route_random_function(name: str):
+    # bound method of the generator of the module, called directly outside of the sessions
+    module_function = getattr(random, name)
+
+    def function(*args, **kwargs):
+        generator = session_generator.generator
+        if generator is None:
+            return module_function(*args, **kwargs)
+        return getattr(generator, name)(*args, **kwargs)
+
+    function.__name__ = name
+    function.__doc__ = module_function.__doc__
+    return function
+
+def install_random_routing():
+    """
+    Routes the functions of the `random` module (once per process).
+    """
+    global routing_installed
+    routing_mutex.acquire(1)
+    try:
+        if routing_installed:
+            return
+        for function_name in ROUTED_FUNCTIONS:
+            setattr(random, function_name, route_random_function(function_name))
+        routing_installed = True
+    finally:
+        routing_mutex.release()
+
+
+def new_seed() -> int:
+    return secrets.randbits(32)
+
+@contextmanager
+def session_random(seed: int):
+    """
+    Calls to the `random` module made by the current thread use a generator seeded with `seed`,
+    once `install_random_routing` was called.
+    """
+    previous = session_generator.generator
+    session_generator.generator = random.Random(seed)
+    try:
+        yield
+    finally:
+        session_generator.generator = previous
+
+def get_log_path(directory: str, session: str) -> str:
+    name = re.sub(r'[^\w.-]', '_', session)[:64]
+    return os.path.join(directory, f"{name}-{hashlib.sha1(session.encode()).hexdigest()[:8]}.jsonl")
+
+
+class SessionLog:
+    """
+    Params:
+    - flush_every: number of buffered events that triggers a write
+    - flush_interval: seconds after which buffered events are written, checked when an event is added
+    """
+
+    json_enc = json.JSONEncoder(separators=(',', ':'))
+
+    def __init__(self, path: str, flush_every: int = 64, flush_interval: float = 1.0):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.file = open(path, "a", encoding="utf-8")
+        self.buffer: list[str] = []
+        self.last_flush = time.monotonic()
+        self.mutex = Lock()
+
+    def append(self, event: dict):
+        self.mutex.acquire(1)
+        try:
+            self.buffer.append(self.json_enc.encode(event))
+            if len(self.buffer) >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+        finally:
+            self.mutex.release()
+
+    def _flush(self):
+        if len(self.buffer) > 0:
+            self.file.write("\n".join(self.buffer) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        self.mutex.acquire(1)
+        try:
+            self._flush()
+        finally:
+            self.mutex.release()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_events(path: str) -> list[dict]:
+    """
+    Events of the last session created with this log file.
+    """
+    events = []
+    with open(path, encoding="utf-8") as log_file:
+        for line in log_file:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                # last line of a log that was not completely written
+                break
+            if event["event"] == "create":
+                events = []
+            events.append(event)
+    return events
@@ -0,0 +1,272 @@
+"""
+Statistics engine, replacing `tools.Statistics`.
+The fitness of the population is extracted once per generation as an array, and every registered
+reduction is computed once, even when it is used by several graphs.
+Running and windowed aggregates are computed across generations without storing the raw values.
+"""
+from collections import deque
+from typing import Any, Callable
+
+import numpy
+
+from ga_server.deap_server.diversity import DiversityGraph
+
+Column = int | Callable[[numpy.ndarray], numpy.ndarray] | None
+Reduction = str | Callable[[numpy.ndarray], float]
+
+MOMENT_REDUCTIONS = ['count', 'mean', 'var', 'std', 'min', 'max']
+
+
+def get_quantile(reduction: str) -> float | None:
+    """
+    Quantile represented by a reduction name: `median` or `qNN` (for example `q90`).
+    """
+    if reduction == 'median':
+        return 0.5
+    if len(reduction) > 1 and reduction[0] == 'q' and reduction[1:].replace('.', '', 1).isdigit():
+        return float(reduction[1:]) / 100.0
+    return None
+
+def reduce(values: numpy.ndarray, reduction: Reduction) -> float:
+    if callable(reduction):
+        return reduction(values)
+    match reduction:
+        case 'count':
+            return len(values)
+        case 'mean':
+            return numpy.mean(values)
+        case 'var':
+            return numpy.var(values)
+        case 'std':
+            return numpy.std(values)
+        case 'min':
+            return numpy.min(values)
+        case 'max':
+            return numpy.max(values)
+        case 'sum':
+            return numpy.sum(values)
+    quantile = get_quantile(reduction)
+    if quantile is None:
+        raise ValueError(f'Unknown reduction "{reduction}"')
+    return numpy.quantile(values, quantile)
+
+
+class RunningMoments:
+    """
+    Count, mean, variance (Welford / Chan et al.), minimum and maximum of a stream of values.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = numpy.inf
+        self.max = -numpy.inf
+
+    def of(values: numpy.ndarray) -> 'RunningMoments':
+        moments = RunningMoments()
+        if len(values) > 0:
+            moments.count = len(values)
+            moments.mean = float(numpy.mean(values))
+            moments.m2 = float(numpy.sum((values - moments.mean) ** 2))
+            moments.min = float(numpy.min(values))
+            moments.max = float(numpy.max(values))
+        return moments
+
+    def merge(self, other: 'RunningMoments'):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def update(self, values: numpy.ndarray):
+        self.merge(RunningMoments.of(values))
+
+    def get(self, reduction: str) -> float:
+        match reduction:
+            case 'count':
+                return self.count
+            case 'mean':
+                return self.mean
+            case 'var':
+                return self.m2 / self.count if self.count > 0 else 0.0
+            case 'std':
+                return numpy.sqrt(self.m2 / self.count) if self.count > 0 else 0.0
+            case 'min':
+                return self.min
+            case 'max':
+                return self.max
+        raise ValueError(f'Unknown reduction "{reduction}"')
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles of a stream of values in bounded memory.
+    Values are kept in levels, an item of level `i` represents `2^i` values. When a level has more than `capacity` items,
+    they are sorted and every other one is promoted to the next level.
+    """
+
+    def __init__(self, capacity: int = 256, seed: int = 0):
+        self.capacity = capacity
+        self.levels: list[numpy.ndarray] = [numpy.empty(0)]
+        self.rng = numpy.random.default_rng(seed)
+
+    def update(self, values: numpy.ndarray):
+        self.levels[0] = numpy.concatenate([self.levels[0], values])
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self.capacity:
+                items = numpy.sort(self.levels[level])
+                self.levels[level] = numpy.empty(0)
+                if level + 1 == len(self.levels):
+                    self.levels.append(numpy.empty(0))
+                self.levels[level + 1] = numpy.concatenate([self.levels[level + 1], items[self.rng.integers(0, 2)::2]])
+            level += 1
+
+    def get(self, quantile: float) -> float:
+        items = numpy.concatenate(self.levels)
+        if len(items) == 0:
+            return numpy.nan
+        weights = numpy.concatenate([numpy.full(len(level), 2 ** i) for i, level in enumerate(self.levels)])
+        order = numpy.argsort(items)
+        cumulative = numpy.cumsum(weights[order])
+        index = numpy.searchsorted(cumulative, quantile * cumulative[-1])
+        return items[order[min(index, len(items) - 1)]]
+
+
+class Aggregate:
+    """
+    Graph computed across generations, either over the whole run (`window` is None) or over the last `window` generations.
+    """
+
+    def __init__(self, lines: dict[str, str], window: int | None = None, sketch_capacity: int = 256):
+        for reduction in lines.values():
+            quantile = get_quantile(reduction)
+            if reduction not in MOMENT_REDUCTIONS and (quantile is None or window is not None):
+                raise ValueError(f'Reduction "{reduction}" is not available for {"windowed" if window else "running"} aggregates')
+        self.lines = lines
+        self.window = window
+        self.moments = RunningMoments()
+        self.history: deque[RunningMoments] = deque(maxlen=window) if window is not None else deque()
+        self.sketch = QuantileSketch(sketch_capacity) if any(get_quantile(r) is not None for r in lines.values()) else None
+
+    def update(self, values: numpy.ndarray) -> dict[str, float]:
+        if self.window is None:
+            self.moments.update(values)
+            moments = self.moments
+        else:
+            self.history.append(RunningMoments.of(values))
+            moments = RunningMoments()
+            for generation in self.history:
+                moments.merge(generation)
+        if self.sketch is not None:
+            self.sketch.update(values)
+
+        return {
+            line: float(moments.get(reduction) if reduction in MOMENT_REDUCTIONS else self.sketch.get(get_quantile(reduction)))
+            for line, reduction in self.lines.items()
+        }
+
+
+class StreamingStatistics:
+    """
+    Replacement of `tools.Statistics` for `DEAPServer`, with the same `compile` method.
+
+    `key` returns the values of an individual (a number or a tuple, one value per objective).
+    Graphs select the values they use with `column`: the index of an objective, or a function of the `(n, objectives)` array.
+    By default, the first objective is used.
+    Reductions are either names (`count`, `mean`, `var`, `std`, `min`, `max`, `sum`, `median`, `qNN`), or functions of the values.
+    """
+
+    def __init__(self, key: Callable[[Any], Any] = lambda ind: ind.fitness.values):
+        self.key = key
+        self.graphs: list[tuple[str, dict[str, Reduction], Column]] = []
+        self.aggregates: list[tuple[str, Aggregate, Column]] = []
+        self.diversity: list[tuple[str, DiversityGraph]] = []
+        self.fields: list[str] = []
+
+    def register(self, name: str, lines: dict[str, Reduction], column: Column = None):
+        """
+        Graph computed on the population of each generation.
+        """
+        self.graphs.append((name, lines, column))
+        self.fields.append(name)
+
+    def register_running(self, name: str, lines: dict[str, str], column: Column = None, sketch_capacity: int = 256):
+        """
+        Graph computed on all the generations since the start of the session.
+        Supports the moments (`count`, `mean`, `var`, `std`, `min`, `max`) and approximate quantiles (`median`, `qNN`).
+        """
+        self.aggregates.append((name, Aggregate(lines, sketch_capacity=sketch_capacity), column))
+        self.fields.append(name)
+
+    def register_window(self, name: str, lines: dict[str, str], window: int, column: Column = None):
+        """
+        Graph computed on the last `window` generations. Supports the moments only.
+        """
+        self.aggregates.append((name, Aggregate(lines, window), column))
+        self.fields.append(name)
+
+    def register_diversity(self, name: str, individual_encoding: dict, lines: dict[str, str] | None = None, **kwargs):
+        """
+        Graph of diversity metrics computed on the chromosomes (see `diversity.py`).
+        """
+        graph = DiversityGraph(individual_encoding, **kwargs) if lines is None else DiversityGraph(individual_encoding, lines, **kwargs)
+        self.diversity.append((name, graph))
+        self.fields.append(name)
+
+    def get_lines(self) -> dict[str, list[str]]:
+        """
+        Lines of every graph of the records.
+        """
+        return {
+            **{name: list(lines) for name, lines, _ in self.graphs},
+            **{name: list(aggregate.lines) for name, aggregate, _ in self.aggregates},
+            **{name: list(graph.lines) for name, graph in self.diversity},
+        }
+
+    def get_state(self) -> list[Aggregate]:
+        """
+        State of the running and windowed graphs, used to hibernate sessions.
+        """
+        return [aggregate for _, aggregate, _ in self.aggregates]
+
+    def set_state(self, state: list[Aggregate]):
+        self.aggregates = [(name, aggregate, column) for (name, _, column), aggregate in zip(self.aggregates, state)]
+
+    def get_values(self, population) -> numpy.ndarray:
+        values = numpy.array([self.key(ind) for ind in population], dtype=numpy.float64)
+        return values.reshape(len(population), -1)
+
+    def compile(self, population) -> dict:
+        values = self.get_values(population)
+        columns: dict[Column, numpy.ndarray] = {}
+        reductions: dict[tuple[Column, Reduction], float] = {}
+
+        def get_column(column: Column) -> numpy.ndarray:
+            if column not in columns:
+                if column is None:
+                    columns[column] = values[:, 0]
+                elif callable(column):
+                    columns[column] = numpy.asarray(column(values), dtype=numpy.float64)
+                else:
+                    columns[column] = values[:, column]
+            return columns[column]
+
+        record = {}
+        for name, lines, column in self.graphs:
+            record[name] = {}
+            for line, reduction in lines.items():
+                if (column, reduction) not in reductions:
+                    reductions[(column, reduction)] = float(reduce(get_column(column), reduction))
+                record[name][line] = reductions[(column, reduction)]
+        for name, aggregate, column in self.aggregates:
+            record[name] = aggregate.update(get_column(column))
+        for name, graph in self.diversity:
+            record[name] = graph.compute(population)
+        return record
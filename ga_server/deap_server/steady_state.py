@@ -0,0 +1,102 @@
+"""
+Asynchronous steady-state algorithm. There is no generation barrier: up to `workers` evaluations run at the same
+time, each completed evaluation is inserted into the population right away and a new offspring is dispatched.
+Progress is reported in virtual generations, one virtual generation being `len(population)` completed evaluations.
+"""
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from typing import Callable
+
+from deap import tools
+from ga_server.deap_server.variation import var_and
+
+
+def replace_worst(population, individual) -> int | None:
+    """
+    Index of the worst individual of the population, if it is worse than `individual`.
+    """
+    worst = min(range(len(population)), key=lambda i: population[i].fitness)
+    return worst if individual.fitness > population[worst].fitness else None
+
+
+class SteadyStateAsync:
+    """
+    Algorithm that can be passed to `DEAPServer` instead of `ea_simple`, with the same arguments.
+    `ngen` is the number of virtual generations run by each call.
+    Evaluations still running at the end of a call are kept and inserted during the next one.
+
+    Params:
+    - workers: number of evaluations running at the same time
+    - executor: creates the executor running `toolbox.evaluate`, a thread pool by default
+    - replace: index of the individual of the population replaced by a newly evaluated individual, or None to discard it
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        executor: Callable[[int], Executor] = ThreadPoolExecutor,
+        replace: Callable[[list, object], int | None] = replace_worst,
+    ):
+        self.workers = workers
+        self.executor_factory = executor
+        self.replace = replace
+        self.executor: Executor | None = None
+        self.pending: dict[Future, object] = {}
+
+    def __deepcopy__(self, memo):
+        # every session has its own executor and running evaluations
+        return SteadyStateAsync(self.workers, self.executor_factory, self.replace)
+
+    def close(self):
+        """
+        Stops the executor of the session, the evaluations still running are dropped.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.pending = {}
+
+    def dispatch(self, population, toolbox, cxpb, mutpb):
+        while len(self.pending) < self.workers:
+            for child in var_and(toolbox.select(population, 2), toolbox, cxpb, mutpb):
+                # children that were neither mated nor mutated are copies of their parents
+                if not child.fitness.valid and len(self.pending) < self.workers:
+                    self.pending[self.executor.submit(toolbox.evaluate, child)] = child
+
+    def __call__(self, population, toolbox, cxpb, mutpb, ngen=1, stats=None, halloffame=None, verbose=False):
+        if cxpb <= 0 and mutpb <= 0:
+            raise ValueError("The steady-state algorithm needs a crossover or a mutation probability above 0")
+        if self.executor is None:
+            self.executor = self.executor_factory(self.workers)
+
+        logbook = tools.Logbook()
+        logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+
+        invalid_ind = [ind for ind in population if not ind.fitness.valid]
+        for ind, fit in zip(invalid_ind, self.executor.map(toolbox.evaluate, invalid_ind)):
+            ind.fitness.values = fit
+        if halloffame is not None:
+            halloffame.update(population)
+        nevals = len(invalid_ind)
+
+        for gen in range(1, ngen + 1):
+            completed = 0
+            while completed < len(population):
+                self.dispatch(population, toolbox, cxpb, mutpb)
+                done, _ = wait(self.pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    child = self.pending.pop(future)
+                    child.fitness.values = future.result()
+                    completed += 1
+                    if halloffame is not None:
+                        halloffame.update([child])
+                    index = self.replace(population, child)
+                    if index is not None:
+                        population[index] = child
+
+            record = stats.compile(population) if stats else {}
+            logbook.record(gen=gen, nevals=nevals + completed, **record)
+            nevals = 0
+            if verbose:
+                print(logbook.stream)
+
+        return population, logbook
@@ -0,0 +1,189 @@
+import numbers
+import time
+from typing import Literal
+
+from deap import tools
+from ga_server.deap_server.ga_data_deap import GADataDeap
+
+def isnum(var):
+    # numpy numbers produced by `tools.Statistics` are real numbers too
+    return isinstance(var, numbers.Real) and not isinstance(var, bool)
+
+def get_record_lines(ga_data: GADataDeap) -> dict[str, list[str]] | None:
+    """
+    Lines of every graph of the generation stats, None when they can't be known before the first generation.
+    """
+    if hasattr(ga_data.stats, "get_lines"):
+        return ga_data.stats.get_lines()
+    if isinstance(ga_data.stats, tools.MultiStatistics):
+        return {name: list(stats.fields) for name, stats in ga_data.stats.items()}
+    if len(ga_data.records) > 0:
+        return {name: list(lines) for name, lines in ga_data.records[-1].items() if type(lines) is dict}
+    return None
+
+
+class RecordCondition:
+    """
+    Condition on one line of the generation stats (see `GADataDeap.records`).
+    """
+
+    def __init__(self, graph: str, line: str, direction: Literal['min', 'max'] = 'min'):
+        self.graph = graph
+        self.line = line
+        self.direction = direction
+
+    def get_value(self, record: dict) -> float | None:
+        value = record.get(self.graph, {}).get(self.line)
+        return value if isnum(value) else None
+
+    def is_better(self, value: float, reference: float, tolerance: float = 0) -> bool:
+        if self.direction == 'min':
+            return value < reference - tolerance
+        return value > reference + tolerance
+
+    def parse(arguments) -> dict | None:
+        if type(arguments) is not dict:
+            return None
+        if type(arguments.get("graph")) is not str or type(arguments.get("line")) is not str:
+            return None
+        if arguments.get("direction", "min") not in ["min", "max"]:
+            return None
+        return {
+            "graph": arguments["graph"],
+            "line": arguments["line"],
+            "direction": arguments.get("direction", "min"),
+        }
+
+
+class StopConditions:
+    """
+    Conditions of the `run-until` command, checked after every generation using the last stats record.
+    At least one budget (`max_generations`, `time_budget` or `evaluation_budget`) is required so that the run always ends.
+    """
+
+    def __init__(
+        self,
+        ga_data: GADataDeap,
+        max_generations: int | None = None,
+        time_budget: float | None = None,
+        evaluation_budget: int | None = None,
+        fitness_target: dict | None = None,
+        stagnation: dict | None = None,
+        diversity: dict | None = None,
+    ):
+        self.max_generations = max_generations
+        self.time_budget = time_budget
+        self.evaluation_budget = evaluation_budget
+
+        self.start_time = time.monotonic()
+        self.start_generation = ga_data.generation
+        self.start_evaluations = ga_data.evaluations
+
+        self.fitness_target = None
+        if fitness_target is not None:
+            self.fitness_target = RecordCondition(**RecordCondition.parse(fitness_target))
+            self.target_value = fitness_target["value"]
+
+        self.stagnation = None
+        if stagnation is not None:
+            self.stagnation = RecordCondition(**RecordCondition.parse(stagnation))
+            self.stagnation_generations = stagnation["generations"]
+            self.stagnation_tolerance = stagnation.get("tolerance", 0)
+            self.best = self.stagnation.get_value(ga_data.records[-1]) if len(ga_data.records) > 0 else None
+            self.last_improvement = ga_data.generation
+
+        self.diversity = None
+        if diversity is not None:
+            self.diversity = RecordCondition(**RecordCondition.parse(diversity))
+            self.diversity_threshold = diversity["threshold"]
+
+    def from_command(command: dict, ga_data: GADataDeap) -> 'StopConditions | None':
+        """
+        Returns None if the command is invalid.
+        Raises a ValueError when a condition refers to a graph or a line that isn't in the generation stats.
+        """
+        budgets = {}
+        for name, check in [
+            ("max_generations", lambda v: type(v) is int and v > 0),
+            ("time_budget", lambda v: isnum(v) and v > 0),
+            ("evaluation_budget", lambda v: type(v) is int and v > 0),
+        ]:
+            if name in command:
+                if not check(command[name]):
+                    return None
+                budgets[name] = command[name]
+        if len(budgets) == 0:
+            return None
+
+        conditions = {}
+        for name, required in [
+            ("fitness_target", {"value": isnum}),
+            ("stagnation", {"generations": lambda v: type(v) is int and v > 0}),
+            ("diversity", {"threshold": isnum}),
+        ]:
+            if name not in command:
+                continue
+            if RecordCondition.parse(command[name]) is None:
+                return None
+            for argument, check in required.items():
+                if not check(command[name].get(argument)):
+                    return None
+            if name == "stagnation" and not isnum(command[name].get("tolerance", 0)):
+                return None
+            conditions[name] = command[name]
+
+        lines = get_record_lines(ga_data) if len(conditions) > 0 else None
+        if lines is not None:
+            for name, condition in conditions.items():
+                if condition["graph"] not in lines:
+                    raise ValueError(f'Unknown graph "{condition["graph"]}" in {name}, the graphs are: {", ".join(lines)}')
+                if condition["line"] not in lines[condition["graph"]]:
+                    raise ValueError(
+                        f'Unknown line "{condition["line"]}" of "{condition["graph"]}" in {name}, '
+                        f'the lines are: {", ".join(lines[condition["graph"]])}'
+                    )
+
+        return StopConditions(ga_data, **budgets, **conditions)
+
+    def check(self, ga_data: GADataDeap) -> dict | None:
+        """
+        Returns the condition that triggered, if any.
+        """
+        record = ga_data.records[-1] if len(ga_data.records) > 0 else {}
+        reason = self.get_reason(ga_data, record)
+        if reason is None:
+            return None
+        return {
+            "condition": reason,
+            "generation": ga_data.generation,
+            "generations_run": ga_data.generation - self.start_generation,
+            "evaluations": ga_data.evaluations - self.start_evaluations,
+            "elapsed_time": time.monotonic() - self.start_time,
+        }
+
+    def get_reason(self, ga_data: GADataDeap, record: dict) -> str | None:
+        if self.fitness_target is not None:
+            value = self.fitness_target.get_value(record)
+            if value is not None and not self.fitness_target.is_better(self.target_value, value):
+                return "fitness_target"
+
+        if self.diversity is not None:
+            value = self.diversity.get_value(record)
+            if value is not None and value <= self.diversity_threshold:
+                return "diversity"
+
+        if self.stagnation is not None:
+            value = self.stagnation.get_value(record)
+            if value is not None and (self.best is None or self.stagnation.is_better(value, self.best, self.stagnation_tolerance)):
+                self.best = value
+                self.last_improvement = ga_data.generation
+            if ga_data.generation - self.last_improvement >= self.stagnation_generations:
+                return "stagnation"
+
+        if self.evaluation_budget is not None and ga_data.evaluations - self.start_evaluations >= self.evaluation_budget:
+            return "evaluation_budget"
+        if self.time_budget is not None and time.monotonic() - self.start_time >= self.time_budget:
+            return "time_budget"
+        if self.max_generations is not None and ga_data.generation - self.start_generation >= self.max_generations:
+            return "max_generations"
+        return None
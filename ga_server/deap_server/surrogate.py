@@ -0,0 +1,229 @@
+"""
+Surrogate-assisted evaluation. The surrogate replaces `toolbox.map`: when the algorithm evaluates a batch of
+individuals, a cheap regression model trained on the individuals already evaluated predicts their fitness,
+and only the most promising fraction is sent to `toolbox.evaluate`. The others keep their predicted fitness,
+and are flagged as `predicted` so that they are never archived (hall of fame, Pareto archive).
+"""
+import math
+from abc import ABC, abstractmethod
+from typing import Any, Callable
+
+import numpy
+
+Features = Callable[[Any], numpy.ndarray]
+
+# Number of distances computed at once by the k-NN surrogate
+CHUNK_CELLS = 1 << 22
+
+
+def chromosome_features(individual) -> numpy.ndarray:
+    return numpy.asarray(individual, dtype=numpy.float64)
+
+def set_predicted(individual, predicted: bool):
+    if hasattr(individual, "visualization_data"):
+        individual.visualization_data.predicted = predicted
+
+def is_predicted(individual) -> bool:
+    return getattr(getattr(individual, "visualization_data", None), "predicted", False)
+
+def real_individuals(population) -> list:
+    return [ind for ind in population if not is_predicted(ind)]
+
+
+class RealFitnessArchive:
+    """
+    Hall of fame given to the algorithm when a surrogate is used, only the individuals with a real fitness are archived.
+    """
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    def update(self, population):
+        self.archive.update(real_individuals(population))
+
+    def __len__(self) -> int:
+        return len(self.archive)
+
+    def __getitem__(self, index):
+        return self.archive[index]
+
+    def __iter__(self):
+        return iter(self.archive)
+
+    def __getattr__(self, name: str):
+        return getattr(self.archive, name)
+
+
+class Surrogate(ABC):
+    """
+    Base class of the surrogates. Subclasses implement `fit` and `predict`.
+
+    Params:
+    - ratio: fraction of each batch that is evaluated with `toolbox.evaluate`
+    - min_samples: every individual is evaluated until this number of real evaluations is reached
+    - max_samples: number of real evaluations (the most recent ones) used to train the model
+    - features: returns the features of an individual, the chromosome by default
+    """
+
+    def __init__(self, ratio: float = 0.25, min_samples: int = 100, max_samples: int = 2000, features: Features = chromosome_features):
+        self.ratio = ratio
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.features = features
+        self.samples = numpy.empty((0, 0))
+        self.targets = numpy.empty((0, 0))
+        self.real_evaluations = 0
+        self.predicted_evaluations = 0
+        self.error: float | None = None
+        self.base_map = map
+        self.evaluate = None
+
+    def install(self, toolbox):
+        """
+        Replaces `toolbox.map`, the previous map is still used for the real evaluations.
+        """
+        self.base_map = toolbox.map
+        self.evaluate = toolbox.evaluate
+        toolbox.register("map", self.map)
+
+    @abstractmethod
+    def fit(self, samples: numpy.ndarray, targets: numpy.ndarray):
+        pass
+
+    @abstractmethod
+    def predict(self, samples: numpy.ndarray) -> numpy.ndarray:
+        pass
+
+    def add_samples(self, samples: numpy.ndarray, targets: numpy.ndarray):
+        if len(self.samples) == 0:
+            self.samples, self.targets = samples, targets
+        else:
+            self.samples = numpy.vstack([self.samples, samples])[-self.max_samples:]
+            self.targets = numpy.vstack([self.targets, targets])[-self.max_samples:]
+        self.fit(self.samples, self.targets)
+
+    def map(self, function, individuals):
+        individuals = list(individuals)
+        if function is not self.evaluate or len(individuals) == 0:
+            return list(self.base_map(function, individuals))
+
+        samples = numpy.array([self.features(ind) for ind in individuals], dtype=numpy.float64).reshape(len(individuals), -1)
+        if len(self.samples) < self.min_samples:
+            fitnesses = list(self.base_map(function, individuals))
+            for ind in individuals:
+                set_predicted(ind, False)
+            self.real_evaluations += len(individuals)
+            self.add_samples(samples, numpy.array(fitnesses, dtype=numpy.float64).reshape(len(individuals), -1))
+            return fitnesses
+
+        predictions = self.predict(samples)
+        weights = numpy.array(individuals[0].fitness.weights, dtype=numpy.float64)
+        order = numpy.argsort(-(predictions * weights).sum(axis=1), kind='stable')
+        real = order[:max(1, math.ceil(self.ratio * len(individuals)))]
+
+        fitnesses: list[tuple] = [tuple(float(x) for x in prediction) for prediction in predictions]
+        real_fitnesses = list(self.base_map(function, [individuals[i] for i in real]))
+        for ind in individuals:
+            set_predicted(ind, True)
+        for i, fitness in zip(real, real_fitnesses):
+            fitnesses[i] = fitness
+            set_predicted(individuals[i], False)
+        targets = numpy.array(real_fitnesses, dtype=numpy.float64).reshape(len(real), -1)
+
+        self.error = float(numpy.mean(numpy.abs(predictions[real] - targets)))
+        self.real_evaluations += len(real)
+        self.predicted_evaluations += len(individuals) - len(real)
+        self.add_samples(samples[real], targets)
+        return fitnesses
+
+    def get_stats(self) -> dict:
+        total = self.real_evaluations + self.predicted_evaluations
+        return {
+            "Real evaluations": str(self.real_evaluations),
+            "Real evaluation ratio": f"{self.real_evaluations / total:.3f}" if total > 0 else "-",
+            "Surrogate error": f"{self.error:.6g}" if self.error is not None else "-",
+        }
+
+    def get_state(self) -> dict:
+        """
+        Training data and counters, used to hibernate sessions.
+        """
+        return {
+            "ratio": self.ratio,
+            "samples": self.samples,
+            "targets": self.targets,
+            "real_evaluations": self.real_evaluations,
+            "predicted_evaluations": self.predicted_evaluations,
+            "error": self.error,
+        }
+
+    def set_state(self, state: dict):
+        self.ratio = state["ratio"]
+        self.samples = state["samples"]
+        self.targets = state["targets"]
+        self.real_evaluations = state["real_evaluations"]
+        self.predicted_evaluations = state["predicted_evaluations"]
+        self.error = state["error"]
+        if len(self.samples) > 0:
+            self.fit(self.samples, self.targets)
+
+
+class RidgeSurrogate(Surrogate):
+    """
+    Linear model with L2 regularization, solved in closed form.
+    """
+
+    def __init__(self, alpha: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.alpha = alpha
+        self.coefficients = None
+        self.mean = None
+        self.scale = None
+
+    def fit(self, samples: numpy.ndarray, targets: numpy.ndarray):
+        self.mean = samples.mean(axis=0)
+        self.scale = samples.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        x = numpy.hstack([(samples - self.mean) / self.scale, numpy.ones((len(samples), 1))])
+        regularization = self.alpha * numpy.eye(x.shape[1])
+        regularization[-1, -1] = 0
+        self.coefficients = numpy.linalg.solve(x.T @ x + regularization, x.T @ targets)
+
+    def predict(self, samples: numpy.ndarray) -> numpy.ndarray:
+        x = numpy.hstack([(samples - self.mean) / self.scale, numpy.ones((len(samples), 1))])
+        return x @ self.coefficients
+
+
+class KNNSurrogate(Surrogate):
+    """
+    Mean fitness of the `k` nearest evaluated individuals.
+    The distance is euclidean by default, or the number of different genes with `metric='hamming'` (for permutations).
+    """
+
+    def __init__(self, k: int = 5, metric: str = 'euclidean', **kwargs):
+        super().__init__(**kwargs)
+        self.k = k
+        self.metric = metric
+
+    def fit(self, samples: numpy.ndarray, targets: numpy.ndarray):
+        pass
+
+    def get_distances(self, samples: numpy.ndarray) -> numpy.ndarray:
+        if self.metric != 'hamming':
+            return (
+                (samples ** 2).sum(axis=1)[:, None]
+                + (self.samples ** 2).sum(axis=1)[None, :]
+                - 2 * samples @ self.samples.T
+            )
+        distances = numpy.empty((len(samples), len(self.samples)))
+        rows = max(1, CHUNK_CELLS // max(self.samples.size, 1))
+        for start in range(0, len(samples), rows):
+            chunk = samples[start:start + rows]
+            distances[start:start + rows] = (chunk[:, None, :] != self.samples[None, :, :]).sum(axis=2)
+        return distances
+
+    def predict(self, samples: numpy.ndarray) -> numpy.ndarray:
+        distances = self.get_distances(samples)
+        k = min(self.k, len(self.samples))
+        nearest = numpy.argpartition(distances, k - 1, axis=1)[:, :k]
+        return self.targets[nearest].mean(axis=1)
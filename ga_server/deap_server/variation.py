@@ -0,0 +1,144 @@
+"""
+Versions of DEAP's `varAnd`, `varOr`, `eaSimple` and `eaMuPlusLambda` that also accept the
+population-level operators of `batch_operators.py`.
+Per-pair operators are called exactly like DEAP does.
+"""
+import random
+
+from deap import tools
+from ga_server.deap_server.batch_operators import is_batched
+
+
+def var_and(population, toolbox, cxpb, mutpb):
+    offspring = [toolbox.clone(ind) for ind in population]
+
+    if is_batched(toolbox.mate):
+        mated = [i for i in range(1, len(offspring), 2) if random.random() < cxpb]
+        if len(mated) > 0:
+            children1, children2 = toolbox.mate([offspring[i - 1] for i in mated], [offspring[i] for i in mated])
+            for i, child1, child2 in zip(mated, children1, children2):
+                offspring[i - 1], offspring[i] = child1, child2
+                del child1.fitness.values, child2.fitness.values
+    else:
+        for i in range(1, len(offspring), 2):
+            if random.random() < cxpb:
+                offspring[i - 1], offspring[i] = toolbox.mate(offspring[i - 1], offspring[i])
+                del offspring[i - 1].fitness.values, offspring[i].fitness.values
+
+    if is_batched(toolbox.mutate):
+        mutated = [i for i in range(len(offspring)) if random.random() < mutpb]
+        if len(mutated) > 0:
+            for i, child in zip(mutated, toolbox.mutate([offspring[i] for i in mutated])):
+                offspring[i] = child
+                del child.fitness.values
+    else:
+        for i in range(len(offspring)):
+            if random.random() < mutpb:
+                offspring[i], = toolbox.mutate(offspring[i])
+                del offspring[i].fitness.values
+
+    return offspring
+
+def var_or(population, toolbox, lambda_, cxpb, mutpb):
+    assert (cxpb + mutpb) <= 1.0, (
+        "The sum of the crossover and mutation probabilities must be smaller "
+        "or equal to 1.0.")
+
+    offspring = [None] * lambda_
+    mated, mutated = [], []
+    for i in range(lambda_):
+        op_choice = random.random()
+        if op_choice < cxpb:
+            mated.append(i)
+        elif op_choice < cxpb + mutpb:
+            mutated.append(i)
+        else:
+            offspring[i] = random.choice(population)
+
+    pairs = [[toolbox.clone(ind) for ind in random.sample(population, 2)] for _ in mated]
+    if is_batched(toolbox.mate):
+        children = toolbox.mate([pair[0] for pair in pairs], [pair[1] for pair in pairs])[0] if len(mated) > 0 else []
+    else:
+        children = [toolbox.mate(ind1, ind2)[0] for ind1, ind2 in pairs]
+    for i, child in zip(mated, children):
+        del child.fitness.values
+        offspring[i] = child
+
+    parents = [toolbox.clone(random.choice(population)) for _ in mutated]
+    if is_batched(toolbox.mutate):
+        children = toolbox.mutate(parents) if len(mutated) > 0 else []
+    else:
+        children = [toolbox.mutate(ind)[0] for ind in parents]
+    for i, child in zip(mutated, children):
+        del child.fitness.values
+        offspring[i] = child
+
+    return offspring
+
+def evaluate_invalid(population, toolbox) -> int:
+    invalid_ind = [ind for ind in population if not ind.fitness.valid]
+    fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+    for ind, fit in zip(invalid_ind, fitnesses):
+        ind.fitness.values = fit
+    return len(invalid_ind)
+
+def ea_simple(population, toolbox, cxpb, mutpb, ngen, stats=None, halloffame=None, verbose=False):
+    """
+    Same as `algorithms.eaSimple`, using `var_and`.
+    """
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+
+    nevals = evaluate_invalid(population, toolbox)
+    if halloffame is not None:
+        halloffame.update(population)
+    record = stats.compile(population) if stats else {}
+    logbook.record(gen=0, nevals=nevals, **record)
+    if verbose:
+        print(logbook.stream)
+
+    for gen in range(1, ngen + 1):
+        offspring = toolbox.select(population, len(population))
+        offspring = var_and(offspring, toolbox, cxpb, mutpb)
+        nevals = evaluate_invalid(offspring, toolbox)
+
+        if halloffame is not None:
+            halloffame.update(offspring)
+        population[:] = offspring
+
+        record = stats.compile(population) if stats else {}
+        logbook.record(gen=gen, nevals=nevals, **record)
+        if verbose:
+            print(logbook.stream)
+
+    return population, logbook
+
+def ea_mu_plus_lambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen, stats=None, halloffame=None, verbose=False):
+    """
+    Same as `algorithms.eaMuPlusLambda`, using `var_or`.
+    """
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+
+    nevals = evaluate_invalid(population, toolbox)
+    if halloffame is not None:
+        halloffame.update(population)
+    record = stats.compile(population) if stats is not None else {}
+    logbook.record(gen=0, nevals=nevals, **record)
+    if verbose:
+        print(logbook.stream)
+
+    for gen in range(1, ngen + 1):
+        offspring = var_or(population, toolbox, lambda_, cxpb, mutpb)
+        nevals = evaluate_invalid(offspring, toolbox)
+
+        if halloffame is not None:
+            halloffame.update(offspring)
+        population[:] = toolbox.select(population + offspring, mu)
+
+        record = stats.compile(population) if stats is not None else {}
+        logbook.record(gen=gen, nevals=nevals, **record)
+        if verbose:
+            print(logbook.stream)
+
+    return population, logbook
@@ -1,8 +1,13 @@
 import json
+import time
 import traceback
+from itertools import count
 from typing import Any, Callable, Generic, Tuple, TypeVar
 from ga_server.client import GAClient
-from threading import Lock
+from ga_server.hibernation import HibernatedSession, discard, get_hibernation_path, hibernate, wake
+from ga_server.problem import GAProblem
+from ga_server.relay import RelayClient, RelayLink, listen, send_to_relay_clients
+from threading import Condition, Lock, RLock, Thread
 from websocket_server import WebsocketServer
 
 T = TypeVar('T')
@@ -18,74 +23,294 @@ class GAServer(Generic[T]):
     sessions: dict[str, T] = {}
     sessions_mutex = Lock()
 
+    # problem title of every session
+    session_problems: dict[str, str] = {}
+
     def __init__(
         self,
         host: str = "localhost",
-        port: int = 8080,
+        port: int | None = 8080,
         ga_data_provider: Callable[[], T] = None,
         commands: dict[str, Callable[[T, dict, Callable[[str], None], Callable[[str], None]], Tuple[str, bool] | None]] = {},
         command_protocol: str = "generic",
-        title: str = "Generic Genetic Algorithm"
+        title: str = "Generic Genetic Algorithm",
+        problems: list[GAProblem[T]] = [],
+        hibernate_after: float | None = None,
+        hibernation_dir: str = ".hibernated_sessions",
+        relay_socket: str | None = None,
+        max_memory: int | None = None,
     ):
+        """
+        Params:
+        - port: port of the websocket server, None to only serve the clients of the relays (`relay_socket` is then required)
+        - max_memory: new sessions are rejected while the sessions in memory use more than this number of bytes
+        - relay_socket: path of a Unix socket on which relay processes (see `relay.py`) can connect to serve clients
+        - hibernate_after: seconds after which a session without any client and without any command is saved to `hibernation_dir`
+        and dropped from memory. It is loaded back when joined or used. Disabled by default
+        """
         self.host = host
         self.port = port
-        self.ga_data_provider = ga_data_provider
-        self.commands = commands
-        self.command_protocol = command_protocol
-        self.title = title
-        self.server = WebsocketServer(host=self.host, port=self.port)
-        self.server.set_fn_new_client(self.on_connect)
-        self.server.set_fn_message_received(self.on_message)
-        self.server.set_fn_client_left(self.on_close)
+        self.hibernate_after = hibernate_after
+        self.hibernation_dir = hibernation_dir
+        self.relay_socket = relay_socket
+        self.max_memory = max_memory
+        # last time a session was joined or used, and number of commands currently running on it
+        self.session_activity: dict[str, float] = {}
+        self.session_running_commands: dict[str, int] = {}
+        # sessions being saved by `hibernate_idle_sessions`, and condition notified once they are saved
+        self.hibernating_sessions: set[str] = set()
+        self.session_hibernated = Condition(self.sessions_mutex)
+        # held while a command or a batch of commands runs on a session, for the problems without their own `session_lock`
+        self.session_locks: dict[str, RLock] = {}
+        # sessions deleted while commands were running on them, closed when the last one ends
+        self.closing_sessions: dict[str, Tuple[GAProblem[T], T]] = {}
+        # links of the connected relays, and version of every session, changed every time the state of the session
+        # changes so that the relays drop the replies they keep (never reused, even when a session is created again)
+        self.relay_links: dict[int, RelayLink] = {}
+        self.session_versions: dict[str, int] = {}
+        self.version_counter = count(1)
+        self.problems: dict[str, GAProblem[T]] = {}
+        if ga_data_provider is not None:
+            self.add_problem(GAProblem(title, ga_data_provider, commands, command_protocol))
+        for problem in problems:
+            self.add_problem(problem)
+        self.server: WebsocketServer | None = None
+        if self.port is not None:
+            self.server = WebsocketServer(host=self.host, port=self.port)
+            self.server.set_fn_new_client(self.on_connect)
+            self.server.set_fn_message_received(self.on_message)
+            self.server.set_fn_client_left(self.on_close)
             # on_data_receive=self.on_message,
             # on_connection_open=self.on_connect,
             # on_connection_close=self.on_close
 
+    def add_problem(self, problem: GAProblem[T]):
+        self.problems[problem.title] = problem
+
+    def get_default_problem(self) -> GAProblem[T] | None:
+        return next(iter(self.problems.values()), None)
+
+    def get_session_problem(self, session: str | None) -> GAProblem[T] | None:
+        if session is None or session not in self.session_problems:
+            return self.get_default_problem()
+        return self.problems[self.session_problems[session]]
+
+    def get_session(self, session: str) -> T:
+        """
+        Returns the data of a session, waking it up if it is hibernated. Must be called with `sessions_mutex` acquired.
+        """
+        session_data = self.sessions[session]
+        if isinstance(session_data, HibernatedSession):
+            session_data = wake(session_data, self.get_session_problem(session).load_session)
+            self.sessions[session] = session_data
+            print(f"Woke up: {session}")
+        self.session_activity[session] = time.monotonic()
+        return session_data
+
+    def hibernate_idle_sessions(self):
+        self.connections_mutex.acquire(1)
+        try:
+            subscribed = set(client.session_name for client in self.connections.values())
+        finally:
+            self.connections_mutex.release()
+
+        now = time.monotonic()
+        idle_sessions: list[Tuple[str, T]] = []
+        self.sessions_mutex.acquire(1)
+        try:
+            for name, session_data in self.sessions.items():
+                problem = self.get_session_problem(name)
+                if (
+                    isinstance(session_data, HibernatedSession)
+                    or not problem.can_hibernate()
+                    or name in subscribed
+                    or name in self.hibernating_sessions
+                    or self.session_running_commands.get(name, 0) > 0
+                    or now - self.session_activity.get(name, now) < self.hibernate_after
+                ):
+                    continue
+                # commands wait until the session is saved, see `acquire_session`
+                self.hibernating_sessions.add(name)
+                idle_sessions.append((name, session_data))
+        finally:
+            self.sessions_mutex.release()
+
+        for name, session_data in idle_sessions:
+            # saved without holding the mutex, the other sessions can be used meanwhile
+            problem = self.get_session_problem(name)
+            try:
+                hibernated = hibernate(session_data, problem.dump_session, get_hibernation_path(self.hibernation_dir, name))
+            except Exception:
+                print(traceback.format_exc())
+                hibernated = None
+
+            self.sessions_mutex.acquire(1)
+            try:
+                self.hibernating_sessions.discard(name)
+                if hibernated is not None and self.sessions.get(name) is session_data:
+                    self.sessions[name] = hibernated
+                    problem.close(session_data)
+                    print(f"Hibernated: {name}")
+                elif hibernated is not None:
+                    # deleted in the meantime
+                    discard(hibernated)
+                self.session_hibernated.notify_all()
+            finally:
+                self.sessions_mutex.release()
+
+    def hibernation_loop(self):
+        while True:
+            time.sleep(min(60, self.hibernate_after / 2))
+            self.hibernate_idle_sessions()
+
+    def send(self, ga_client: GAClient, message: str):
+        if isinstance(ga_client.ws, RelayClient):
+            ga_client.ws.link.send([ga_client.ws.id], message)
+        else:
+            self.server.send_message(ga_client.ws, message)
+
+    def reply(self, ga_client: GAClient, message: str):
+        """
+        Sends the reply to a command, relays can keep it in their snapshot until the version of the session changes.
+        """
+        if isinstance(ga_client.ws, RelayClient):
+            version = self.session_versions.get(ga_client.session_name) if ga_client.session_name is not None else None
+            ga_client.ws.link.send([ga_client.ws.id], message, tag=ga_client.ws.tag, version=version)
+        else:
+            self.server.send_message(ga_client.ws, message)
 
-    def send_to_session(self, session: str, message: str):
+    def send_to_clients(self, clients: list[GAClient], message: str, session: str | None = None):
+        """
+        Sends the message once per relay. Must be called with `connections_mutex` acquired.
+        """
+        relay_clients = []
+        for client in clients:
+            if isinstance(client.ws, RelayClient):
+                relay_clients.append(client.ws)
+            else:
+                self.server.send_message(client.ws, message)
+        send_to_relay_clients(relay_clients, message, session)
+
+    def update_session_version(self, session: str):
+        """
+        Tells every relay that the state of the session changed, even the relays without any client in the session.
+        Must be called with `connections_mutex` acquired.
+        """
+        version = next(self.version_counter)
+        self.session_versions[session] = version
+        for link in self.relay_links.values():
+            link.write({"op": "version", "session": session, "version": version})
+
+    def send_to_session(self, session: str, message: str, exclude: GAClient | None = None):
         self.connections_mutex.acquire(1)
         try:
-            for _, client in self.connections.items():
-                if client.session_name == session:
-                    self.server.send_message(client.ws, message)
+            # broadcasts are sent when the session changes
+            self.update_session_version(session)
+            self.send_to_clients(
+                [client for client in self.connections.values() if client.session_name == session and client is not exclude],
+                message,
+                session
+            )
         finally:
             self.connections_mutex.release()
 
+    def get_memory_usage(self, session: str) -> int:
+        """
+        Must be called with `sessions_mutex` acquired.
+        """
+        session_data = self.sessions[session]
+        if isinstance(session_data, HibernatedSession):
+            return 0
+        return self.get_session_problem(session).get_memory_usage(session_data)
+
     def get_session_list(self):
         return {
             "info": "session_list",
-            "sessions": [x for x in self.sessions]
+            "sessions": [x for x in self.sessions],
+            "session_problems": self.session_problems,
+            "hibernated": [name for name, data in self.sessions.items() if isinstance(data, HibernatedSession)],
+            "memory_usage": {name: self.get_memory_usage(name) for name in self.sessions},
+            "max_memory": self.max_memory,
         }
 
+    def send_error(self, ga_client: GAClient, error: str, message: str):
+        self.send(ga_client, self.json_enc.encode({
+            "info": "error",
+            "error": error,
+            "message": message,
+        }))
+
     def session_join_or_create(self, ga_client: GAClient, data: dict):
         if "name" in data:
             name = data["name"]
             if name == "":
                 return
 
+            # problem of the session if it has to be created
+            problem: GAProblem[T] | None = None
             self.sessions_mutex.acquire(1)
-            self.connections_mutex.acquire(1)
             try:
                 if name not in self.sessions:
-                    self.sessions[name] = self.ga_data_provider()
-                    for _, client in self.connections.items():
-                        self.server.send_message(client.ws, self.json_enc.encode(self.get_session_list()))
-                ga_client.session_name = name
+                    problem = self.problems.get(data["problem"]) if "problem" in data else self.get_default_problem()
+                    if problem is None:
+                        print("ProblemNotFound:", f'"{data.get("problem")}" from', ga_client)
+                        self.send_error(ga_client, "problem_not_found", f'The server has no problem named "{data.get("problem")}"')
+                        return
+                    if self.max_memory is not None:
+                        memory_usage = sum(self.get_memory_usage(session) for session in self.sessions)
+                        if memory_usage >= self.max_memory:
+                            print("MemoryLimit:", f'"{name}" from', ga_client)
+                            self.send_error(ga_client, "memory_limit", f"Sessions use {memory_usage} bytes, the limit is {self.max_memory} bytes")
+                            return
+            finally:
+                self.sessions_mutex.release()
+
+            # created without holding the mutexes, setting up the problem can take a while
+            session_data = problem.ga_data_provider() if problem is not None else None
+
+            self.sessions_mutex.acquire(1)
+            self.connections_mutex.acquire(1)
+            try:
+                if name not in self.sessions and session_data is None:
+                    # deleted in the meantime
+                    joined = False
+                elif name not in self.sessions:
+                    self.sessions[name] = session_data
+                    if problem.session_created is not None:
+                        problem.session_created(name, session_data)
+                    self.session_problems[name] = problem.title
+                    self.session_activity[name] = time.monotonic()
+                    self.update_session_version(name)
+                    self.send_to_clients(list(self.connections.values()), self.json_enc.encode(self.get_session_list()))
+                    joined = True
+                elif isinstance(self.sessions[name], HibernatedSession):
+                    self.get_session(name)
+                    self.send_to_clients(list(self.connections.values()), self.json_enc.encode(self.get_session_list()))
+                    joined = True
+                else:
+                    # also when another client created it in the meantime, the data created here is dropped
+                    self.session_activity[name] = time.monotonic()
+                    joined = True
+                if joined:
+                    ga_client.session_name = name
             finally:
                 self.sessions_mutex.release()
                 self.connections_mutex.release()
 
+            if not joined:
+                self.session_join_or_create(ga_client, data)
+                return
             self.session_info(ga_client)
 
     def send_session_list(self, ga_client: GAClient):
         self.sessions_mutex.acquire(1)
         try:
-            self.server.send_message(ga_client.ws, self.json_enc.encode(self.get_session_list()))
+            self.reply(ga_client, self.json_enc.encode(self.get_session_list()))
         finally:
             self.sessions_mutex.release()
 
     def session_info(self, ga_client: GAClient):
-        self.server.send_message(ga_client.ws, self.json_enc.encode({
+        self.send(ga_client, self.json_enc.encode({
             "info": "session",
             "session": ga_client.session_name,
         }))
@@ -103,18 +328,38 @@ class GAServer(Generic[T]):
                     if c.session_name == name:
                         c.session_name = None
                         self.session_info(c)
+                problem = self.get_session_problem(name)
+                if isinstance(self.sessions[name], HibernatedSession):
+                    discard(self.sessions[name])
+                elif self.session_running_commands.get(name, 0) > 0:
+                    self.closing_sessions[name] = (problem, self.sessions[name])
+                else:
+                    problem.close(self.sessions[name])
                 del self.sessions[name]
-                for _, client in self.connections.items():
-                    self.server.send_message(client.ws, self.json_enc.encode(self.get_session_list()))
+                del self.session_problems[name]
+                self.session_activity.pop(name, None)
+                self.session_locks.pop(name, None)
+                if self.session_running_commands.get(name) == 0:
+                    del self.session_running_commands[name]
+                self.update_session_version(name)
+                del self.session_versions[name]
+                self.send_to_clients(list(self.connections.values()), self.json_enc.encode(self.get_session_list()))
         finally:
             self.connections_mutex.release()
             self.sessions_mutex.release()
 
     def session_describe(self, ga_client: GAClient):
-        self.server.send_message(ga_client.ws, self.json_enc.encode({
+        self.sessions_mutex.acquire(1)
+        try:
+            problem = self.get_session_problem(ga_client.session_name)
+            memory_usage = self.get_memory_usage(ga_client.session_name) if ga_client.session_name in self.sessions else None
+        finally:
+            self.sessions_mutex.release()
+        self.send(ga_client, self.json_enc.encode({
             "info": "session_describe",
-            "title": self.title,
-            "command_protocol": self.command_protocol
+            **(problem.describe() if problem is not None else {}),
+            **({ "memory_usage": memory_usage } if memory_usage is not None else {}),
+            "problems": [p.describe() for p in self.problems.values()],
         }))
 
     def session_leave(self, ga_client: GAClient):
@@ -139,6 +384,44 @@ class GAServer(Generic[T]):
             return True
         return False
 
+    def acquire_session(self, session: str) -> Tuple[T, GAProblem[T], RLock]:
+        """
+        Returns the data, the problem and the lock of a session, and marks it as used until `release_session` is called.
+        Commands run with the lock acquired, except the `unlocked_commands` of the problem outside of batches,
+        so that the commands and the batches of a session never run at the same time.
+        """
+        self.sessions_mutex.acquire(1)
+        try:
+            while session in self.hibernating_sessions:
+                self.session_hibernated.wait()
+            session_data = self.get_session(session)
+            problem = self.get_session_problem(session)
+            self.session_running_commands[session] = self.session_running_commands.get(session, 0) + 1
+            if problem.session_lock is not None:
+                session_lock = problem.session_lock(session_data)
+            else:
+                if session not in self.session_locks:
+                    self.session_locks[session] = RLock()
+                session_lock = self.session_locks[session]
+        finally:
+            self.sessions_mutex.release()
+        return session_data, problem, session_lock
+
+    def release_session(self, session: str):
+        self.sessions_mutex.acquire(1)
+        try:
+            self.session_running_commands[session] -= 1
+            if session in self.sessions:
+                self.session_activity[session] = time.monotonic()
+            elif self.session_running_commands[session] == 0:
+                # deleted while the command was running
+                del self.session_running_commands[session]
+                if session in self.closing_sessions:
+                    problem, session_data = self.closing_sessions.pop(session)
+                    problem.close(session_data)
+        finally:
+            self.sessions_mutex.release()
+
     def handle_command(self, ga_client: GAClient, data: dict):
         try:
             if "command" in data:
@@ -149,34 +432,90 @@ class GAServer(Generic[T]):
                 session = ga_client.session_name
                 command = data["command"]
 
-                if command in self.commands:
-                    self.sessions_mutex.acquire(1)
+                session_data, problem, session_lock = self.acquire_session(session)
+                try:
+                    if command in problem.commands:
+                        if command not in problem.unlocked_commands:
+                            session_lock.acquire(1)
+                        try:
+                            problem.commands[command](
+                                session_data, 
+                                data, 
+                                lambda msg: self.send_to_session(session, msg), 
+                                lambda msg: self.reply(ga_client, msg)
+                            )
+                        finally:
+                            if command not in problem.unlocked_commands:
+                                session_lock.release()
+                    else:
+                        print("CommandNotFound:", f'"{command}" from', ga_client)
+                finally:
+                    self.release_session(session)
+
+                return True
+        except Exception:
+            print(traceback.format_exc())
+        return False
+
+    def handle_batch(self, ga_client: GAClient, data: dict):
+        """
+        Runs a list of commands in order, without any other command running on the session in between,
+        and sends all the replies in one message. Replies broadcast by the commands are still sent to the other clients of the session.
+        """
+        try:
+            if "batch" in data:
+                batch = data["batch"]
+                if type(batch) is not list or any(type(x) is not dict or "command" not in x for x in batch):
+                    return False
+                if ga_client.session_name == None:
+                    print("NoSession:", ga_client.ws.address)
+                    return True
+
+                session = ga_client.session_name
+                responses: list[list[str]] = []
+
+                session_data, problem, session_lock = self.acquire_session(session)
+                try:
+                    # held for the whole batch, the unlocked commands acquire it again
+                    session_lock.acquire(1)
                     try:
-                        session_data = self.sessions[session]
+                        for command in batch:
+                            replies: list[str] = []
+                            responses.append(replies)
+                            if command["command"] not in problem.commands:
+                                print("CommandNotFound:", f'"{command["command"]}" from', ga_client)
+                                continue
+
+                            def broadcast(msg: str, replies=replies):
+                                replies.append(msg)
+                                self.send_to_session(session, msg, exclude=ga_client)
+
+                            problem.commands[command["command"]](session_data, command, broadcast, replies.append)
                     finally:
-                        self.sessions_mutex.release()
-
-                    self.commands[command](
-                        session_data, 
-                        data, 
-                        lambda msg: self.send_to_session(session, msg), 
-                        lambda msg: self.server.send_message(ga_client.ws, msg)
-                    )
-                else:
-                    print("CommandNotFound:", f'"{command}" from', ga_client)
+                        session_lock.release()
+                finally:
+                    self.release_session(session)
 
+                # the replies are already encoded
+                self.send(
+                    ga_client,
+                    '{"info":"batch","responses":[' + ",".join("[" + ",".join(replies) + "]" for replies in responses) + "]}"
+                )
                 return True
         except Exception:
             print(traceback.format_exc())
         return False
 
-
     def message_handler(self, message: str, client: GAClient):
 
         try:
             data = self.json_dec.decode(message)
             if self.handle_builtin(client, data) == True:
                 return
+            if "batch" in data:
+                if self.handle_batch(client, data) == False:
+                    print("InvalidBatch:", f'"{message}" from', client)
+                return
             if self.handle_command(client, data) == False:
                 print("InvalidCommand:", f'"{message}" from', client)
         except json.JSONDecodeError:
@@ -207,11 +546,89 @@ class GAServer(Generic[T]):
 
         self.message_handler(data, ga_client)
 
+    def on_relay_message(self, relay_client: RelayClient, message: str):
+        self.connections_mutex.acquire(1)
+        try:
+            ga_client = self.connections.get(relay_client.address)
+        finally:
+            self.connections_mutex.release()
+        if ga_client is not None:
+            self.message_handler(message, ga_client)
+
+    def serve_relay(self, link: RelayLink):
+        relay_clients: dict[int, RelayClient] = {}
+        self.connections_mutex.acquire(1)
+        try:
+            self.relay_links[link.id] = link
+            for session, version in self.session_versions.items():
+                link.write({"op": "version", "session": session, "version": version})
+        finally:
+            self.connections_mutex.release()
+        try:
+            while True:
+                message = link.read()
+                if message is None:
+                    break
+                header, data = message
+                match header.get("op"):
+                    case "open":
+                        relay_client = RelayClient(link, header["client"], self.on_relay_message)
+                        relay_clients[relay_client.id] = relay_client
+                        self.connections_mutex.acquire(1)
+                        try:
+                            self.connections[relay_client.address] = GAClient(relay_client)
+                        finally:
+                            self.connections_mutex.release()
+                    case "message":
+                        if header["client"] in relay_clients:
+                            relay_clients[header["client"]].messages.put((header.get("tag"), data))
+                    case "close":
+                        relay_client = relay_clients.pop(header["client"], None)
+                        if relay_client is not None:
+                            self.remove_relay_client(relay_client)
+        except (OSError, ValueError):
+            print(traceback.format_exc())
+        finally:
+            for relay_client in relay_clients.values():
+                self.remove_relay_client(relay_client)
+            self.connections_mutex.acquire(1)
+            try:
+                self.relay_links.pop(link.id, None)
+            finally:
+                self.connections_mutex.release()
+            link.close()
+            print(f"Relay disconnected: {link.id}")
+
+    def remove_relay_client(self, relay_client: RelayClient):
+        relay_client.close()
+        self.connections_mutex.acquire(1)
+        try:
+            self.connections.pop(relay_client.address, None)
+        finally:
+            self.connections_mutex.release()
+
+    def listen_relays(self):
+        listener = listen(self.relay_socket)
+        print(f"Relays can connect on {self.relay_socket}")
+        while True:
+            connection, _ = listener.accept()
+            link = RelayLink(connection)
+            print(f"Relay connected: {link.id}")
+            Thread(target=self.serve_relay, args=(link,), daemon=True).start()
+
     def run(self):
         try:
+            if self.hibernate_after is not None:
+                Thread(target=self.hibernation_loop, daemon=True).start()
+            if self.server is None:
+                self.listen_relays()
+                return
             print(f"Server starting on {self.host}:{self.port}")
+            if self.relay_socket is not None:
+                Thread(target=self.listen_relays, daemon=True).start()
             self.server.run_forever()
         except KeyboardInterrupt:
             pass
         finally:
-            self.server.server_close()
+            if self.server is not None:
+                self.server.server_close()
@@ -0,0 +1,35 @@
+import hashlib
+import os
+import pickle
+from typing import Any, Callable, TypeVar
+
+T = TypeVar('T')
+
+class HibernatedSession:
+    """
+    Placeholder of a session that was saved to disk and dropped from memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+def get_hibernation_path(directory: str, session: str) -> str:
+    return os.path.join(directory, hashlib.sha1(session.encode()).hexdigest() + ".pickle")
+
+def hibernate(session_data: T, dump: Callable[[T], Any], path: str) -> HibernatedSession:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as hibernation_file:
+        pickle.dump(dump(session_data), hibernation_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+    return HibernatedSession(path)
+
+def wake(session: HibernatedSession, load: Callable[[Any], T]) -> T:
+    with open(session.path, "rb") as hibernation_file:
+        session_data = load(pickle.load(hibernation_file))
+    os.remove(session.path)
+    return session_data
+
+def discard(session: HibernatedSession):
+    if os.path.exists(session.path):
+        os.remove(session.path)
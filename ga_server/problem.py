@@ -0,0 +1,68 @@
+from threading import RLock
+from typing import Any, Callable, Generic, Tuple, TypeVar
+
+T = TypeVar('T')
+
+class GAProblem(Generic[T]):
+    """
+    Problem definition hosted by a GAServer.
+    A server can host several problems, each session belongs to exactly one of them.
+    """
+
+    def __init__(
+        self,
+        title: str,
+        ga_data_provider: Callable[[], T],
+        commands: dict[str, Callable[[T, dict, Callable[[str], None], Callable[[str], None]], Tuple[str, bool] | None]] = {},
+        command_protocol: str = "generic",
+        dump_session: Callable[[T], Any] | None = None,
+        load_session: Callable[[Any], T] | None = None,
+        session_created: Callable[[str, T], None] | None = None,
+        memory_usage: Callable[[T], int] | None = None,
+        close_session: Callable[[T], None] | None = None,
+        session_lock: Callable[[T], RLock] | None = None,
+        unlocked_commands: set[str] = set(),
+    ):
+        """
+        Params:
+        - title: display name of the problem, used by clients to pick the problem of a new session
+        - ga_data_provider: creates the data of a new session
+        - commands: commands that can be used by the clients that joined a session of this problem
+        - command_protocol: name of the command protocol implemented by the commands
+        - dump_session: returns a picklable state of a session, used to hibernate idle sessions
+        - load_session: recreates a session from the state returned by dump_session
+        - session_created: called with the name and the data of every new session
+        - memory_usage: estimated size of a session in bytes
+        - close_session: releases the resources (threads, files...) of a session dropped from memory, when it is deleted or hibernated
+        - session_lock: returns the lock of a session, held while a command or a batch runs on it. By default the server
+        keeps a lock per session
+        - unlocked_commands: commands run without the lock (unless they are part of a batch), they acquire it themselves
+        through `session_lock` around each of their steps, so that long runs don't block the other commands of the session
+        """
+        self.title = title
+        self.ga_data_provider = ga_data_provider
+        self.commands = commands
+        self.command_protocol = command_protocol
+        self.dump_session = dump_session
+        self.load_session = load_session
+        self.session_created = session_created
+        self.memory_usage = memory_usage
+        self.close_session = close_session
+        self.session_lock = session_lock
+        self.unlocked_commands = unlocked_commands
+
+    def can_hibernate(self) -> bool:
+        return self.dump_session is not None and self.load_session is not None
+
+    def get_memory_usage(self, session_data: T) -> int:
+        return self.memory_usage(session_data) if self.memory_usage is not None else 0
+
+    def close(self, session_data: T):
+        if self.close_session is not None:
+            self.close_session(session_data)
+
+    def describe(self) -> dict:
+        return {
+            "title": self.title,
+            "command_protocol": self.command_protocol,
+        }
@@ -0,0 +1,345 @@
+import json
+import os
+import tempfile
+from typing import Callable, Literal
+
+import numpy
+
+# Above this size, the distance matrix isn't stored, distances are computed from the coordinates when needed
+DEFAULT_MAX_DENSE_BYTES = 512 * 1024 * 1024
+
+# Number of matrix cells computed at once when building a dense matrix
+CHUNK_CELLS = 1 << 22
+
+Metric = Literal['euclidean', 'EUC_2D', 'CEIL_2D', 'ATT', 'GEO']
+
+INTEGER_METRICS = ['EUC_2D', 'CEIL_2D', 'ATT', 'GEO']
+
+
+def write_atomically(path: str, write: Callable[[str], None]):
+    """
+    Calls `write` with a temporary file of the same directory, which is then moved to `path`,
+    so that processes building the same cache at the same time never leave a truncated file.
+    """
+    directory, name = os.path.split(path)
+    descriptor, temporary_path = tempfile.mkstemp(prefix=f".{name}.", suffix=os.path.splitext(name)[1], dir=directory or ".")
+    os.close(descriptor)
+    try:
+        write(temporary_path)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+def nint(values: numpy.ndarray) -> numpy.ndarray:
+    return numpy.floor(values + 0.5)
+
+def geo_to_radians(coordinates: numpy.ndarray) -> numpy.ndarray:
+    degrees = numpy.trunc(coordinates)
+    minutes = coordinates - degrees
+    return 3.141592 * (degrees + 5.0 * minutes / 3.0) / 180.0
+
+def pair_distances(a: numpy.ndarray, b: numpy.ndarray, metric: Metric) -> numpy.ndarray:
+    """
+    Distances between the cities of `a` and `b`, element-wise and with broadcasting.
+    Coordinates are in the last axis. GEO coordinates must already be converted to radians.
+    """
+    if metric == 'GEO':
+        q1 = numpy.cos(a[..., 1] - b[..., 1])
+        q2 = numpy.cos(a[..., 0] - b[..., 0])
+        q3 = numpy.cos(a[..., 0] + b[..., 0])
+        angle = numpy.arccos(numpy.clip(0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3), -1.0, 1.0))
+        distances = numpy.trunc(6378.388 * angle + 1.0)
+        # distance from a city to itself
+        return numpy.where((a == b).all(axis=-1), 0.0, distances)
+    delta = a - b
+    squared = numpy.einsum('...i,...i->...', delta, delta)
+    match metric:
+        case 'euclidean':
+            return numpy.sqrt(squared)
+        case 'EUC_2D':
+            return nint(numpy.sqrt(squared))
+        case 'CEIL_2D':
+            return numpy.ceil(numpy.sqrt(squared))
+        case 'ATT':
+            r = numpy.sqrt(squared / 10.0)
+            t = nint(r)
+            return numpy.where(t < r, t + 1, t)
+    raise ValueError(f'Unknown metric "{metric}"')
+
+
+class DistanceMatrix:
+    """
+    Distances between the cities of a problem.
+    Either backed by a dense matrix (memory-mapped when loaded from a cache file),
+    or computed lazily from the coordinates when the matrix would be too large.
+    Copies and pickles share the underlying files instead of copying the data,
+    which allows evaluation workers to use it without any copy.
+    """
+
+    def __init__(
+        self,
+        matrix: numpy.ndarray | None = None,
+        coordinates: numpy.ndarray | None = None,
+        metric: Metric = 'euclidean',
+    ):
+        if matrix is None and coordinates is None:
+            raise ValueError("A distance matrix needs either a matrix or coordinates")
+        self.matrix = matrix
+        self.coordinates = coordinates
+        self.metric = metric
+
+    def open(path: str, metric: Metric = 'euclidean', dense: bool = True) -> 'DistanceMatrix':
+        """
+        Opens a `.npy` file containing either the matrix or the coordinates, as a read-only memory map.
+        """
+        data = numpy.load(path, mmap_mode='r')
+        if dense:
+            return DistanceMatrix(matrix=data, metric=metric)
+        return DistanceMatrix(coordinates=data, metric=metric)
+
+    def from_coordinates(
+        coordinates: numpy.ndarray,
+        metric: Metric = 'euclidean',
+        cache_path: str | None = None,
+        max_dense_bytes: int = DEFAULT_MAX_DENSE_BYTES,
+    ) -> 'DistanceMatrix':
+        """
+        Builds the distance matrix of the given coordinates.
+        When `cache_path` is given, the matrix (or the coordinates if the matrix is too large) is saved there and memory-mapped.
+        """
+        coordinates = numpy.asarray(coordinates, dtype=numpy.float64)
+        if metric == 'GEO':
+            coordinates = geo_to_radians(coordinates)
+        size = len(coordinates)
+        dtype = numpy.dtype(numpy.int32 if metric in INTEGER_METRICS else numpy.float64)
+
+        if size * size * dtype.itemsize > max_dense_bytes:
+            if cache_path is None:
+                return DistanceMatrix(coordinates=coordinates, metric=metric)
+            write_atomically(cache_path, lambda temporary_path: numpy.save(temporary_path, coordinates))
+            return DistanceMatrix.open(cache_path, metric, dense=False)
+
+        def fill(matrix: numpy.ndarray):
+            rows = max(1, CHUNK_CELLS // max(size, 1))
+            for start in range(0, size, rows):
+                stop = min(start + rows, size)
+                matrix[start:stop] = pair_distances(coordinates[start:stop, None, :], coordinates[None, :, :], metric)
+
+        if cache_path is None:
+            matrix = numpy.empty((size, size), dtype=dtype)
+            fill(matrix)
+            return DistanceMatrix(matrix=matrix, metric=metric)
+
+        def write(temporary_path: str):
+            matrix = numpy.lib.format.open_memmap(temporary_path, mode='w+', dtype=dtype, shape=(size, size))
+            fill(matrix)
+            matrix.flush()
+            del matrix
+
+        write_atomically(cache_path, write)
+        return DistanceMatrix.open(cache_path, metric)
+
+    def from_matrix(matrix, cache_path: str | None = None) -> 'DistanceMatrix':
+        matrix = numpy.asarray(matrix)
+        if matrix.dtype.kind in 'iu':
+            matrix = matrix.astype(numpy.int32)
+        if cache_path is None:
+            return DistanceMatrix(matrix=matrix)
+        write_atomically(cache_path, lambda temporary_path: numpy.save(temporary_path, matrix))
+        return DistanceMatrix.open(cache_path)
+
+    @property
+    def dense(self) -> bool:
+        return self.matrix is not None
+
+    def __len__(self) -> int:
+        return len(self.matrix) if self.dense else len(self.coordinates)
+
+    def __getitem__(self, key):
+        """
+        `distances[i]` returns the distances from city `i` to every city, `distances[i, j]` or `distances[i][j]` a single distance.
+        """
+        if self.dense:
+            return self.matrix[key]
+        if type(key) is tuple:
+            i, j = key
+            return pair_distances(self.coordinates[i], self.coordinates[j], self.metric)
+        return pair_distances(self.coordinates[key], self.coordinates, self.metric)
+
+    def tour_length(self, tour) -> float:
+        """
+        Length of the closed tour going through the given cities in order.
+        """
+        tour = numpy.asarray(tour, dtype=numpy.intp)
+        following = numpy.roll(tour, -1)
+        if self.dense:
+            return float(self.matrix[tour, following].sum())
+        return float(pair_distances(self.coordinates[tour], self.coordinates[following], self.metric).sum())
+
+    ### Sharing
+
+    def _backing_file(self) -> str | None:
+        data = self.matrix if self.dense else self.coordinates
+        return data.filename if isinstance(data, numpy.memmap) else None
+
+    def __getstate__(self) -> dict:
+        path = self._backing_file()
+        if path is None:
+            return self.__dict__
+        return {'path': path, 'metric': self.metric, 'dense': self.dense}
+
+    def __setstate__(self, state: dict):
+        if 'path' not in state:
+            self.__dict__.update(state)
+            return
+        opened = DistanceMatrix.open(state['path'], state['metric'], state['dense'])
+        self.__dict__.update(opened.__dict__)
+
+    def __deepcopy__(self, _memo):
+        # read-only, copies can share the same data
+        return self
+
+
+class TSPInstance:
+    """
+    Travelling Salesman Problem instance.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        distances: DistanceMatrix,
+        optimal_distance: float | None = None,
+    ):
+        self.name = name
+        self.distances = distances
+        self.optimal_distance = optimal_distance
+
+    @property
+    def size(self) -> int:
+        return len(self.distances)
+
+    def get_meta(self) -> dict:
+        return {
+            'name': self.name,
+            'optimal_distance': self.optimal_distance,
+            'metric': self.distances.metric,
+            'dense': self.distances.dense,
+        }
+
+
+### Parsers
+
+def read_tsplib(path: str, cache_path: str | None = None, max_dense_bytes: int = DEFAULT_MAX_DENSE_BYTES) -> TSPInstance:
+    """
+    Reads a TSPLIB `.tsp` file, using either a NODE_COORD_SECTION or an EDGE_WEIGHT_SECTION.
+    """
+    header: dict[str, str] = {}
+    sections: dict[str, list[str]] = {}
+    current: list[str] | None = None
+    with open(path, "r") as tsp_file:
+        for line in tsp_file:
+            line = line.strip()
+            if line == "" or line == "EOF":
+                continue
+            if line.endswith("_SECTION"):
+                current = sections.setdefault(line, [])
+            elif ":" in line:
+                key, value = line.split(":", 1)
+                header[key.strip()] = value.strip()
+                current = None
+            elif current is not None:
+                current.append(line)
+
+    size = int(header["DIMENSION"])
+    metric = header.get("EDGE_WEIGHT_TYPE", "EUC_2D")
+    name = header.get("NAME", os.path.basename(path))
+
+    if metric == "EXPLICIT":
+        values = numpy.array(" ".join(sections["EDGE_WEIGHT_SECTION"]).split(), dtype=numpy.float64)
+        matrix = numpy.zeros((size, size), dtype=numpy.float64)
+        match header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX"):
+            case "FULL_MATRIX":
+                matrix[:] = values[:size * size].reshape(size, size)
+            case "UPPER_ROW":
+                matrix[numpy.triu_indices(size, 1)] = values
+            case "LOWER_ROW":
+                matrix[numpy.tril_indices(size, -1)] = values
+            case "UPPER_DIAG_ROW":
+                matrix[numpy.triu_indices(size)] = values
+            case "LOWER_DIAG_ROW":
+                matrix[numpy.tril_indices(size)] = values
+            case edge_weight_format:
+                raise ValueError(f'Unsupported EDGE_WEIGHT_FORMAT "{edge_weight_format}"')
+        matrix = numpy.maximum(matrix, matrix.T)
+        if numpy.all(matrix == numpy.round(matrix)):
+            matrix = matrix.astype(numpy.int64)
+        return TSPInstance(name, DistanceMatrix.from_matrix(matrix, cache_path))
+
+    if metric not in INTEGER_METRICS:
+        raise ValueError(f'Unsupported EDGE_WEIGHT_TYPE "{metric}"')
+    nodes = numpy.array(" ".join(sections["NODE_COORD_SECTION"]).split(), dtype=numpy.float64).reshape(size, -1)
+    return TSPInstance(name, DistanceMatrix.from_coordinates(nodes[:, 1:3], metric, cache_path, max_dense_bytes))
+
+def read_tsp_json(path: str, cache_path: str | None = None, max_dense_bytes: int = DEFAULT_MAX_DENSE_BYTES) -> TSPInstance:
+    """
+    Reads a JSON file with the `TourSize`, `DistanceMatrix` and optionally `OptDistance` fields, like `tsp.json`.
+    """
+    with open(path, "r") as tsp_file:
+        tsp = json.load(tsp_file)
+    return TSPInstance(
+        os.path.basename(path),
+        DistanceMatrix.from_matrix(tsp["DistanceMatrix"], cache_path),
+        tsp.get("OptDistance"),
+    )
+
+def read_coordinates(path: str, cache_path: str | None = None, max_dense_bytes: int = DEFAULT_MAX_DENSE_BYTES) -> TSPInstance:
+    """
+    Reads a text file with the coordinates of one city per line, separated by spaces or commas.
+    """
+    with open(path, "r") as coordinates_file:
+        coordinates = numpy.loadtxt((line.replace(",", " ") for line in coordinates_file), ndmin=2)
+    return TSPInstance(
+        os.path.basename(path),
+        DistanceMatrix.from_coordinates(coordinates, 'euclidean', cache_path, max_dense_bytes),
+    )
+
+
+### Loading with cache
+
+def get_cache_paths(path: str) -> tuple[str, str]:
+    return f"{path}.distances.npy", f"{path}.meta.json"
+
+def is_cache_valid(path: str) -> bool:
+    source_mtime = os.path.getmtime(path)
+    return all(
+        os.path.exists(cache_file) and os.path.getmtime(cache_file) >= source_mtime
+        for cache_file in get_cache_paths(path)
+    )
+
+def load_tsp(path: str, max_dense_bytes: int = DEFAULT_MAX_DENSE_BYTES) -> TSPInstance:
+    """
+    Loads a TSP instance (TSPLIB `.tsp`, `.json` like `tsp.json`, or a coordinate file).
+    The file is only parsed the first time, the distances are cached next to it as a `.npy` file
+    which is memory-mapped by every process loading the instance.
+    """
+    distances_path, meta_path = get_cache_paths(path)
+    if not is_cache_valid(path):
+        extension = os.path.splitext(path)[1].lower()
+        reader = {".tsp": read_tsplib, ".json": read_tsp_json}.get(extension, read_coordinates)
+        instance = reader(path, distances_path, max_dense_bytes)
+        def write_meta(temporary_path: str):
+            with open(temporary_path, "w") as meta_file:
+                json.dump(instance.get_meta(), meta_file)
+
+        write_atomically(meta_path, write_meta)
+        return instance
+
+    with open(meta_path, "r") as meta_file:
+        meta = json.load(meta_file)
+    return TSPInstance(
+        meta['name'],
+        DistanceMatrix.open(distances_path, meta['metric'], meta['dense']),
+        meta['optimal_distance'],
+    )
@@ -0,0 +1,285 @@
+"""
+Relay tier: the process running the GA (a `GAServer` started with `relay_socket`) publishes its frames once per relay
+on a Unix socket, and relay processes (`GARelay`) serve the websocket clients.
+
+Every message on the socket is a JSON header line, followed by a frame line for the messages that carry one.
+- relay to server: `{"op": "open" | "close", "client": id}` and `{"op": "message", "client": id, "tag": tag}` + message
+- server to relay: `{"clients": [ids], "session": name, "tag": tag, "version": version}` + frame. `session` is set when
+the frame is broadcast to a session, `tag` and `version` when the frame is the reply to the message with this tag, sent
+while the session was at this version.
+- server to relay: `{"op": "version", "session": name, "version": version}`, sent to every relay when the state of the
+session changes (broadcasts, creation and deletion). Versions are never reused.
+
+The relay keeps the replies of the snapshot commands (`info`, `settings`...) of each session, with the version of the
+session, and answers them without asking the server as long as it is the latest version of the session.
+"""
+import json
+import os
+import socket
+import sys
+from itertools import count
+from queue import Queue
+from threading import Lock, Thread
+from typing import Callable
+
+from websocket_server import WebsocketServer
+
+SNAPSHOT_COMMANDS = ["info", "settings", "settings-changelog", "get-status", "get-pareto-front"]
+
+json_enc = json.JSONEncoder(separators=(',', ':'))
+
+
+class RelayLink:
+    """
+    One end of the socket between a server and a relay.
+    """
+
+    ids = count()
+
+    def __init__(self, connection: socket.socket):
+        self.id = next(RelayLink.ids)
+        self.connection = connection
+        self.reader = connection.makefile("r", encoding="utf-8", newline="\n")
+        self.mutex = Lock()
+        self.closed = False
+
+    def write(self, header: dict, frame: str | None = None):
+        # newlines can only be whitespace in a JSON document
+        data = json_enc.encode(header) + "\n" + (frame.replace("\n", " ") + "\n" if frame is not None else "")
+        self.mutex.acquire(1)
+        try:
+            if not self.closed:
+                self.connection.sendall(data.encode("utf-8"))
+        except OSError:
+            self.closed = True
+        finally:
+            self.mutex.release()
+
+    def send(self, clients: list[int], frame: str, session: str | None = None, tag: int | None = None, version: int | None = None):
+        header: dict = {"clients": clients}
+        if session is not None:
+            header["session"] = session
+        if tag is not None:
+            header["tag"] = tag
+        if version is not None:
+            header["version"] = version
+        self.write(header, frame)
+
+    def read(self) -> tuple[dict, str | None] | None:
+        """
+        Returns None when the link is closed.
+        """
+        line = self.reader.readline()
+        if line == "":
+            return None
+        header = json.loads(line)
+        if "clients" in header or header.get("op") == "message":
+            return header, self.reader.readline().rstrip("\n")
+        return header, None
+
+    def close(self):
+        self.closed = True
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+
+class RelayClient:
+    """
+    Client of a relay, as seen by the server. Its messages are handled in order by its own thread,
+    like the messages of a websocket client.
+    """
+
+    def __init__(self, link: RelayLink, client_id: int, handler: Callable[['RelayClient', str], None]):
+        self.link = link
+        self.id = client_id
+        self.address = ("relay", link.id, client_id)
+        # tag of the message being handled, added to the replies sent to this client
+        self.tag: int | None = None
+        self.handler = handler
+        self.messages: Queue[tuple[int | None, str] | None] = Queue()
+        Thread(target=self.handle_messages, daemon=True).start()
+
+    def handle_messages(self):
+        while True:
+            item = self.messages.get()
+            if item is None:
+                return
+            self.tag, message = item
+            try:
+                self.handler(self, message)
+            finally:
+                self.tag = None
+
+    def close(self):
+        self.messages.put(None)
+
+
+def send_to_relay_clients(clients: list[RelayClient], frame: str, session: str | None = None):
+    """
+    Sends the frame once per relay.
+    """
+    links: dict[int, tuple[RelayLink, list[int]]] = {}
+    for client in clients:
+        links.setdefault(client.link.id, (client.link, []))[1].append(client.id)
+    for link, ids in links.values():
+        link.send(ids, frame, session)
+
+
+def listen(path: str) -> socket.socket:
+    if os.path.exists(path):
+        os.remove(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    return listener
+
+
+class GARelay:
+    """
+    Websocket server forwarding its clients to the `GAServer` listening on the Unix socket `upstream`.
+    """
+
+    def __init__(self, upstream: str, host: str = "localhost", port: int = 8080, snapshot_commands: list[str] = SNAPSHOT_COMMANDS):
+        self.upstream = upstream
+        self.host = host
+        self.port = port
+        self.snapshot_commands = snapshot_commands
+        self.client_ids = count()
+        self.tags = count()
+        self.mutex = Lock()
+        # websocket client and session of every client
+        self.clients: dict[int, dict] = {}
+        self.client_sessions: dict[int, str | None] = {}
+        # cached replies of each session with the version of the session and the tag of the reply, and latest version
+        # of each session
+        self.snapshots: dict[str, dict[str, tuple[int, int, list[str]]]] = {}
+        self.versions: dict[str, int] = {}
+        # session and cache key of the forwarded snapshot commands
+        self.pending: dict[int, tuple[str, str]] = {}
+
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(upstream)
+        self.link = RelayLink(connection)
+        self.server = WebsocketServer(host=self.host, port=self.port)
+        self.server.set_fn_new_client(self.on_connect)
+        self.server.set_fn_message_received(self.on_message)
+        self.server.set_fn_client_left(self.on_close)
+
+    def on_connect(self, client: dict, _server: WebsocketServer):
+        self.mutex.acquire(1)
+        try:
+            client['relay_id'] = next(self.client_ids)
+            self.clients[client['relay_id']] = client
+            self.client_sessions[client['relay_id']] = None
+        finally:
+            self.mutex.release()
+        self.link.write({"op": "open", "client": client['relay_id']})
+        print(f"Connected: {client['address']}")
+
+    def on_close(self, client: dict, _server: WebsocketServer):
+        self.mutex.acquire(1)
+        try:
+            del self.clients[client['relay_id']]
+            del self.client_sessions[client['relay_id']]
+        finally:
+            self.mutex.release()
+        self.link.write({"op": "close", "client": client['relay_id']})
+        print(f"Disconnected: {client['address']}")
+
+    def on_message(self, client: dict, _server: WebsocketServer, message: str):
+        client_id = client['relay_id']
+        tag = None
+        try:
+            data = json.loads(message)
+            key = json_enc.encode(data) if type(data) is dict and data.get("command") in self.snapshot_commands else None
+        except json.JSONDecodeError:
+            key = None
+
+        if key is not None:
+            self.mutex.acquire(1)
+            try:
+                session = self.client_sessions.get(client_id)
+                snapshot = self.snapshots.get(session, {}).get(key) if session is not None else None
+                cached = snapshot[2] if snapshot is not None and snapshot[0] == self.versions.get(session) else None
+                if cached is None and session is not None:
+                    tag = next(self.tags)
+                    self.pending[tag] = (session, key)
+            finally:
+                self.mutex.release()
+            if cached is not None:
+                for frame in cached:
+                    self.server.send_message(client, frame)
+                return
+
+        self.link.write({"op": "message", "client": client_id, "tag": tag}, message)
+
+    def update_version(self, session: str, version: int):
+        self.mutex.acquire(1)
+        try:
+            self.versions[session] = version
+            snapshots = self.snapshots.get(session, {})
+            for key in [key for key, snapshot in snapshots.items() if snapshot[0] != version]:
+                del snapshots[key]
+            self.pending = {t: p for t, p in self.pending.items() if p[0] != session}
+        finally:
+            self.mutex.release()
+
+    def handle_frame(self, header: dict, frame: str):
+        self.mutex.acquire(1)
+        try:
+            tag = header.get("tag")
+            if tag is not None and tag in self.pending:
+                session, key = self.pending[tag]
+                version = header.get("version")
+                # the reply is kept only when the session hasn't changed since it was computed
+                if version is not None and version == self.versions.get(session):
+                    snapshots = self.snapshots.setdefault(session, {})
+                    if key not in snapshots or snapshots[key][:2] != (version, tag):
+                        snapshots[key] = (version, tag, [])
+                    snapshots[key][2].append(frame)
+            if frame.startswith('{"info":"session",'):
+                for client_id in header["clients"]:
+                    if client_id in self.client_sessions:
+                        self.client_sessions[client_id] = json.loads(frame)["session"]
+            clients = [self.clients[i] for i in header["clients"] if i in self.clients]
+        finally:
+            self.mutex.release()
+        for client in clients:
+            self.server.send_message(client, frame)
+
+    def read_upstream(self):
+        while True:
+            message = self.link.read()
+            if message is None:
+                print("Upstream closed:", self.upstream)
+                self.server.shutdown_gracefully()
+                return
+            header, frame = message
+            if header.get("op") == "version":
+                self.update_version(header["session"], header["version"])
+            elif frame is not None:
+                self.handle_frame(header, frame)
+
+    def run(self):
+        try:
+            print(f"Relay starting on {self.host}:{self.port}, upstream {self.upstream}")
+            Thread(target=self.read_upstream, daemon=True).start()
+            self.server.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+            self.link.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m ga_server.relay <upstream socket> [host] [port]")
+        sys.exit(1)
+    GARelay(
+        sys.argv[1],
+        sys.argv[2] if len(sys.argv) > 2 else "localhost",
+        int(sys.argv[3]) if len(sys.argv) > 3 else 8080,
+    ).run()
@@ -0,0 +1,292 @@
+"""
+Sharded mode: the sessions are spread over several worker processes, so that independent sessions run on different cores.
+
+Every worker is a `GAServer` without websocket server, serving the clients of its relay socket (see `relay.py`).
+The front-end (`GAShardRouter`) accepts the websocket connections, places each session on a worker by consistent hashing
+of its name, and forwards the messages of each client to the worker of its session. It answers the `list` builtin with
+the session lists of all the workers merged, and the `info` builtin itself.
+
+A client is only opened on one worker at a time: joining a session placed on another worker closes it on the previous one.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+from bisect import bisect
+from itertools import count
+from multiprocessing.process import BaseProcess
+from threading import Lock, Thread
+from typing import Callable
+
+from websocket_server import WebsocketServer
+
+from ga_server.relay import RelayLink
+
+# Number of points of every shard on the ring
+REPLICAS = 64
+
+# Id of the client opened by the front-end on every worker, to receive the session lists
+CONTROL_CLIENT = -1
+
+json_enc = json.JSONEncoder(separators=(',', ':'))
+
+
+def hash_key(key: str) -> int:
+    # `hash` is randomized per process
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class ConsistentHashRing:
+    """
+    Adding a shard only moves the sessions that the new shard takes, about 1 / shards of them.
+    """
+
+    def __init__(self, shards: int, replicas: int = REPLICAS):
+        points = sorted((hash_key(f"{shard}-{replica}"), shard) for shard in range(shards) for replica in range(replicas))
+        self.hashes = [point[0] for point in points]
+        self.shards = [point[1] for point in points]
+
+    def get_shard(self, key: str) -> int:
+        return self.shards[bisect(self.hashes, hash_key(key)) % len(self.hashes)]
+
+
+def start_shards(shards: int, serve: Callable[[int, str], None], socket_dir: str | None = None) -> list[str]:
+    """
+    Starts `shards` worker processes running `serve(index, socket path)`, and returns the paths of their sockets.
+    Processes are forked, so that `serve` can be a closure over the problems.
+    """
+    if socket_dir is None:
+        socket_dir = tempfile.mkdtemp(prefix="ga-shards-")
+    paths = [os.path.join(socket_dir, f"shard-{index}.sock") for index in range(shards)]
+    context = multiprocessing.get_context("fork")
+    for index, path in enumerate(paths):
+        process: BaseProcess = context.Process(target=serve, args=(index, path), name=f"shard-{index}", daemon=True)
+        process.start()
+    return paths
+
+
+def connect(path: str, timeout: float = 30) -> socket.socket:
+    """
+    Connects to the Unix socket `path`, waiting for the worker to listen on it.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(path)
+            return connection
+        except (FileNotFoundError, ConnectionRefusedError):
+            connection.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+class GAShardRouter:
+    """
+    Websocket server forwarding its clients to the worker of their session, the workers listening on the Unix sockets `upstreams`.
+    """
+
+    def __init__(self, upstreams: list[str], host: str = "localhost", port: int = 8080):
+        self.upstreams = upstreams
+        self.host = host
+        self.port = port
+        self.ring = ConsistentHashRing(len(upstreams))
+        self.client_ids = count()
+        self.tags = count()
+        self.mutex = Lock()
+        # websocket client, worker and session of every client
+        self.clients: dict[int, dict] = {}
+        self.client_shards: dict[int, int | None] = {}
+        self.client_sessions: dict[int, str | None] = {}
+        # last session list of every worker
+        self.session_lists: list[dict | None] = [None] * len(upstreams)
+        # client and workers that still have to send their session list, for every `list` builtin
+        self.pending_lists: dict[int, tuple[int, set[int]]] = {}
+
+        self.links = [RelayLink(connect(path)) for path in upstreams]
+        self.server = WebsocketServer(host=self.host, port=self.port)
+        self.server.set_fn_new_client(self.on_connect)
+        self.server.set_fn_message_received(self.on_message)
+        self.server.set_fn_client_left(self.on_close)
+
+    def get_session_list(self) -> dict:
+        """
+        Session lists of all the workers, merged. Must be called with `mutex` acquired.
+        """
+        lists = [session_list for session_list in self.session_lists if session_list is not None]
+        max_memory = [session_list.get("max_memory") for session_list in lists]
+        return {
+            "info": "session_list",
+            "sessions": [name for session_list in lists for name in session_list["sessions"]],
+            "session_problems": {name: problem for session_list in lists for name, problem in session_list["session_problems"].items()},
+            "hibernated": [name for session_list in lists for name in session_list.get("hibernated", [])],
+            "memory_usage": {name: usage for session_list in lists for name, usage in session_list.get("memory_usage", {}).items()},
+            # the limit applies to each worker
+            "max_memory": sum(max_memory) if len(max_memory) > 0 and None not in max_memory else None,
+            "shards": {name: shard for shard, session_list in enumerate(self.session_lists) if session_list is not None for name in session_list["sessions"]},
+        }
+
+    def on_connect(self, client: dict, _server: WebsocketServer):
+        self.mutex.acquire(1)
+        try:
+            client['shard_id'] = next(self.client_ids)
+            self.clients[client['shard_id']] = client
+            self.client_shards[client['shard_id']] = None
+            self.client_sessions[client['shard_id']] = None
+        finally:
+            self.mutex.release()
+        print(f"Connected: {client['address']}")
+
+    def on_close(self, client: dict, _server: WebsocketServer):
+        self.mutex.acquire(1)
+        try:
+            del self.clients[client['shard_id']]
+            del self.client_sessions[client['shard_id']]
+            shard = self.client_shards.pop(client['shard_id'])
+        finally:
+            self.mutex.release()
+        if shard is not None:
+            self.links[shard].write({"op": "close", "client": client['shard_id']})
+        print(f"Disconnected: {client['address']}")
+
+    def send_session(self, client: dict):
+        self.mutex.acquire(1)
+        try:
+            session = self.client_sessions[client['shard_id']]
+        finally:
+            self.mutex.release()
+        self.server.send_message(client, json_enc.encode({
+            "info": "session",
+            "session": session,
+        }))
+
+    def forward(self, client: dict, message: str, shard: int | None = None):
+        """
+        Sends the message to the worker `shard`, or to the worker of the client. A client moved to another worker
+        leaves its session.
+        """
+        client_id = client['shard_id']
+        self.mutex.acquire(1)
+        try:
+            previous = self.client_shards[client_id]
+            if shard is None:
+                shard = previous
+            elif shard != previous:
+                self.client_shards[client_id] = shard
+                self.client_sessions[client_id] = None
+        finally:
+            self.mutex.release()
+        if shard is None:
+            print("NoSession:", client['address'])
+            return
+        if shard != previous:
+            if previous is not None:
+                self.links[previous].write({"op": "close", "client": client_id})
+            self.links[shard].write({"op": "open", "client": client_id})
+        self.links[shard].write({"op": "message", "client": client_id, "tag": None}, message)
+
+    def on_message(self, client: dict, _server: WebsocketServer, message: str):
+        try:
+            data = json.loads(message)
+        except json.JSONDecodeError:
+            data = None
+        if type(data) is not dict or "session" not in data:
+            self.forward(client, message)
+            return
+
+        match data["session"]:
+            case "join-or-create":
+                if type(data.get("name")) is not str or data["name"] == "":
+                    return
+                self.forward(client, message, self.ring.get_shard(data["name"]))
+            case "list":
+                self.mutex.acquire(1)
+                try:
+                    tag = next(self.tags)
+                    self.pending_lists[tag] = (client['shard_id'], set(range(len(self.links))))
+                finally:
+                    self.mutex.release()
+                for link in self.links:
+                    link.write({"op": "message", "client": CONTROL_CLIENT, "tag": tag}, message)
+            case "info":
+                self.send_session(client)
+            case "describe":
+                # every worker hosts the same problems
+                self.forward(client, message, self.client_shards.get(client['shard_id']) or 0)
+            case _:
+                if self.client_shards.get(client['shard_id']) is None:
+                    if data["session"] == "leave":
+                        self.send_session(client)
+                    return
+                self.forward(client, message)
+
+    def handle_frame(self, shard: int, header: dict, frame: str):
+        self.mutex.acquire(1)
+        try:
+            if frame.startswith('{"info":"session_list",'):
+                self.session_lists[shard] = json.loads(frame)
+                tag = header.get("tag")
+                if tag in self.pending_lists:
+                    client_id, shards = self.pending_lists[tag]
+                    shards.discard(shard)
+                    client_ids = [] if len(shards) > 0 else [client_id]
+                    if len(shards) == 0:
+                        del self.pending_lists[tag]
+                else:
+                    # broadcast by the worker when its sessions change
+                    client_ids = list(self.clients) if CONTROL_CLIENT in header["clients"] else []
+                frame = json_enc.encode(self.get_session_list())
+            else:
+                client_ids = [i for i in header["clients"] if self.client_shards.get(i) == shard]
+                if frame.startswith('{"info":"session",'):
+                    for client_id in client_ids:
+                        self.client_sessions[client_id] = json.loads(frame)["session"]
+            clients = [self.clients[i] for i in client_ids if i in self.clients]
+        finally:
+            self.mutex.release()
+        for client in clients:
+            self.server.send_message(client, frame)
+
+    def read_upstream(self, shard: int):
+        link = self.links[shard]
+        while True:
+            message = link.read()
+            if message is None:
+                print("Upstream closed:", self.upstreams[shard])
+                self.server.shutdown_gracefully()
+                return
+            header, frame = message
+            # the front-end keeps no snapshot, the session versions sent by the workers are ignored
+            if frame is not None:
+                self.handle_frame(shard, header, frame)
+
+    def run(self):
+        try:
+            print(f"Front-end starting on {self.host}:{self.port}, {len(self.links)} shards")
+            for shard, link in enumerate(self.links):
+                Thread(target=self.read_upstream, args=(shard,), daemon=True).start()
+                link.write({"op": "open", "client": CONTROL_CLIENT})
+                link.write({"op": "message", "client": CONTROL_CLIENT, "tag": None}, '{"session":"list"}')
+            self.server.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+            for link in self.links:
+                link.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m ga_server.sharding <worker socket>[,<worker socket>...] [host] [port]")
+        sys.exit(1)
+    GAShardRouter(
+        sys.argv[1].split(","),
+        sys.argv[2] if len(sys.argv) > 2 else "localhost",
+        int(sys.argv[3]) if len(sys.argv) > 3 else 8080,
+    ).run()
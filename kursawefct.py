@@ -3,13 +3,13 @@
 # https://deap.readthedocs.io/en/master/api/benchmarks.html#deap.benchmarks.kursawe
 
 import array
+import functools
 import logging
 from ga_server.deap_server.deap_server import DEAPServer
 import random
 
 import numpy
 
-from deap import algorithms
 from deap import base
 from deap import benchmarks
 from deap import creator
@@ -17,9 +17,17 @@ from deap import tools
 
 from ga_server.deap_server.deap_settings_presets import get_cxpb_deap_setting, get_lambda_deap_settings, get_mu_deap_settings, get_mutpb_deap_setting
 from ga_server.deap_server.individual_encoding import get_ind_enc_range
+from ga_server.deap_server.batch_operators import cx_blend_batch, mut_gaussian_batch
+from ga_server.deap_server.variation import ea_mu_plus_lambda
+from ga_server.deap_server.pareto import ParetoArchive, sel_nsga2
+from ga_server.deap_server.statistics import StreamingStatistics
 
 def checkBounds(min, max):
     def decorator(func):
+        # batched operators are given the bounds directly
+        if getattr(func, 'batched', False):
+            return func
+        @functools.wraps(func)
         def wrappper(*args, **kargs):
             offspring = func(*args, **kargs)
             for child in offspring:
@@ -32,19 +40,45 @@ def checkBounds(min, max):
         return wrappper
     return decorator
 
-def get_result_one_function(fitness_values, index, fct):
-    values = [v.values[index] for v in fitness_values]
-    return fct(values)
+FITNESS_WEIGHTS = (-1.0, -1.0)
 
-def get_result_fitness(fitness_values, fct):
-    values = [sum(v.wvalues) for v in fitness_values]
-    return fct(values)
+def weighted_fitness(values: numpy.ndarray) -> numpy.ndarray:
+    return values @ FITNESS_WEIGHTS
 
-def main():
-    random.seed(64)
-    MU, LAMBDA = 50, 100
+MU, LAMBDA = 50, 100
+
+def setup(server: DEAPServer):
+    creator.create("KursaweFitnessMin", base.Fitness, weights=FITNESS_WEIGHTS)
+    DEAPServer.create("KursaweIndividual", array.array, typecode='d', fitness=creator.KursaweFitnessMin)
+
+    # Attribute generator
+    server.toolbox.register("attr_float", random.uniform, -5, 5)
+
+    # Structure initializers
+    server.toolbox.register("individual", tools.initRepeat, creator.KursaweIndividual, server.toolbox.attr_float, 3)
+    server.toolbox.register("population", tools.initRepeat, list, server.toolbox.individual)
+
+
+    server.toolbox.register("evaluate", benchmarks.kursawe)
+    server.register_mate("cxBlend", tools.cxBlend, default=True, alpha=1.5)
+    server.register_mate("cxBlend (batched)", cx_blend_batch, alpha=1.5, low=-5, up=5)
+    server.register_mutate("mutGaussian", tools.mutGaussian, default=True, mu=0, sigma=3, indpb=0.3)
+    server.register_mutate("mutGaussian (batched)", mut_gaussian_batch, mu=0, sigma=3, indpb=0.3, low=-5, up=5)
+    server.register_select("NSGA-II (vectorized)", sel_nsga2, default=True)
+    server.register_select("selNSGA2", tools.selNSGA2)
+
+    server.decorate("mate", checkBounds(-5, 5))
+    server.decorate("mutate", checkBounds(-5, 5)) 
+
+
+    server.stats.register("Function 1", {'mean': 'mean', 'min': 'min', 'max': 'max'}, column=0)
+    server.stats.register("Function 2", {'mean': 'mean', 'min': 'min', 'max': 'max'}, column=1)
+    server.stats.register("Fitness", {'mean': 'mean', 'min': 'min', 'max': 'max'}, column=weighted_fitness)
+    server.stats.register("Fitness Standard Deviation", {'Standard deviation': 'std'}, column=weighted_fitness)
+    server.stats.register_diversity("Diversity", server.individual_encoding)
 
-    server = DEAPServer(
+def get_server() -> DEAPServer:
+    return DEAPServer(
         port=8081,
 
         algorithm_kwargs={
@@ -55,60 +89,24 @@ def main():
             'ngen': 1,
             'verbose': False
         },
-        algorithm=algorithms.eaMuPlusLambda,
+        algorithm=ea_mu_plus_lambda,
         title="Kursawe Benchmark",
         initial_pop_size=MU,
-        stats=tools.Statistics(lambda ind: ind.fitness),
+        stats=StreamingStatistics(lambda ind: ind.fitness.values),
         settings=[
             get_mutpb_deap_setting(),
             get_cxpb_deap_setting(),
             get_lambda_deap_settings(),
             get_mu_deap_settings(),
         ],
-        individual_encoding=get_ind_enc_range(-5, 5)
+        individual_encoding=get_ind_enc_range(-5, 5),
+        setup=setup,
+        pareto_archive=ParetoArchive(),
     )
 
-    creator.create("FitnessMin", base.Fitness, weights=(-1.0, -1.0))
-    DEAPServer.create("Individual", array.array, typecode='d', fitness=creator.FitnessMin)
-
-    # Attribute generator
-    server.toolbox.register("attr_float", random.uniform, -5, 5)
-
-    # Structure initializers
-    server.toolbox.register("individual", tools.initRepeat, creator.Individual, server.toolbox.attr_float, 3)
-    server.toolbox.register("population", tools.initRepeat, list, server.toolbox.individual)
-
-
-    server.toolbox.register("evaluate", benchmarks.kursawe)
-    server.register_mate("cxBlend", tools.cxBlend, default=True, alpha=1.5)
-    server.register_mutate("mutGaussian", tools.mutGaussian, default=True, mu=0, sigma=3, indpb=0.3)
-    server.register_select("selNSGA2", tools.selNSGA2, default=True)
-
-    server.decorate("mate", checkBounds(-5, 5))
-    server.decorate("mutate", checkBounds(-5, 5)) 
-
-
-    server.stats = tools.Statistics(lambda ind: ind.fitness)
-    server.stats.register("Function 1", lambda values: {
-        'mean': get_result_one_function(values, 0, numpy.mean),
-        'min': get_result_one_function(values, 0, numpy.min),
-        'max': get_result_one_function(values, 0, numpy.max),
-    })
-    server.stats.register("Function 2", lambda values: {
-        'mean': get_result_one_function(values, 1, numpy.mean),
-        'min': get_result_one_function(values, 1, numpy.min),
-        'max': get_result_one_function(values, 1, numpy.max),
-    })
-    server.stats.register("Fitness", lambda values: {
-        'mean': get_result_fitness(values, numpy.mean),
-        'min': get_result_fitness(values, numpy.min),
-        'max': get_result_fitness(values, numpy.max),
-    })
-    server.stats.register("Fitness Standard Deviation", lambda values: {
-        'Standard deviation': get_result_fitness(values, numpy.std)
-    })
-
-    server.run()
+def main():
+    random.seed(64)
+    get_server().run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# Hosts all the example problems on a single server.
+# Each problem is only initialized when the first session using it is created.
+
+from ga_server.deap_server.deap_server import DEAPServer
+import kursawefct
+import tsp
+
+def main():
+    DEAPServer.serve([
+        tsp.get_server(),
+        kursawefct.get_server(),
+    ], port=8080)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+from ga_server.client import GAClient
+from ga_server.gas import GAServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ServerHarness:
+    """
+    `GAServer` hosting the TSP and Kursawe problems, whose websocket clients are fake: the messages sent to them are
+    decoded and kept in `out`.
+    """
+
+    def __init__(self, deap_servers: list, **kwargs):
+        self.deap_servers = deap_servers
+        self.server = GAServer("localhost", 0, problems=[deap_server.get_problem() for deap_server in deap_servers], **kwargs)
+        self.out: list[dict] = []
+        self.server.server.send_message = lambda ws, message: self.out.append(json.loads(message))
+
+    def client(self, address=("client", 0)) -> GAClient:
+        ga_client = GAClient({"address": address})
+        self.server.connections[address] = ga_client
+        return ga_client
+
+    def send(self, ga_client: GAClient, **data):
+        self.server.message_handler(json.dumps(data), ga_client)
+
+    def replies(self, info: str) -> list[dict]:
+        return [message for message in self.out if message.get("info") == info]
+
+    def close(self):
+        self.server.server.server_close()
+
+
+def pytest_configure(config):
+    # every test sets the problems up again, creating their `creator` classes again
+    config.addinivalue_line("filterwarnings", "ignore:A class named:RuntimeWarning")
+
+
+@pytest.fixture(autouse=True)
+def isolated_server_state(monkeypatch):
+    # sessions and connections are shared by all the servers of a process
+    monkeypatch.setattr(GAServer, "connections", {})
+    monkeypatch.setattr(GAServer, "sessions", {})
+    monkeypatch.setattr(GAServer, "session_problems", {})
+    # the TSP instance is loaded from the root of the repository
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def make_server():
+    """
+    Returns a function creating a `ServerHarness`. `configure` is called with the `DEAPServer` of each problem before
+    the server is created.
+    """
+    import kursawefct
+    import tsp
+
+    harnesses = []
+
+    def make(configure=None, **kwargs) -> ServerHarness:
+        deap_servers = [tsp.get_server(), kursawefct.get_server()]
+        if configure is not None:
+            for deap_server in deap_servers:
+                configure(deap_server)
+        harness = ServerHarness(deap_servers, **kwargs)
+        harnesses.append(harness)
+        return harness
+
+    yield make
+    for harness in harnesses:
+        harness.close()
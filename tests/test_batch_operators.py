@@ -0,0 +1,81 @@
+import random
+
+import numpy
+import pytest
+
+from ga_server.deap_server.batch_operators import (
+    cx_blend_batch,
+    cx_ordered_batch,
+    cx_partially_matched_batch,
+    cx_two_point_batch,
+    cx_uniform_batch,
+    is_batched,
+    mut_flip_bit_batch,
+    mut_gaussian_batch,
+    mut_shuffle_indexes_batch,
+)
+
+LENGTH = 30
+
+
+def get_permutations(rng: random.Random, n: int) -> list[list[int]]:
+    return [rng.sample(range(LENGTH), LENGTH) for _ in range(n)]
+
+
+@pytest.mark.parametrize("mate", [cx_partially_matched_batch, cx_ordered_batch])
+def test_permutation_crossovers(mate):
+    rng = random.Random(0)
+    random.seed(0)
+    parents1, parents2 = get_permutations(rng, 50), get_permutations(rng, 50)
+    before = [list(ind) for ind in parents1]
+    children1, children2 = mate(parents1, parents2)
+
+    assert children1 is parents1 and children2 is parents2
+    assert all(sorted(child) == list(range(LENGTH)) for child in children1 + children2)
+    assert [list(ind) for ind in children1] != before
+
+def test_shuffle_indexes():
+    random.seed(0)
+    population = get_permutations(random.Random(0), 50)
+    mut_shuffle_indexes_batch(population, indpb=0.1)
+    assert all(sorted(ind) == list(range(LENGTH)) for ind in population)
+
+def test_operators_are_seeded_by_random():
+    results = []
+    for _ in range(2):
+        random.seed(1)
+        population = get_permutations(random.Random(0), 20)
+        mut_shuffle_indexes_batch(population, indpb=0.2)
+        results.append(population)
+    assert results[0] == results[1]
+
+def test_range_operators_respect_the_bounds():
+    random.seed(0)
+    rng = numpy.random.default_rng(0)
+    parents1, parents2 = rng.uniform(-5, 5, (50, 3)).tolist(), rng.uniform(-5, 5, (50, 3)).tolist()
+    cx_blend_batch(parents1, parents2, alpha=0.5, low=-5, up=5)
+    mut_gaussian_batch(parents1, mu=0, sigma=10, indpb=1.0, low=-5, up=5)
+
+    values = numpy.array(parents1 + parents2)
+    assert values.min() >= -5 and values.max() <= 5
+
+@pytest.mark.parametrize("mate", [cx_uniform_batch, cx_two_point_batch])
+def test_boolean_crossovers_exchange_genes(mate):
+    random.seed(0)
+    parents1, parents2 = [[0] * LENGTH for _ in range(20)], [[1] * LENGTH for _ in range(20)]
+    kwargs = {"indpb": 0.5} if mate is cx_uniform_batch else {}
+    mate(parents1, parents2, **kwargs)
+
+    # genes are swapped, never created
+    assert all(a + b == 1 for child1, child2 in zip(parents1, parents2) for a, b in zip(child1, child2))
+    assert any(0 < sum(child) < LENGTH for child in parents1)
+
+def test_flip_bit():
+    random.seed(0)
+    population = [[0] * LENGTH for _ in range(20)]
+    mut_flip_bit_batch(population, indpb=1.0)
+    assert population == [[1] * LENGTH for _ in range(20)]
+
+def test_is_batched():
+    assert is_batched(cx_ordered_batch)
+    assert not is_batched(random.sample)
@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+
+from ga_server.client import GAClient
+from ga_server.gas import GAServer
+
+
+def test_batch_replies(make_server):
+    harness = make_server()
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.out.clear()
+    harness.send(client, batch=[{"command": "get-status"}, {"command": "unknown"}, {"command": "run-one-gen"}])
+
+    assert len(harness.out) == 1
+    responses = harness.out[0]["responses"]
+    assert [[reply["info"] for reply in replies] for replies in responses] == [["status"], [], ["one-gen"]]
+
+def test_broadcasts_of_a_batch_are_sent_to_the_other_clients(make_server):
+    harness = make_server()
+    sender, other = harness.client(("sender", 0)), harness.client(("other", 1))
+    harness.send(sender, session="join-or-create", name="s")
+    harness.send(other, session="join-or-create", name="s")
+    harness.out.clear()
+    harness.send(sender, batch=[{"command": "run-one-gen"}])
+
+    assert [message["info"] for message in harness.out] == ["one-gen", "batch"]
+
+def test_commands_wait_for_the_running_batch(make_server):
+    harness = make_server()
+    sender, other = harness.client(("sender", 0)), harness.client(("other", 1))
+    harness.send(sender, session="join-or-create", name="s")
+    harness.send(other, session="join-or-create", name="s")
+    harness.out.clear()
+    batch = threading.Thread(target=harness.send, args=(sender,), kwargs={"batch": [
+        {"command": "settings"},
+        {"command": "run-n-gen", "generations": 10},
+        {"command": "settings"},
+    ]})
+    batch.start()
+    time.sleep(0.05)
+    harness.send(other, command="set-setting", settings={"Mutation probability": 0.9})
+    batch.join()
+
+    responses = harness.replies("batch")[0]["responses"]
+    assert responses[0][0]["settings"] == responses[2][0]["settings"]
+    assert harness.server.sessions["s"].algorithm_kwargs["mutpb"] == 0.9
+
+def test_settings_change_during_a_run(make_server):
+    harness = make_server()
+    runner, other = harness.client(("runner", 0)), harness.client(("other", 1))
+    harness.send(runner, session="join-or-create", name="s")
+    harness.send(other, session="join-or-create", name="s")
+    run = threading.Thread(target=harness.send, args=(runner,), kwargs={"command": "run-n-gen", "generations": 40})
+    run.start()
+    time.sleep(0.1)
+    harness.send(other, command="set-setting", settings={"Mutation probability": 0.9})
+    still_running = run.is_alive()
+    run.join()
+
+    assert still_running
+    change = harness.server.sessions["s"].settings_changelog[-1]
+    assert change["setting"] == "Mutation probability"
+    assert 0 < change["generation"] < 40
+
+def test_session_locks_are_removed_with_the_session():
+    server = GAServer("localhost", 0, ga_data_provider=dict, commands={"noop": lambda *args: None})
+    client = GAClient({"address": ("client", 0)})
+    server.connections[client.ws["address"]] = client
+    server.server.send_message = lambda ws, message: None
+    server.message_handler(json.dumps({"session": "join-or-create", "name": "s"}), client)
+    server.message_handler(json.dumps({"command": "noop"}), client)
+    assert "s" in server.session_locks
+
+    server.message_handler(json.dumps({"session": "delete"}), client)
+    assert "s" not in server.session_locks
+    assert "s" not in server.session_running_commands
+    server.server.server_close()
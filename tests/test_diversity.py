@@ -0,0 +1,46 @@
+import math
+import tracemalloc
+from collections import Counter
+
+import numpy
+import pytest
+
+from ga_server.deap_server.diversity import locus_entropy, unique_ratio
+
+
+def reference_entropy(values: numpy.ndarray, n_values: int) -> float:
+    n, length = values.shape
+    entropies = []
+    for locus in range(length):
+        counts = Counter(values[:, locus].tolist())
+        entropies.append(-sum(c / n * math.log(c / n) for c in counts.values()))
+    return sum(entropies) / length / math.log(min(n, n_values))
+
+
+@pytest.mark.parametrize("n, length, n_values", [(100, 17, 17), (50, 300, 300), (200, 40, 2), (3, 5, 10)])
+def test_locus_entropy(n, length, n_values):
+    values = numpy.random.default_rng(0).integers(0, n_values, (n, length))
+    assert locus_entropy(values, values, n_values) == pytest.approx(reference_entropy(values, n_values))
+
+def test_locus_entropy_bounds():
+    same = numpy.zeros((10, 8), dtype=int)
+    assert locus_entropy(same, same, 8) == 0.0
+    permutations = numpy.array([numpy.roll(numpy.arange(8), shift) for shift in range(8)])
+    assert locus_entropy(permutations, permutations, 8) == pytest.approx(1.0)
+
+def test_locus_entropy_memory_is_linear_in_the_chromosome_length():
+    length = 5000
+    rng = numpy.random.default_rng(0)
+    chromosomes = numpy.array([rng.permutation(length) for _ in range(100)])
+    tracemalloc.start()
+    try:
+        locus_entropy(chromosomes, chromosomes, length)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # a count per locus and value would take length * length * 8 bytes (200 MB)
+    assert peak < 20 * chromosomes.nbytes
+
+def test_unique_ratio():
+    chromosomes = numpy.array([[0, 1], [0, 1], [1, 0], [1, 1]])
+    assert unique_ratio(chromosomes) == 0.75
@@ -0,0 +1,84 @@
+import pickle
+import random
+from copy import deepcopy
+
+import pytest
+from deap import base, creator, tools
+
+from ga_server.deap_server.elites import EliteArchive
+
+creator.create("TestEliteFitness", base.Fitness, weights=(-1.0,))
+creator.create("TestEliteIndividual", list, fitness=creator.TestEliteFitness)
+
+
+def get_individual(rng: random.Random, fitness: float | None = None):
+    individual = creator.TestEliteIndividual(rng.sample(range(20), 20))
+    individual.fitness.values = (fitness if fitness is not None else rng.randint(0, 100),)
+    return individual
+
+
+@pytest.mark.parametrize("maxsize", [1, 5, 50])
+def test_same_individuals_as_the_hall_of_fame(maxsize):
+    rng = random.Random(maxsize)
+    archive, hall_of_fame = EliteArchive(maxsize), tools.HallOfFame(maxsize, similar=lambda a, b: a == b)
+    for _ in range(30):
+        population = [get_individual(rng) for _ in range(40)]
+        archive.update(population)
+        hall_of_fame.update(population)
+
+        assert len(archive) == len(hall_of_fame)
+        assert [ind.fitness.values for ind in archive.items] == [ind.fitness.values for ind in hall_of_fame.items]
+
+@pytest.mark.parametrize("maxsize", [1, 5, 50])
+def test_best_individual(maxsize):
+    rng = random.Random(maxsize)
+    archive = EliteArchive(maxsize)
+    for _ in range(30):
+        archive.update([get_individual(rng) for _ in range(40)])
+        best = sorted(archive.heap, key=lambda entry: (entry[0], -entry[1]), reverse=True)[0][3]
+
+        assert archive[0] is best
+        assert archive.top(1) == [best]
+        # hof[0] and top(1) don't sort the archive
+        assert archive.sorted_items is None
+
+def test_duplicates_are_skipped():
+    rng = random.Random(0)
+    individual = get_individual(rng, 1.0)
+    copy = creator.TestEliteIndividual(individual)
+    copy.fitness.values = individual.fitness.values
+    archive = EliteArchive(10)
+    archive.update([individual, copy])
+    archive.update([individual])
+
+    assert len(archive) == 1
+
+def test_top():
+    rng = random.Random(0)
+    archive = EliteArchive(100)
+    archive.update([get_individual(rng, fitness) for fitness in range(100)])
+
+    assert [ind.fitness.values[0] for ind in archive.top(3)] == [0, 1, 2]
+    assert archive.top(3) == archive.items[:3]
+
+def test_get_elites_command(make_server):
+    harness = make_server()
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, command="run-n-gen", generations=2)
+    harness.send(client, command="get-elites", k=5, fields=["id", "fitness"])
+
+    elites = harness.replies("elites")[-1]
+    assert len(elites["elites"]) == 5
+    assert list(elites["elites"][0]) == ["id", "fitness"]
+    fitnesses = [elite["fitness"] for elite in elites["elites"]]
+    assert fitnesses == sorted(fitnesses, reverse=True)
+
+def test_copies_keep_the_insertion_order():
+    rng = random.Random(0)
+    archive = EliteArchive(10)
+    archive.update([get_individual(rng, fitness) for fitness in range(5)])
+    copy = pickle.loads(pickle.dumps(deepcopy(archive)))
+    copy.update([get_individual(rng, fitness) for fitness in range(5, 10)])
+
+    assert sorted(entry[1] for entry in copy.heap) == list(range(10))
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+from ga_server.hibernation import HibernatedSession
+
+
+def test_session_round_trip(make_server, tmp_path):
+    harness = make_server(hibernate_after=0, hibernation_dir=str(tmp_path))
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, command="set-setting", settings={"Mutation probability": 0.5})
+    harness.send(client, command="run-n-gen", generations=3)
+    harness.send(client, command="info")
+    before = harness.replies("all")[-1]["data"]
+    harness.send(client, session="leave")
+
+    harness.server.hibernate_idle_sessions()
+    assert isinstance(harness.server.sessions["s"], HibernatedSession)
+    assert len(os.listdir(tmp_path)) == 1
+
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, command="info")
+    assert harness.replies("all")[-1]["data"] == before
+    assert os.listdir(tmp_path) == []
+
+    harness.send(client, command="run-one-gen")
+    assert harness.server.sessions["s"].generation == 4
+
+def test_sessions_with_clients_stay_in_memory(make_server, tmp_path):
+    harness = make_server(hibernate_after=0, hibernation_dir=str(tmp_path))
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+
+    harness.server.hibernate_idle_sessions()
+    assert not isinstance(harness.server.sessions["s"], HibernatedSession)
+
+def test_commands_wake_hibernated_sessions(make_server, tmp_path):
+    harness = make_server(hibernate_after=0, hibernation_dir=str(tmp_path))
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, session="leave")
+    harness.server.hibernate_idle_sessions()
+    # joined by another client while hibernated
+    other = harness.client(("other", 1))
+    harness.send(other, session="join-or-create", name="s")
+    harness.send(other, command="run-one-gen")
+
+    assert harness.server.sessions["s"].generation == 1
+
+def hibernate_with(harness, during_dump):
+    """
+    Hibernates the idle sessions, calling `during_dump` while the first one is being saved.
+    """
+    problem = harness.server.get_default_problem()
+    dump = problem.dump_session
+
+    def dump_session(session_data):
+        during_dump()
+        return dump(session_data)
+
+    problem.dump_session = dump_session
+    try:
+        harness.server.hibernate_idle_sessions()
+    finally:
+        problem.dump_session = dump
+
+def test_sessions_are_saved_without_the_mutex(make_server, tmp_path):
+    harness = make_server(hibernate_after=0, hibernation_dir=str(tmp_path))
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, session="leave")
+    other = harness.client(("other", 1))
+    command = threading.Thread(target=harness.send, args=(other,), kwargs={"command": "run-one-gen"})
+    locked = []
+
+    def during_dump():
+        locked.append(harness.server.sessions_mutex.locked())
+        harness.send(other, session="list")
+        # joined while being saved, its commands wait until the session is saved and wake it
+        harness.send(other, session="join-or-create", name="s")
+        command.start()
+        time.sleep(0.05)
+        locked.append(command.is_alive())
+
+    hibernate_with(harness, during_dump)
+    command.join()
+
+    assert locked == [False, True]
+    assert harness.server.sessions["s"].generation == 1
+    assert os.listdir(tmp_path) == []
+
+def test_sessions_deleted_while_being_saved(make_server, tmp_path):
+    harness = make_server(hibernate_after=0, hibernation_dir=str(tmp_path))
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, session="leave")
+
+    def during_dump():
+        client.session_name = "s"
+        harness.send(client, session="delete")
+
+    hibernate_with(harness, during_dump)
+
+    assert "s" not in harness.server.sessions
+    assert os.listdir(tmp_path) == []
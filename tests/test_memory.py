@@ -0,0 +1,61 @@
+from ga_server.deap_server.ga_data_deap import GADataDeap
+
+
+def limit_session_memory(deap_server):
+    deap_server.max_session_memory = 1
+
+
+def test_oldest_populations_are_dropped(make_server):
+    harness = make_server(limit_session_memory)
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, command="run-n-gen", generations=3)
+
+    populations = harness.server.sessions["s"].populations
+    assert [population is None for population in populations] == [True, True, True, False]
+
+def test_trimmed_generation_without_log(make_server):
+    harness = make_server(limit_session_memory)
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, command="run-n-gen", generations=2)
+    harness.out.clear()
+    harness.send(client, command="get-generation", generation=0)
+
+    assert [message["info"] for message in harness.out] == ["error"]
+    assert harness.out[0]["error"] == "generation_trimmed"
+
+def test_trimmed_generation_is_rebuilt_from_the_log(make_server, tmp_path, monkeypatch):
+    closed = []
+    close = GADataDeap.close
+    monkeypatch.setattr(GADataDeap, "close", lambda ga_data: closed.append(ga_data) or close(ga_data))
+
+    def configure(deap_server):
+        limit_session_memory(deap_server)
+        deap_server.session_log_dir = str(tmp_path)
+
+    harness = make_server(configure)
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, command="run-n-gen", generations=2)
+    harness.send(client, command="get-generation", generation=1)
+
+    generation = harness.replies("generation")[-1]
+    assert generation["generation"] == 1
+    assert generation["gen_stats"] == harness.server.sessions["s"].records[0]
+    assert len(generation["population"]) == 300
+    # the replayed session is closed, the session itself is still running
+    assert len(closed) == 1 and closed[0] is not harness.server.sessions["s"]
+
+def test_sessions_are_rejected_over_the_memory_limit(make_server):
+    harness = make_server(max_memory=1)
+    first, second = harness.client(("first", 0)), harness.client(("second", 1))
+    harness.send(first, session="join-or-create", name="s1")
+    harness.send(second, session="join-or-create", name="s2")
+
+    assert first.session_name == "s1"
+    assert second.session_name is None
+    assert harness.replies("error")[-1]["error"] == "memory_limit"
+    # existing sessions can still be joined
+    harness.send(second, session="join-or-create", name="s1")
+    assert second.session_name == "s1"
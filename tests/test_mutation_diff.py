@@ -0,0 +1,52 @@
+import pytest
+
+from ga_server.deap_server.IndividualData import get_mutation_diff
+from ga_server.deap_server.ga_data_deap import GADataDeap
+from ga_server.deap_server.session_log import install_random_routing
+
+
+def apply_diff(chromosome: list, mutation_diff: list[list]) -> list:
+    """
+    Chromosome before the mutation, as rebuilt by the clients.
+    """
+    before = list(chromosome)
+    for position, value in zip(*mutation_diff):
+        before[position] = value
+    return before
+
+def run_session(mutation_encoding: str, mutation: str, generations: int) -> list[list[dict]]:
+    import tsp
+
+    # the runs draw from seeded generators
+    install_random_routing()
+    server = tsp.get_server()
+    server.mutation_encoding = mutation_encoding
+    ga_data = server.create_ga_data(seed=1)
+    ga_data.set_settings({"settings": {"Mutation": mutation, "Mutation probability": 0.8}})
+    populations = []
+    for generation in range(generations):
+        ga_data.run_one_gen(seed=generation)
+        populations.append(GADataDeap.get_pop_data(ga_data.pop))
+    return populations
+
+
+def test_get_mutation_diff():
+    assert get_mutation_diff([0, 1, 2, 3, 4], [0, 3, 2, 1, 4]) == [[1, 3], [1, 3]]
+    assert get_mutation_diff([0, 1, 2], [0, 1, 2]) == [[], []]
+
+@pytest.mark.parametrize("mutation", ["Shuffle Indexes", "Shuffle Indexes (batched)"])
+def test_diffs_rebuild_the_chromosomes_before_the_mutations(mutation):
+    full = run_session("full", mutation, 3)
+    diff = run_session("diff", mutation, 3)
+
+    mutated = 0
+    for full_population, diff_population in zip(full, diff):
+        for full_individual, diff_individual in zip(full_population, diff_population):
+            assert diff_individual["chromosome"] == full_individual["chromosome"]
+            assert diff_individual["before_mutation"] is None
+            if full_individual["before_mutation"] is None:
+                assert "mutation_diff" not in diff_individual
+                continue
+            mutated += 1
+            assert apply_diff(diff_individual["chromosome"], diff_individual["mutation_diff"]) == full_individual["before_mutation"]
+    assert mutated > 0
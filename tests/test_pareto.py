@@ -0,0 +1,75 @@
+import numpy
+import pytest
+from deap import base, creator, tools
+
+from ga_server.deap_server.pareto import ParetoArchive, crowding_distance, non_dominated_sort, sel_nsga2
+
+creator.create("TestParetoFitness", base.Fitness, weights=(-1.0, -1.0))
+creator.create("TestParetoIndividual", list, fitness=creator.TestParetoFitness)
+
+
+def get_population(seed: int, n: int = 60) -> list:
+    rng = numpy.random.default_rng(seed)
+    population = []
+    for values in rng.integers(0, 20, (n, 2)).tolist():
+        individual = creator.TestParetoIndividual(rng.integers(0, 1000, 4).tolist())
+        individual.fitness.values = tuple(values)
+        population.append(individual)
+    return population
+
+def get_wvalues(population) -> numpy.ndarray:
+    return numpy.array([ind.fitness.wvalues for ind in population])
+
+def fitness_set(population) -> list:
+    return sorted(ind.fitness.values for ind in population)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_fronts_as_deap(seed):
+    population = get_population(seed)
+    fronts = non_dominated_sort(get_wvalues(population))
+    expected = tools.sortNondominated(population, len(population))
+
+    assert [fitness_set([population[i] for i in front]) for front in fronts] == [fitness_set(front) for front in expected]
+
+def test_sort_stops_after_k_individuals():
+    population = get_population(0)
+    fronts = non_dominated_sort(get_wvalues(population), k=10)
+    assert sum(len(front) for front in fronts[:-1]) < 10 <= sum(len(front) for front in fronts)
+
+def test_crowding_distance_keeps_the_extremes():
+    wvalues = numpy.array([[0.0, -4.0], [-1.0, -2.0], [-2.0, -1.0], [-4.0, 0.0]])
+    distances = crowding_distance(wvalues)
+    assert numpy.isinf(distances[[0, 3]]).all()
+    assert numpy.isfinite(distances[[1, 2]]).all()
+
+def test_sel_nsga2_keeps_the_first_front():
+    population = get_population(1)
+    first_front = tools.sortNondominated(population, len(population), first_front_only=True)[0]
+    selected = sel_nsga2(population, len(first_front))
+    assert fitness_set(selected) == fitness_set(first_front)
+
+def test_archive_keeps_the_non_dominated_individuals():
+    archive = ParetoArchive()
+    seen = []
+    for seed in range(5):
+        population = get_population(seed)
+        archive.update(population)
+        seen += population
+
+        front = tools.sortNondominated(seen, len(seen), first_front_only=True)[0]
+        assert sorted(set(fitness_set(archive.items))) == sorted(set(fitness_set(front)))
+        assert len(archive.keys) == len(archive.items)
+
+def test_archive_maxsize():
+    archive = ParetoArchive(maxsize=3)
+    population = []
+    for x in range(10):
+        individual = creator.TestParetoIndividual([x])
+        individual.fitness.values = (x, 9 - x)
+        population.append(individual)
+    archive.update(population)
+
+    assert len(archive) == 3
+    # the extremes have an infinite crowding distance
+    assert (0, 9) in fitness_set(archive.items) and (9, 0) in fitness_set(archive.items)
@@ -0,0 +1,56 @@
+import os
+from multiprocessing import Pool
+
+import numpy
+import pytest
+
+from ga_server.problem_data import load_tsp, write_atomically
+
+COORDINATES = numpy.random.default_rng(0).uniform(0, 1000, (60, 2))
+
+
+def write_coordinates(directory) -> str:
+    path = os.path.join(directory, "cities.txt")
+    numpy.savetxt(path, COORDINATES)
+    return path
+
+def load_tour_length(path: str) -> float:
+    return load_tsp(path).distances.tour_length(list(range(len(COORDINATES))))
+
+
+def test_write_atomically_replaces_the_file(tmp_path):
+    path = str(tmp_path / "data.json")
+    with open(path, "w") as data_file:
+        data_file.write("old")
+
+    def write(temporary_path: str):
+        # the file isn't changed until the write is complete
+        with open(path) as data_file:
+            assert data_file.read() == "old"
+        with open(temporary_path, "w") as data_file:
+            data_file.write("new")
+
+    write_atomically(path, write)
+    with open(path) as data_file:
+        assert data_file.read() == "new"
+    assert os.listdir(tmp_path) == ["data.json"]
+
+def test_write_atomically_leaves_nothing_on_error(tmp_path):
+    path = str(tmp_path / "data.npy")
+
+    def write(temporary_path: str):
+        numpy.save(temporary_path, numpy.zeros(3))
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomically(path, write)
+    assert os.listdir(tmp_path) == []
+
+def test_processes_building_the_cache_at_the_same_time(tmp_path):
+    path = write_coordinates(tmp_path)
+    with Pool(4) as pool:
+        lengths = pool.map(load_tour_length, [path] * 4)
+
+    assert sorted(os.listdir(tmp_path)) == ["cities.txt", "cities.txt.distances.npy", "cities.txt.meta.json"]
+    # loaded from the cache
+    assert lengths == [load_tour_length(path)] * 4
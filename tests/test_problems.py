@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+def test_list_is_not_blocked_by_the_setup_of_a_problem(make_server):
+    setup_started = threading.Event()
+
+    def configure(deap_server):
+        setup = deap_server.setup
+
+        def slow_setup(server):
+            setup_started.set()
+            time.sleep(1.0)
+            setup(server)
+
+        deap_server.setup = slow_setup
+
+    harness = make_server(configure)
+    creator, other = harness.client(("creator", 0)), harness.client(("other", 1))
+    thread = threading.Thread(target=harness.send, args=(creator,), kwargs={"session": "join-or-create", "name": "s"})
+    thread.start()
+    assert setup_started.wait(5)
+    start = time.monotonic()
+    harness.send(other, session="list")
+    assert time.monotonic() - start < 0.5
+    thread.join()
+
+    assert creator.session_name == "s"
+    assert harness.server.session_problems["s"] == "Travelling Salesman Problem"
+
+
+def test_sessions_use_the_problem_they_were_created_with(make_server):
+    harness = make_server()
+    tsp_client, kursawe_client = harness.client(("tsp", 0)), harness.client(("kursawe", 1))
+    harness.send(tsp_client, session="join-or-create", name="tsp")
+    harness.send(kursawe_client, session="join-or-create", name="kursawe", problem="Kursawe Benchmark")
+    harness.send(kursawe_client, session="list")
+
+    assert harness.replies("session_list")[-1]["session_problems"] == {
+        "tsp": "Travelling Salesman Problem",
+        "kursawe": "Kursawe Benchmark",
+    }
+
+def test_unknown_problems_are_reported(make_server):
+    harness = make_server()
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s", problem="Unknown")
+
+    assert client.session_name is None
+    assert "s" not in harness.server.sessions
+    assert harness.replies("error")[-1]["error"] == "problem_not_found"
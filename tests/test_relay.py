@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+
+import pytest
+
+from ga_server.relay import GARelay
+
+SETTING = "Mutation probability"
+
+
+class RelayHarness:
+    """
+    `GARelay` whose websocket clients are fake, the messages sent to them are decoded and kept in `out`.
+    """
+
+    def __init__(self, socket_path: str):
+        self.relay = GARelay(socket_path, "localhost", 0)
+        self.out: list[tuple[int, dict]] = []
+        self.relay.server.send_message = lambda client, message: self.out.append((client['relay_id'], json.loads(message)))
+        # messages forwarded to the server
+        self.forwarded = 0
+        write = self.relay.link.write
+
+        def count_forwarded(header: dict, frame: str | None = None):
+            if header.get("op") == "message":
+                self.forwarded += 1
+            write(header, frame)
+
+        self.relay.link.write = count_forwarded
+        threading.Thread(target=self.relay.read_upstream, daemon=True).start()
+
+    def client(self) -> dict:
+        client = {"address": ("relay client", id(self))}
+        self.relay.on_connect(client, None)
+        return client
+
+    def send(self, client: dict, info: str, **data) -> dict:
+        """
+        Sends the message and waits for the reply of type `info`.
+        """
+        sent = len(self.out)
+        self.relay.on_message(client, None, json.dumps(data))
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            for client_id, message in self.out[sent:]:
+                if client_id == client['relay_id'] and message.get("info") == info:
+                    return message
+            time.sleep(0.01)
+        raise TimeoutError(f"No {info} reply to {data}")
+
+    def get_setting(self, client: dict) -> float:
+        return self.send(client, "settings-update", command="settings")["settings"][SETTING]["value"]
+
+    def is_cached(self, client: dict) -> bool:
+        forwarded = self.forwarded
+        self.get_setting(client)
+        return self.forwarded == forwarded
+
+
+@pytest.fixture
+def relays(make_server, tmp_path):
+    socket_path = str(tmp_path / "relay.sock")
+    harness = make_server(relay_socket=socket_path)
+    threading.Thread(target=harness.server.listen_relays, daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not (tmp_path / "relay.sock").exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    relays = [RelayHarness(socket_path), RelayHarness(socket_path)]
+    yield relays
+    for relay in relays:
+        relay.relay.server.server_close()
+        relay.relay.link.close()
+
+
+def join(relay: RelayHarness, client: dict, name: str = "s"):
+    relay.send(client, "session", session="join-or-create", name=name)
+
+
+def test_snapshot_replies_are_cached(relays):
+    relay = relays[0]
+    client = relay.client()
+    join(relay, client)
+    assert not relay.is_cached(client)
+    relay.get_setting(client)
+    assert relay.is_cached(client)
+
+    relay.send(client, "one-gen", command="run-one-gen")
+    assert not relay.is_cached(client)
+
+def test_batch_excluding_the_sender(relays):
+    relay = relays[0]
+    client = relay.client()
+    join(relay, client)
+    default = relay.get_setting(client)
+    relay.send(client, "batch", batch=[{"command": "set-setting", "settings": {SETTING: default / 2}}])
+
+    assert relay.get_setting(client) == default / 2
+
+def test_relay_without_clients_in_the_session(relays):
+    viewer_relay, other_relay = relays
+    viewer, other = viewer_relay.client(), other_relay.client()
+    join(viewer_relay, viewer)
+    join(other_relay, other)
+    default = viewer_relay.get_setting(viewer)
+    viewer_relay.send(viewer, "session", session="leave")
+    other_relay.send(other, "settings-update", command="set-setting", settings={SETTING: default / 2})
+
+    join(viewer_relay, viewer)
+    assert viewer_relay.get_setting(viewer) == default / 2
+
+def test_session_deleted_and_created_again(relays):
+    viewer_relay, other_relay = relays
+    viewer, other = viewer_relay.client(), other_relay.client()
+    join(viewer_relay, viewer)
+    join(other_relay, other)
+    default = viewer_relay.get_setting(viewer)
+    viewer_relay.send(viewer, "settings-update", command="set-setting", settings={SETTING: default / 2})
+    assert viewer_relay.get_setting(viewer) == default / 2
+    viewer_relay.send(viewer, "session", session="leave")
+
+    other_relay.send(other, "session", session="delete")
+    join(other_relay, other)
+    join(viewer_relay, viewer)
+    assert viewer_relay.get_setting(viewer) == default
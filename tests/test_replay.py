@@ -0,0 +1,116 @@
+import random
+import subprocess
+import sys
+import threading
+
+from ga_server.deap_server.replay import replay
+from ga_server.deap_server.session_log import install_random_routing, read_events, session_random
+
+from tests.conftest import ROOT
+
+
+def get_lineage(population) -> list:
+    return [
+        (ind.visualization_data.id, ind.visualization_data.parent1_id, ind.visualization_data.parent2_id, list(ind))
+        for ind in population
+    ]
+
+def logged_server(make_server, tmp_path, **kwargs):
+    def configure(deap_server):
+        deap_server.session_log_dir = str(tmp_path)
+
+    return make_server(configure, **kwargs)
+
+def run_session(harness, name: str, generations: int):
+    client = harness.client((name, 0))
+    harness.send(client, session="join-or-create", name=name)
+    harness.send(client, command="set-setting", settings={"Mutation probability": 0.4})
+    for _ in range(generations):
+        harness.send(client, command="run-one-gen")
+    return client
+
+
+def test_replay_rebuilds_the_populations_and_the_ids(make_server, tmp_path):
+    harness = logged_server(make_server, tmp_path)
+    run_session(harness, "s", 5)
+    ga_data = harness.server.sessions["s"]
+    ga_data.log.flush()
+
+    replayed = replay(harness.deap_servers[0], ga_data.log.path)
+    assert replayed.generation == 5
+    assert get_lineage(replayed.pop) == get_lineage(ga_data.pop)
+    assert replayed.records == ga_data.records
+    assert replayed.algorithm_kwargs == ga_data.algorithm_kwargs
+
+    partial = replay(harness.deap_servers[0], ga_data.log.path, 2)
+    assert partial.generation == 2
+    assert get_lineage(partial.pop) == get_lineage(ga_data.populations[2])
+
+def test_concurrent_sessions_are_replayed_deterministically(make_server, tmp_path):
+    harness = logged_server(make_server, tmp_path)
+    threads = [threading.Thread(target=run_session, args=(harness, name, 5)) for name in ["s1", "s2", "s3"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for name in ["s1", "s2", "s3"]:
+        ga_data = harness.server.sessions[name]
+        ga_data.log.flush()
+        assert get_lineage(replay(harness.deap_servers[0], ga_data.log.path).pop) == get_lineage(ga_data.pop)
+
+def test_ids_are_counted_per_session(make_server, tmp_path):
+    harness = logged_server(make_server, tmp_path)
+    run_session(harness, "s1", 2)
+    run_session(harness, "s2", 2)
+    first, second = harness.server.sessions["s1"], harness.server.sessions["s2"]
+    first.log.flush()
+
+    assert [ind.visualization_data.id for ind in first.populations[0]] == list(range(1, len(first.populations[0]) + 1))
+    assert [ind.visualization_data.id for ind in second.populations[0]] == list(range(1, len(second.populations[0]) + 1))
+    generations = [event for event in read_events(first.log.path) if event["event"] == "generation"]
+    assert generations[0]["next_id"] == len(first.populations[0]) + 1
+
+def test_logs_are_closed_with_their_session(make_server, tmp_path):
+    harness = logged_server(make_server, tmp_path / "logs", hibernate_after=0, hibernation_dir=str(tmp_path / "hibernated"))
+    client = run_session(harness, "deleted", 1)
+    deleted = harness.server.sessions["deleted"].log.file
+    harness.send(client, session="delete")
+    assert deleted.closed
+
+    client = run_session(harness, "hibernated", 1)
+    hibernated = harness.server.sessions["hibernated"].log.file
+    harness.send(client, session="leave")
+    harness.server.hibernate_idle_sessions()
+    assert hibernated.closed
+
+    # the log is opened again when the session wakes up
+    run_session(harness, "hibernated", 1)
+    ga_data = harness.server.sessions["hibernated"]
+    ga_data.log.flush()
+    assert get_lineage(replay(harness.deap_servers[0], ga_data.log.path).pop) == get_lineage(ga_data.pop)
+
+def test_session_random_is_local_to_the_thread():
+    install_random_routing()
+    with session_random(1):
+        first = [random.random() for _ in range(3)]
+    with session_random(1):
+        results = []
+        thread = threading.Thread(target=lambda: results.append(random.random()))
+        thread.start()
+        thread.join()
+        assert [random.random() for _ in range(3)] == first
+    assert results[0] not in first
+
+def test_random_is_only_routed_when_sessions_are_logged():
+    check = "; ".join([
+        "import random, tsp",
+        "server = tsp.get_server()",
+        "server.create_ga_data()",
+        "assert random.random.__self__ is random._inst",
+        "server = tsp.get_server()",
+        "server.session_log_dir = 'unused'",
+        "server.create_ga_data()",
+        "assert not hasattr(random.random, '__self__')",
+    ])
+    subprocess.run([sys.executable, "-W", "ignore", "-c", check], cwd=ROOT, check=True)
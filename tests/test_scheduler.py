@@ -0,0 +1,115 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from ga_server.deap_server.scheduler import GenerationScheduler
+
+
+class Session:
+
+    def __init__(self, priority: float = 1.0):
+        self.priority = priority
+        self.quanta = 0
+
+    def step(self, stop: threading.Event, duration: float = 0.002):
+        def step() -> bool:
+            time.sleep(duration)
+            self.quanta += 1
+            return stop.is_set()
+        return step
+
+def start(scheduler: GenerationScheduler, session: Session, stop: threading.Event, **kwargs) -> threading.Thread:
+    thread = threading.Thread(target=scheduler.run, args=(session, session.step(stop, **kwargs), None, lambda: session.priority))
+    thread.start()
+    return thread
+
+
+def test_generations_are_counted():
+    scheduler = GenerationScheduler()
+    session = Session()
+    scheduler.run(session, session.step(threading.Event()), 5)
+    assert session.quanta == 5
+
+def test_shares_follow_the_priorities():
+    scheduler = GenerationScheduler()
+    stop = threading.Event()
+    low, high = Session(1.0), Session(3.0)
+    threads = [start(scheduler, low, stop), start(scheduler, high, stop)]
+    time.sleep(0.6)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert 2.4 < high.quanta / low.quanta < 3.6
+
+def test_shares_follow_the_cost_of_the_generations():
+    scheduler = GenerationScheduler()
+    stop = threading.Event()
+    cheap, expensive = Session(), Session()
+    threads = [start(scheduler, cheap, stop), start(scheduler, expensive, stop, duration=0.008)]
+    time.sleep(0.6)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert 3.0 < cheap.quanta / expensive.quanta < 5.0
+
+def test_priority_changes_apply_to_running_jobs():
+    scheduler = GenerationScheduler()
+    stop = threading.Event()
+    changed, other = Session(), Session()
+    threads = [start(scheduler, changed, stop), start(scheduler, other, stop)]
+    time.sleep(0.3)
+    changed.priority = 4.0
+    before = SimpleNamespace(changed=changed.quanta, other=other.quanta)
+    time.sleep(0.6)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert 3.0 < (changed.quanta - before.changed) / (other.quanta - before.other) < 5.0
+
+def test_queue_status():
+    scheduler = GenerationScheduler()
+    stop = threading.Event()
+    session = Session()
+    thread = start(scheduler, session, stop)
+    time.sleep(0.05)
+    status = scheduler.get_queue_status(session)
+    stop.set()
+    thread.join()
+
+    assert status["jobs"] == 1
+    assert status["eta"] is None
+    assert scheduler.get_queue_status(session) is None
+
+def test_on_quantum_is_called_with_the_job_in_the_queue():
+    scheduler = GenerationScheduler()
+    session = Session()
+    statuses = []
+    scheduler.run(session, session.step(threading.Event()), 3, on_quantum=lambda: statuses.append(scheduler.get_queue_status(session)))
+
+    assert len(statuses) == 2
+    assert [status["position"] for status in statuses] == [1, 1]
+    assert statuses[-1]["eta"] is not None
+
+def test_status_is_broadcast_during_scheduled_runs(make_server):
+    scheduler = GenerationScheduler()
+
+    def configure(deap_server):
+        deap_server.scheduler = scheduler
+
+    harness = make_server(configure)
+    runner, other = harness.client(("runner", 0)), harness.client(("other", 1))
+    harness.send(runner, session="join-or-create", name="s")
+    harness.send(other, session="join-or-create", name="s")
+    run = threading.Thread(target=harness.send, args=(runner,), kwargs={"command": "run-n-gen", "generations": 40})
+    run.start()
+    time.sleep(0.1)
+    harness.send(other, command="set-setting", settings={"Priority": 3.0})
+    job = next(job for job in scheduler.jobs if job.session is harness.server.sessions["s"])
+    priority = job.priority
+    run.join()
+
+    assert priority == 3.0
+    assert any("queue" in status for status in harness.replies("status"))
@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from ga_server.gas import GAServer
+from ga_server.sharding import CONTROL_CLIENT, ConsistentHashRing, GAShardRouter, start_shards
+
+SESSIONS = [f"session-{index}" for index in range(2000)]
+
+
+def test_sessions_are_spread_over_the_shards():
+    counts = Counter(ConsistentHashRing(4).get_shard(session) for session in SESSIONS)
+    assert sorted(counts) == [0, 1, 2, 3]
+    assert min(counts.values()) > len(SESSIONS) / 4 / 2
+
+def test_placement_is_stable():
+    assert [ConsistentHashRing(4).get_shard(session) for session in SESSIONS] == [ConsistentHashRing(4).get_shard(session) for session in SESSIONS]
+
+def test_adding_a_shard_only_moves_the_sessions_it_takes():
+    before, after = ConsistentHashRing(4), ConsistentHashRing(5)
+    moved = [session for session in SESSIONS if before.get_shard(session) != after.get_shard(session)]
+    assert all(after.get_shard(session) == 4 for session in moved)
+    assert len(moved) < len(SESSIONS) / 5 * 1.5
+
+
+class RouterHarness:
+    """
+    `GAShardRouter` whose websocket clients are fake, the messages sent to them are decoded and kept in `out`.
+    """
+
+    def __init__(self, upstreams: list[str]):
+        self.router = GAShardRouter(upstreams, "localhost", 0)
+        self.out: list[tuple[int, dict]] = []
+        self.router.server.send_message = lambda client, message: self.out.append((client['shard_id'], json.loads(message)))
+        for shard, link in enumerate(self.router.links):
+            threading.Thread(target=self.router.read_upstream, args=(shard,), daemon=True).start()
+            link.write({"op": "open", "client": CONTROL_CLIENT})
+
+    def client(self) -> dict:
+        client = {"address": ("router client", 0)}
+        self.router.on_connect(client, None)
+        return client
+
+    def send(self, client: dict, info: str, **data) -> dict:
+        sent = len(self.out)
+        self.router.on_message(client, None, json.dumps(data))
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            for client_id, message in self.out[sent:]:
+                if client_id == client['shard_id'] and message.get("info") == info:
+                    return message
+            time.sleep(0.01)
+        raise TimeoutError(f"No {info} reply to {data}")
+
+    def close(self):
+        self.router.server.server_close()
+        for link in self.router.links:
+            link.close()
+
+
+def serve(_index: int, path: str):
+    import tsp
+
+    GAServer(None, None, problems=[tsp.get_server().get_problem()], relay_socket=path).run()
+
+@pytest.fixture
+def router(tmp_path):
+    harness = RouterHarness(start_shards(2, serve, str(tmp_path)))
+    yield harness
+    harness.close()
+
+
+def test_sessions_run_on_the_worker_of_their_name(router):
+    ring = ConsistentHashRing(2)
+    names = [next(session for session in SESSIONS if ring.get_shard(session) == shard) for shard in range(2)]
+    clients = [router.client() for _ in names]
+    for client, name in zip(clients, names):
+        assert router.send(client, "session", session="join-or-create", name=name)["session"] == name
+        assert router.send(client, "one-gen", command="run-one-gen")["data"]["general_stats"]["Generation"] == "1"
+
+    session_list = router.send(clients[0], "session_list", session="list")
+    assert sorted(session_list["sessions"]) == sorted(names)
+    assert session_list["shards"] == {name: shard for shard, name in enumerate(names)}
+
+def test_clients_leave_their_session_when_joining_another_worker(router):
+    ring = ConsistentHashRing(2)
+    first, second = [next(session for session in SESSIONS if ring.get_shard(session) == shard) for shard in range(2)]
+    client = router.client()
+    router.send(client, "session", session="join-or-create", name=first)
+    router.send(client, "session", session="join-or-create", name=second)
+
+    assert router.send(client, "session", session="info")["session"] == second
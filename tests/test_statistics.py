@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import numpy
+import pytest
+
+from ga_server.deap_server.statistics import StreamingStatistics
+
+
+def get_population(values: numpy.ndarray) -> list:
+    return [SimpleNamespace(fitness=SimpleNamespace(values=tuple(row))) for row in values.tolist()]
+
+def get_generations(count: int = 10, size: int = 50) -> list[numpy.ndarray]:
+    rng = numpy.random.default_rng(0)
+    return [rng.normal(generation, 1.0 + generation, (size, 2)) for generation in range(count)]
+
+
+def test_reductions():
+    stats = StreamingStatistics()
+    stats.register("First", {"Mean": "mean", "Std": "std", "Min": "min", "Max": "max", "Median": "median", "Q10": "q10"})
+    stats.register("Second", {"Sum": "sum", "Range": lambda values: values.max() - values.min()}, column=1)
+    values = get_generations(1)[0]
+    record = stats.compile(get_population(values))
+
+    first, second = values[:, 0], values[:, 1]
+    assert record["First"] == pytest.approx({
+        "Mean": first.mean(),
+        "Std": first.std(),
+        "Min": first.min(),
+        "Max": first.max(),
+        "Median": numpy.median(first),
+        "Q10": numpy.quantile(first, 0.1),
+    })
+    assert record["Second"] == pytest.approx({"Sum": second.sum(), "Range": second.max() - second.min()})
+
+def test_running_and_windowed_aggregates():
+    stats = StreamingStatistics()
+    stats.register_running("Running", {"Mean": "mean", "Std": "std", "Max": "max"})
+    stats.register_window("Window", {"Mean": "mean", "Var": "var"}, window=3)
+    generations = get_generations()
+    for index, values in enumerate(generations):
+        record = stats.compile(get_population(values))
+
+        seen = numpy.concatenate([generation[:, 0] for generation in generations[:index + 1]])
+        window = numpy.concatenate([generation[:, 0] for generation in generations[max(0, index - 2):index + 1]])
+        assert record["Running"] == pytest.approx({"Mean": seen.mean(), "Std": seen.std(), "Max": seen.max()})
+        assert record["Window"] == pytest.approx({"Mean": window.mean(), "Var": window.var()})
+
+def test_running_quantiles_are_approximate():
+    stats = StreamingStatistics()
+    stats.register_running("Running", {"Median": "median"})
+    generations = get_generations()
+    for values in generations:
+        record = stats.compile(get_population(values))
+
+    seen = numpy.concatenate([generation[:, 0] for generation in generations])
+    assert abs(record["Running"]["Median"] - numpy.median(seen)) < seen.std() / 4
+
+def test_unsupported_aggregates():
+    stats = StreamingStatistics()
+    with pytest.raises(ValueError):
+        stats.register_window("Window", {"Median": "median"}, window=3)
+
+def test_lines():
+    stats = StreamingStatistics()
+    stats.register("Fitness", {"Min": "min"})
+    stats.register_running("Since the start", {"Mean": "mean"})
+    assert stats.get_lines() == {"Fitness": ["Min"], "Since the start": ["Mean"]}
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ga_server.deap_server.steady_state import SteadyStateAsync
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    instances: list['RecordingExecutor'] = []
+
+    def __init__(self, workers: int):
+        super().__init__(workers)
+        self.stopped = False
+        RecordingExecutor.instances.append(self)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.stopped = True
+        super().shutdown(wait, cancel_futures=cancel_futures)
+
+
+@pytest.fixture
+def steady_state_server(make_server):
+    RecordingExecutor.instances = []
+
+    def configure(deap_server):
+        if deap_server.title == "Travelling Salesman Problem":
+            deap_server.algorithm = SteadyStateAsync(workers=2, executor=RecordingExecutor)
+
+    return make_server(configure, hibernate_after=0)
+
+
+def test_virtual_generations(steady_state_server):
+    client = steady_state_server.client()
+    steady_state_server.send(client, session="join-or-create", name="s")
+    steady_state_server.send(client, command="run-n-gen", generations=2)
+
+    ga_data = steady_state_server.server.sessions["s"]
+    assert ga_data.generation == 2
+    assert ga_data.evaluations >= 2 * len(ga_data.pop)
+
+def test_executor_is_stopped_when_the_session_is_deleted(steady_state_server):
+    client = steady_state_server.client()
+    steady_state_server.send(client, session="join-or-create", name="s")
+    steady_state_server.send(client, command="run-one-gen")
+    assert len(RecordingExecutor.instances) == 1
+
+    steady_state_server.send(client, session="delete")
+    assert RecordingExecutor.instances[0].stopped
+
+def test_executor_is_stopped_when_the_session_hibernates(steady_state_server, tmp_path):
+    steady_state_server.server.hibernation_dir = str(tmp_path)
+    client = steady_state_server.client()
+    steady_state_server.send(client, session="join-or-create", name="s")
+    steady_state_server.send(client, command="run-one-gen")
+    steady_state_server.send(client, session="leave")
+
+    steady_state_server.server.hibernate_idle_sessions()
+    assert RecordingExecutor.instances[0].stopped
+    # a new executor is created when the session runs again
+    steady_state_server.send(client, session="join-or-create", name="s")
+    steady_state_server.send(client, command="run-one-gen")
+    assert len(RecordingExecutor.instances) == 2
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import numpy
+import pytest
+
+from ga_server.deap_server.stop_conditions import StopConditions, isnum
+
+
+def get_ga_data(records: list[dict], stats=None):
+    return SimpleNamespace(generation=len(records), evaluations=0, records=records, stats=stats)
+
+
+def test_isnum_accepts_numpy_numbers():
+    assert isnum(numpy.float64(1.5))
+    assert isnum(numpy.int32(3))
+    assert isnum(2)
+    assert not isnum(True)
+    assert not isnum("1")
+
+def test_fitness_target_reached_with_numpy_stats():
+    records = [{"Fitness": {"Minimum": numpy.float64(12.0)}}]
+    ga_data = get_ga_data(records)
+    conditions = StopConditions.from_command(
+        {"max_generations": 10, "fitness_target": {"graph": "Fitness", "line": "Minimum", "value": 10}},
+        ga_data
+    )
+    assert conditions.check(ga_data) is None
+
+    records.append({"Fitness": {"Minimum": numpy.float64(9.5)}})
+    ga_data.generation = 2
+    assert conditions.check(ga_data)["condition"] == "fitness_target"
+
+@pytest.mark.parametrize("condition", [
+    {"graph": "Fitnes", "line": "Minimum", "generations": 5},
+    {"graph": "Fitness", "line": "Min", "generations": 5},
+])
+def test_unknown_lines_are_rejected(condition):
+    ga_data = get_ga_data([{"Fitness": {"Minimum": 1.0, "Maximum": 2.0}}])
+    with pytest.raises(ValueError):
+        StopConditions.from_command({"max_generations": 10, "stagnation": condition}, ga_data)
+
+def test_lines_are_read_from_the_stats_before_the_first_generation():
+    stats = SimpleNamespace(get_lines=lambda: {"Fitness": ["Minimum"]})
+    assert StopConditions.from_command(
+        {"max_generations": 10, "diversity": {"graph": "Fitness", "line": "Minimum", "threshold": 0}},
+        get_ga_data([], stats)
+    ) is not None
+    with pytest.raises(ValueError):
+        StopConditions.from_command(
+            {"max_generations": 10, "diversity": {"graph": "Diversity", "line": "Entropy", "threshold": 0}},
+            get_ga_data([], stats)
+        )
+
+
+def test_run_until_with_an_unknown_line(make_server):
+    harness = make_server()
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, command="run-until", max_generations=5, stagnation={"graph": "Trip distance", "line": "Min", "generations": 2})
+
+    assert harness.replies("error")[-1]["error"] == "invalid_condition"
+    assert harness.server.sessions["s"].generation == 0
+
+def test_run_until_stops_on_max_generations(make_server):
+    harness = make_server()
+    client = harness.client()
+    harness.send(client, session="join-or-create", name="s")
+    harness.send(client, command="run-until", max_generations=3, stagnation={"graph": "Trip distance", "line": "Minimum", "generations": 50})
+
+    assert harness.replies("status")[-1]["stop_reason"]["condition"] == "max_generations"
+    assert harness.server.sessions["s"].generation == 3
@@ -0,0 +1,62 @@
+import pytest
+
+from ga_server.deap_server.elites import EliteArchive
+from ga_server.deap_server.ga_data_deap import GADataDeap
+from ga_server.deap_server.pareto import ParetoArchive
+from ga_server.deap_server.surrogate import KNNSurrogate, RidgeSurrogate, Surrogate, is_predicted, real_individuals
+
+
+def run_with_surrogate(server, surrogate: Surrogate, generations: int) -> GADataDeap:
+    server.surrogate = surrogate
+    ga_data = server.create_ga_data()
+    for _ in range(generations):
+        ga_data.run_one_gen()
+    return ga_data
+
+
+def test_predicted_individuals_stay_out_of_the_hall_of_fame():
+    import tsp
+
+    server = tsp.get_server()
+    server.hof = EliteArchive(1000)
+    ga_data = run_with_surrogate(server, KNNSurrogate(metric='hamming', min_samples=50, ratio=0.3), 10)
+
+    assert ga_data.surrogate.predicted_evaluations > 0
+    assert any(is_predicted(ind) for ind in ga_data.pop)
+    assert len(ga_data.hof) > 0
+    assert not any(is_predicted(ind) for ind in ga_data.hof)
+    assert not any(elite.get("predicted") for elite in ga_data.get_elites(len(ga_data.hof)))
+    assert [data.get("predicted", False) for data in GADataDeap.get_pop_data(ga_data.pop)] == [is_predicted(ind) for ind in ga_data.pop]
+
+def test_predicted_individuals_stay_out_of_the_pareto_archive():
+    import kursawefct
+
+    server = kursawefct.get_server()
+    server.pareto_archive = ParetoArchive()
+    ga_data = run_with_surrogate(server, RidgeSurrogate(min_samples=50, ratio=0.3), 10)
+
+    assert ga_data.surrogate.predicted_evaluations > 0
+    assert len(ga_data.pareto_archive) > 0
+    assert not any(is_predicted(ind) for ind in ga_data.pareto_archive.items)
+
+def test_stats_leave_the_predicted_fitnesses_out():
+    import tsp
+
+    server = tsp.get_server()
+    ga_data = run_with_surrogate(server, KNNSurrogate(metric='hamming', min_samples=50, ratio=0.3), 10)
+
+    assert any(is_predicted(ind) for ind in ga_data.pop)
+    real = [ind.fitness.values[0] for ind in real_individuals(ga_data.pop)]
+    predicted = [ind.fitness.values[0] for ind in ga_data.pop if is_predicted(ind)]
+    trip_distance = ga_data.records[-1]["Trip distance"]
+    assert (trip_distance["Minimum"], trip_distance["Maximum"]) == (min(real), max(real))
+    assert trip_distance["Mean"] == pytest.approx(sum(real) / len(real))
+    assert sum(real) / len(real) != pytest.approx(sum(real + predicted) / len(real + predicted))
+
+def test_surrogates_implement_fit_and_predict():
+    class Incomplete(Surrogate):
+        def fit(self, samples, targets):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -1,35 +1,38 @@
 #!/usr/bin/env python
-import json
+import os
 import random
 from typing import Dict
-from deap import creator, base, tools, algorithms
+from deap import creator, base, tools
 import array
 
-import numpy
 from ga_server.deap_server.deap_server import DEAPServer
 from ga_server.deap_server.ga_data_deap import GADataDeap
 from ga_server.deap_server.deap_settings import DeapSetting
 from ga_server.deap_server.deap_settings_presets import get_cxpb_deap_setting, get_mutpb_deap_setting
 from ga_server.deap_server.individual_encoding import get_ind_enc_indexes
+from ga_server.deap_server.batch_operators import cx_ordered_batch, cx_partially_matched_batch, mut_shuffle_indexes_batch
+from ga_server.deap_server.variation import ea_simple
+from ga_server.deap_server.elites import EliteArchive
+from ga_server.deap_server.statistics import StreamingStatistics
+from ga_server.problem_data import TSPInstance, load_tsp
 
+# TSPLIB (.tsp), JSON (like tsp.json) or coordinate file
+TSP_FILE = os.environ.get("TSP_FILE", "tsp.json")
 
-with open("tsp.json", "r") as tsp_data:
-    tsp = json.load(tsp_data)
+tsp: TSPInstance | None = None
 
-distance_map = tsp["DistanceMatrix"]
-IND_SIZE = tsp["TourSize"]
+def load_tsp_data():
+    global tsp
+    tsp = load_tsp(TSP_FILE)
 
 def evalTSP(individual):
-    distance = distance_map[individual[-1]][individual[0]]
-    for gene1, gene2 in zip(individual[0:-1], individual[1:]):
-        distance += distance_map[gene1][gene2]
-    return distance,
+    return tsp.distances.tour_length(individual),
 
 
 def general_stats_provider(ga_data: GADataDeap) -> Dict:
     return {
-        "Optimal distance": str(tsp["OptDistance"]),
-        "Best found distance": str(ga_data.hof.items[0].fitness.values[0]) if len(ga_data.hof.items) > 0 else "N/A",
+        "Optimal distance": str(tsp.optimal_distance) if tsp.optimal_distance is not None else "N/A",
+        "Best found distance": str(ga_data.hof[0].fitness.values[0]) if len(ga_data.hof) > 0 else "N/A",
     }
 
 def get_tournsize(ga_data: GADataDeap):
@@ -41,10 +44,48 @@ def set_tournsize(ga_data: GADataDeap, tournsize: int):
     if ga_data.select_value == 'Tournament':
         GADataDeap.upd_select(ga_data, ga_data.select_value)
 
-def main():
-    TOURNSIZE = 3
+TOURNSIZE = 3
+
+def setup(server: DEAPServer):
+    load_tsp_data()
+    IND_SIZE = tsp.size
+
+    creator.create("TSPFitnessMin", base.Fitness, weights=(-1.0,))
+    DEAPServer.create("TSPIndividual", array.array, typecode='i', fitness=creator.TSPFitnessMin)
+
+    server.toolbox.register("indices", random.sample, range(IND_SIZE), IND_SIZE)
+
+    server.toolbox.register("individual", tools.initIterate, creator.TSPIndividual, server.toolbox.indices)
+    server.toolbox.register("population", tools.initRepeat, list, server.toolbox.individual)
+
+    server.toolbox.register("evaluate", evalTSP)
+
+    server.register_mate("Partially Matched", tools.cxPartialyMatched, default=True)
+    server.register_mate("Ordered", tools.cxOrdered)
+    server.register_mate("Partially Matched (batched)", cx_partially_matched_batch)
+    server.register_mate("Ordered (batched)", cx_ordered_batch)
+
+    server.register_mutate("Shuffle Indexes", tools.mutShuffleIndexes, default=True, indpb=0.05)
+    server.register_mutate("Shuffle Indexes (batched)", mut_shuffle_indexes_batch, indpb=0.05)
+    
+    server.register_select("Tournament", tools.selTournament, default=True, tournsize=TOURNSIZE)
+    server.register_select("Best", tools.selBest)
+    server.register_select("Random", tools.selRandom)
+    server.register_select("Random2", tools.selRandom)
+    server.register_select("Random3", tools.selRandom)
+    server.register_select("Random4", tools.selRandom)
+    server.register_select("Random5", tools.selRandom)
+    server.register_select("Random6", tools.selRandom)
+
+    server.stats.register("Trip distance", {'Maximum': 'max', 'Minimum': 'min', 'Mean': 'mean'})
+    server.stats.register("Standard deviation in trip distance", {'Standard deviation': 'std'})
+    server.stats.register("Standard deviation in trip distance 2", {'std': 'std'})
+    server.stats.register_window("Trip distance over the last 10 generations", {'Mean': 'mean', 'Standard deviation': 'std'}, window=10)
+    server.stats.register_running("Trip distance since the start", {'Median': 'median', 'First decile': 'q10'})
+    server.stats.register_diversity("Diversity", server.individual_encoding)
 
-    server = DEAPServer(
+def get_server() -> DEAPServer:
+    return DEAPServer(
         algorithm_kwargs={
             'cxpb': 0.7,
             'mutpb': 0.2,
@@ -54,10 +95,11 @@ def main():
         additional_settings={
             'tournsize': TOURNSIZE,
         },
-        algorithm=algorithms.eaSimple,
+        algorithm=ea_simple,
         title="Travelling Salesman Problem",
         initial_pop_size=300,
-        stats=tools.Statistics(lambda ind: ind.fitness.values),
+        stats=StreamingStatistics(lambda ind: ind.fitness.values),
+        halloffame=EliteArchive(1000),
         general_stats_provider=general_stats_provider,
         settings=[
             get_mutpb_deap_setting(),
@@ -71,38 +113,12 @@ def main():
                 min_increment=1
             )
         ],
-        individual_encoding=get_ind_enc_indexes()
+        individual_encoding=get_ind_enc_indexes(),
+        setup=setup,
     )
 
-    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
-    DEAPServer.create("Individual", array.array, typecode='i', fitness=creator.FitnessMin)
-
-    server.toolbox.register("indices", random.sample, range(IND_SIZE), IND_SIZE)
-
-    server.toolbox.register("individual", tools.initIterate, creator.Individual, server.toolbox.indices)
-    server.toolbox.register("population", tools.initRepeat, list, server.toolbox.individual)
-
-    server.toolbox.register("evaluate", evalTSP)
-
-    server.register_mate("Partially Matched", tools.cxPartialyMatched, default=True)
-    server.register_mate("Ordered", tools.cxOrdered)
-
-    server.register_mutate("Shuffle Indexes", tools.mutShuffleIndexes, default=True, indpb=0.05)
-    
-    server.register_select("Tournament", tools.selTournament, default=True, tournsize=TOURNSIZE)
-    server.register_select("Best", tools.selBest)
-    server.register_select("Random", tools.selRandom)
-    server.register_select("Random2", tools.selRandom)
-    server.register_select("Random3", tools.selRandom)
-    server.register_select("Random4", tools.selRandom)
-    server.register_select("Random5", tools.selRandom)
-    server.register_select("Random6", tools.selRandom)
-
-    server.stats.register("Trip distance", lambda x: {'Maximum': numpy.max(x), 'Minimum': numpy.min(x), 'Mean': numpy.mean(x)})
-    server.stats.register("Standard deviation in trip distance", lambda x: {'Standard deviation': numpy.std(x)})
-    server.stats.register("Standard deviation in trip distance 2", lambda x: {'std': numpy.std(x)})
-
-    server.run()
+def main():
+    get_server().run()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file